@@ -0,0 +1,276 @@
+"""
+Approximate nearest-neighbour index for face embeddings (IVF + PQ).
+
+For galleries too large for the exact search in embedding_store, vectors
+are partitioned by a k-means coarse quantizer (nlist inverted lists) and
+each vector's residual from its list centroid is compressed by product
+quantization: the 512 dimensions are split into m sub-vectors and every
+sub-vector is replaced by the index of its nearest of 256 sub-centroids.
+A template then costs m bytes of codes plus a 4-byte row id (36 bytes with
+the defaults) instead of 2 KB of float32.
+
+A query only scans the nprobe lists whose centroids are closest. Scores
+are inner products, which for L2-normalized embeddings is the cosine
+similarity that compare_faces uses; they are computed per query from one
+(m, 256) lookup table, so scanning a list is a gather and a sum. The
+scores rank candidates well but carry the quantization error, so re-score
+the returned ids exactly (e.g. EmbeddingStore.get) before applying a match
+threshold.
+
+    index = IVFPQIndex(nlist=1024, m=32)
+    index.train(sample_vectors)
+    index.add(ids, vectors)
+    index.search(query, k=5, nprobe=16)
+    index.save('gallery.npz'); IVFPQIndex.load('gallery.npz')
+
+    python ann_index.py build STORE_DIR gallery.npz --nlist 1024
+    python ann_index.py search gallery.npz vectors.json -k 5 --nprobe 16
+"""
+import argparse
+import json
+import logging
+import sys
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+KSUB = 256  # sub-centroids per sub-space (one uint8 code each)
+
+
+def _normalize(vectors, dim):
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    if matrix.shape[1] != dim:
+        raise ValueError(f"Expected {dim}-dimensional vectors, got {matrix.shape[1]}")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def nearest_centroid(x, centroids, block_rows=65536):
+    """Index of the nearest centroid (squared L2) of every row of x."""
+    half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    assign = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block_rows):
+        scores = x[start:start + block_rows] @ centroids.T - half_norms
+        assign[start:start + block_rows] = np.argmax(scores, axis=1)
+    return assign
+
+
+def kmeans(x, k, iters=20, seed=0):
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    if len(x) < k:
+        raise ValueError(f"Need at least {k} training vectors, got {len(x)}")
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        assign = nearest_centroid(x, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        nonempty = counts > 0
+        sums = np.add.reduceat(x[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+class IVFPQIndex:
+    def __init__(self, dim=EMBEDDING_DIM, nlist=1024, m=32):
+        """
+        Args:
+            dim: embedding dimension
+            nlist: number of coarse k-means lists
+            m: number of PQ sub-vectors (bytes per code); must divide dim
+        """
+        if dim % m:
+            raise ValueError(f"m={m} must divide dim={dim}")
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.dsub = dim // m
+        self.centroids = None   # (nlist, dim)
+        self.codebooks = None   # (m, KSUB, dsub)
+        self.ids = []           # row -> external id
+        self._codes = [[] for _ in range(nlist)]   # per list: chunks of (n, m) uint8
+        self._rows = [[] for _ in range(nlist)]    # per list: chunks of (n,) int32
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def train(self, vectors, iters=20, max_points=65536, seed=0):
+        """Learn the coarse centroids and the PQ codebooks from sample vectors."""
+        x = _normalize(vectors, self.dim)
+        rng = np.random.default_rng(seed)
+        if len(x) > max_points:
+            x = x[rng.choice(len(x), max_points, replace=False)]
+        self.centroids = kmeans(x, self.nlist, iters, seed)
+        residuals = x - self.centroids[nearest_centroid(x, self.centroids)]
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(residuals[:, j * self.dsub:(j + 1) * self.dsub]), KSUB, iters, seed + j)
+            for j in range(self.m)
+        ])
+        logger.info(f"Trained IVF{self.nlist},PQ{self.m} on {len(x)} vectors")
+
+    def encode(self, x, lists):
+        """PQ codes (n, m) uint8 of the residuals of x from their list centroids."""
+        residuals = x - self.centroids[lists]
+        codes = np.empty((len(x), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = np.ascontiguousarray(residuals[:, j * self.dsub:(j + 1) * self.dsub])
+            codes[:, j] = nearest_centroid(sub, self.codebooks[j])
+        return codes
+
+    def add(self, ids, vectors):
+        """Append vectors (any number, any time after training)."""
+        if not self.is_trained:
+            raise RuntimeError("Index must be trained before adding vectors")
+        x = _normalize(vectors, self.dim)
+        if len(ids) != len(x):
+            raise ValueError(f"Got {len(ids)} ids for {len(x)} vectors")
+        lists = nearest_centroid(x, self.centroids)
+        codes = self.encode(x, lists)
+        rows = np.arange(len(self.ids), len(self.ids) + len(x), dtype=np.int32)
+        self.ids.extend(str(item_id) for item_id in ids)
+        order = np.argsort(lists, kind='stable')
+        bounds = np.searchsorted(lists[order], np.arange(self.nlist + 1))
+        for list_no in np.flatnonzero(np.diff(bounds)):
+            members = order[bounds[list_no]:bounds[list_no + 1]]
+            self._codes[list_no].append(codes[members])
+            self._rows[list_no].append(rows[members])
+
+    def _list(self, list_no):
+        """(codes, rows) of one inverted list, merging pending chunks."""
+        if len(self._codes[list_no]) > 1:
+            self._codes[list_no] = [np.concatenate(self._codes[list_no])]
+            self._rows[list_no] = [np.concatenate(self._rows[list_no])]
+        if not self._codes[list_no]:
+            return None, None
+        return self._codes[list_no][0], self._rows[list_no][0]
+
+    def search(self, queries, k=5, nprobe=16):
+        """
+        Approximate top-k for each query.
+
+        Returns one list per query of {"id", "score"} dicts, best first;
+        scores approximate cosine similarity.
+        """
+        q = _normalize(queries, self.dim)
+        nprobe = min(nprobe, self.nlist)
+        coarse = q @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        sub_index = np.arange(self.m)
+        results = []
+        for i in range(len(q)):
+            # Inner product of each query sub-vector with every sub-centroid
+            table = np.einsum('jd,jkd->jk', q[i].reshape(self.m, self.dsub), self.codebooks)
+            scores, rows = [], []
+            for list_no in probes[i]:
+                codes, list_rows = self._list(list_no)
+                if codes is None:
+                    continue
+                scores.append(coarse[i, list_no] + table[sub_index, codes].sum(axis=1))
+                rows.append(list_rows)
+            if not scores:
+                results.append([])
+                continue
+            scores = np.concatenate(scores)
+            rows = np.concatenate(rows)
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            results.append([{'id': self.ids[rows[j]], 'score': float(scores[j])} for j in top])
+        return results
+
+    def memory_bytes(self):
+        """Bytes held by codes and row ids (excluding centroids, codebooks and the id strings)."""
+        return len(self.ids) * (self.m + 4)
+
+    def save(self, path):
+        lists = [self._list(list_no) for list_no in range(self.nlist)]
+        sizes = np.array([0 if codes is None else len(codes) for codes, _ in lists], dtype=np.int64)
+        empty_codes = np.zeros((0, self.m), dtype=np.uint8)
+        empty_rows = np.zeros(0, dtype=np.int32)
+        np.savez(
+            path,
+            dim=self.dim, nlist=self.nlist, m=self.m,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            list_sizes=sizes,
+            codes=np.concatenate([c if c is not None else empty_codes for c, _ in lists]),
+            rows=np.concatenate([r if r is not None else empty_rows for _, r in lists]),
+            ids=np.array(self.ids, dtype=str)
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(int(data['dim']), int(data['nlist']), int(data['m']))
+        index.centroids = data['centroids']
+        index.codebooks = data['codebooks']
+        index.ids = data['ids'].tolist()
+        offsets = np.concatenate([[0], np.cumsum(data['list_sizes'])])
+        codes, rows = data['codes'], data['rows']
+        for list_no in range(index.nlist):
+            start, stop = offsets[list_no], offsets[list_no + 1]
+            if stop > start:
+                index._codes[list_no] = [codes[start:stop]]
+                index._rows[list_no] = [rows[start:stop]]
+        return index
+
+    @classmethod
+    def from_store(cls, store, nlist=1024, m=32, train_points=65536):
+        """Train on and add every live vector of an EmbeddingStore."""
+        index = cls(store.dim, nlist, m)
+        sample = []
+        for ids, vectors in store.iter_vectors():
+            sample.append(vectors)
+            if sum(len(v) for v in sample) >= train_points:
+                break
+        index.train(np.concatenate(sample), max_points=train_points)
+        for ids, vectors in store.iter_vectors():
+            index.add(ids, vectors)
+        return index
+
+
+def main():
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+    parser = argparse.ArgumentParser(description="IVF-PQ face embedding index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build an index from an embedding store")
+    build.add_argument("store")
+    build.add_argument("output")
+    build.add_argument("--nlist", type=int, default=1024)
+    build.add_argument("--m", type=int, default=32)
+    search = sub.add_parser("search", help="Top-k matches for a JSON vector or list of vectors")
+    search.add_argument("index")
+    search.add_argument("vectors")
+    search.add_argument("-k", type=int, default=5)
+    search.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from embedding_store import EmbeddingStore
+        store = EmbeddingStore(args.store, read_only=True)
+        index = IVFPQIndex.from_store(store, nlist=args.nlist, m=args.m)
+        store.close()
+        index.save(args.output)
+        result = {"vectors": len(index), "code_bytes": index.memory_bytes()}
+    else:
+        index = IVFPQIndex.load(args.index)
+        with open(args.vectors) as f:
+            result = index.search(json.load(f), k=args.k, nprobe=args.nprobe)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
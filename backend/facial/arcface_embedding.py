@@ -1,38 +1,15 @@
 import cv2
 import numpy as np
-import insightface
-from insightface.app import FaceAnalysis
-import os
 import sys
-import io
+import instrumentation
+from model_registry import StdoutRedirect, get_face_analysis, get_model as registry_model
+from embedding_codec import decode_embedding
 
-# Create a context manager to redirect stdout
-class StdoutRedirect:
-    def __init__(self):
-        self.old_stdout = sys.stdout
-        self.redirected_output = io.StringIO()
-        
-    def __enter__(self):
-        sys.stdout = self.redirected_output
-        return self
-        
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        sys.stdout = self.old_stdout
-        # Write the captured output to stderr
-        sys.stderr.write(self.redirected_output.getvalue())
-
-# Get the absolute path to the models directory
-current_dir = os.path.dirname(os.path.abspath(__file__))
-models_dir = os.path.join(current_dir, 'models')
-
-# Initialize ArcFace model with stdout redirection
-with StdoutRedirect():
-    app = FaceAnalysis(
-        name='buffalo_l',
-        root=models_dir,
-        providers=['CPUExecutionProvider']
-    )
-    app.prepare(ctx_id=0, det_size=(640, 640))
+# Shared detection + recognition analyzer. The ONNX sessions live in the
+# process-wide model registry and load on the first call, so importing this
+# module is cheap and the liveness detector reuses the same sessions.
+# FACIAL_MODEL_VARIANT=int8 switches both to the quantized models.
+app = get_face_analysis(('detection', 'recognition'))
 
 def get_face_embedding(image):
     """
@@ -43,8 +20,9 @@ def get_face_embedding(image):
         numpy array of face embedding (512-dimensional vector)
     """
     try:
-        # Detect faces with stdout redirection
-        with StdoutRedirect():
+        # Detect faces with stdout redirection (timed per stage when
+        # instrumentation is on)
+        with instrumentation.collect('get_face_embedding'), StdoutRedirect():
             faces = app.get(image)
         
         if len(faces) == 0:
@@ -61,12 +39,114 @@ def get_face_embedding(image):
         print(f"Error in get_face_embedding: {str(e)}", file=sys.stderr)
         return None
 
+# Per-image status codes returned by get_face_embeddings
+EMBEDDING_OK = "ok"
+EMBEDDING_INVALID_IMAGE = "invalid_image"
+EMBEDDING_NO_FACE = "no_face"
+EMBEDDING_ERROR = "error"
+
+def _recognize_batch(rec_model, crops, max_batch):
+    """Run the recognition model on aligned crops, max_batch crops per ONNX call."""
+    feats = []
+    for start in range(0, len(crops), max_batch):
+        chunk = crops[start:start + max_batch]
+        try:
+            feats.append(rec_model.get_feat(chunk))
+        except Exception:
+            # Models exported with a fixed batch size of 1 reject batches
+            feats.extend(rec_model.get_feat(crop) for crop in chunk)
+    return np.concatenate(feats, axis=0).astype(np.float32)
+
+def get_face_embeddings(images, aligned=False, max_batch=64, cache=None, keys=None):
+    """
+    Extract ArcFace embeddings for many images with batched recognition.
+
+    Detection still runs per image (first face, as in get_face_embedding),
+    but all aligned crops go through the recognition model together.
+    Args:
+        images: list of BGR numpy arrays (None entries are reported as
+            invalid_image)
+        aligned: images are already aligned ArcFace crops (112x112), so
+            detection and alignment are skipped
+        max_batch: largest number of crops per recognition call
+        cache: optional EmbeddingCache; images found there skip detection
+            and recognition, and new results are added to it
+        keys: cache key per image (default: hash of the pixel data, so
+            callers holding the file bytes should pass keys of those)
+    Returns:
+        (N, 512) float32 matrix (zero rows where no embedding was made)
+        list of N status codes (EMBEDDING_OK, EMBEDDING_NO_FACE, ...)
+    """
+    from insightface.utils import face_align
+
+    rec_model = registry_model('recognition')
+    crop_size = rec_model.input_size[0]
+    statuses = [EMBEDDING_ERROR] * len(images)
+    crops = []
+    crop_rows = []
+    cached = {}
+    if cache is not None and keys is None:
+        variant = b'aligned' if aligned else b'pixels'
+        keys = [None if image is None else
+                cache.key(np.ascontiguousarray(image).tobytes(), variant + str(image.shape).encode())
+                for image in images]
+
+    for i, image in enumerate(images):
+        if cache is not None and keys[i] is not None:
+            found, embedding = cache.get(keys[i])
+            if found:
+                cached[i] = embedding
+                statuses[i] = EMBEDDING_OK if embedding is not None else EMBEDDING_NO_FACE
+                continue
+        if image is None or getattr(image, 'size', 0) == 0:
+            statuses[i] = EMBEDDING_INVALID_IMAGE
+            continue
+        if aligned:
+            crop = image
+            if crop.shape[0] != crop_size or crop.shape[1] != crop_size:
+                crop = cv2.resize(crop, (crop_size, crop_size))
+        else:
+            try:
+                with StdoutRedirect():
+                    bboxes, kpss = registry_model('detection').detect(
+                        image, input_size=app.det_size, max_num=0, metric='default')
+            except Exception as e:
+                print(f"Error detecting face in batch image {i}: {str(e)}", file=sys.stderr)
+                continue
+            if bboxes.shape[0] == 0 or kpss is None:
+                statuses[i] = EMBEDDING_NO_FACE
+                if cache is not None:
+                    cache.put(keys[i], None)
+                continue
+            crop = face_align.norm_crop(image, landmark=kpss[0], image_size=crop_size)
+        crops.append(crop)
+        crop_rows.append(i)
+
+    embeddings = np.zeros((len(images), 512), dtype=np.float32)
+    if crops:
+        try:
+            feats = _recognize_batch(rec_model, crops, max_batch)
+            if feats.shape[1] != embeddings.shape[1]:
+                embeddings = np.zeros((len(images), feats.shape[1]), dtype=np.float32)
+            embeddings[crop_rows] = feats
+            for row, i in enumerate(crop_rows):
+                statuses[i] = EMBEDDING_OK
+                if cache is not None:
+                    cache.put(keys[i], feats[row])
+        except Exception as e:
+            print(f"Error in get_face_embeddings: {str(e)}", file=sys.stderr)
+    for i, embedding in cached.items():
+        if embedding is not None:
+            embeddings[i] = embedding
+
+    return embeddings, statuses
+
 def compare_faces(embedding1, embedding2, threshold=0.35):
     """
     Compare two face embeddings using cosine similarity
     Args:
-        embedding1: first face embedding
-        embedding2: second face embedding
+        embedding1: first face embedding (array, list or encoded string)
+        embedding2: second face embedding (array, list or encoded string)
         threshold: similarity threshold (default: 0.35)
     Returns:
         bool: True if faces match, False otherwise
@@ -74,6 +154,10 @@ def compare_faces(embedding1, embedding2, threshold=0.35):
     """
     if embedding1 is None or embedding2 is None:
         return False, 0.0
+
+    # float16 / int8 strings from embedding_codec are scored directly
+    embedding1 = decode_embedding(embedding1)
+    embedding2 = decode_embedding(embedding2)
         
     # Calculate cosine similarity
     similarity = np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
@@ -0,0 +1,151 @@
+"""
+Offline batch re-verification of liveness videos.
+
+Re-runs EnhancedLivenessDetector.process_video over a directory of uploads
+(e.g. uploads/liveness) or a manifest file, fanned out across a process
+pool. Every pool worker builds its detector and models once and reuses
+them for all of its videos, with its ONNX Runtime sessions limited to its
+share of the cores (FACIAL_WORKERS_PER_HOST = pool size, see onnx_config;
+set FACIAL_ORT_INTRA_THREADS to override). Results stream to a JSON Lines
+file, one line per video with its timing, and a rerun with the same output
+file skips the videos already recorded there, so an interrupted run
+resumes where it stopped.
+
+    python batch_verify.py ../uploads/liveness -o rescore.jsonl --workers 8
+    python batch_verify.py --manifest videos.txt -o rescore.jsonl
+
+A manifest is either one path per line or JSON Lines with a "path" field.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.webm', '.mp4', '.mov', '.avi', '.mkv')
+
+# Per-process detector, built once by the pool initializer
+_detector = None
+
+
+def list_videos(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                paths.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(paths)
+
+
+def read_manifest(manifest_path):
+    paths = []
+    with open(manifest_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                line = json.loads(line)['path']
+            paths.append(os.path.abspath(line))
+    return paths
+
+
+def completed_videos(output_path):
+    """Videos already recorded in an earlier (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['video'])
+            except (ValueError, KeyError):
+                # A line cut short by the interruption; the video is redone
+                continue
+    return done
+
+
+def init_worker(log_level, processes):
+    global _detector
+    logging.getLogger().setLevel(log_level)
+    # The pool's processes share the host: split the cores between their
+    # sessions instead of each using all of them (read when the model
+    # registry is imported below)
+    os.environ.setdefault('FACIAL_WORKERS_PER_HOST', str(processes))
+    from enhanced_liveness import EnhancedLivenessDetector
+    _detector = EnhancedLivenessDetector()
+
+
+def verify_video(video_path):
+    t0 = time.perf_counter()
+    try:
+        _detector.reset()
+        result = _detector.process_video(video_path)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    return {
+        "video": video_path,
+        "seconds": time.perf_counter() - t0,
+        "worker": os.getpid(),
+        "result": result
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch liveness re-verification")
+    parser.add_argument("directory", nargs="?", help="Directory of liveness videos")
+    parser.add_argument("--manifest", help="File listing the videos to verify")
+    parser.add_argument("-o", "--output", required=True, help="JSON Lines results file (appended; enables resume)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--log-level", default="WARNING", help="Log level inside the workers")
+    args = parser.parse_args()
+
+    if bool(args.directory) == bool(args.manifest):
+        parser.error("Give either a directory or --manifest")
+
+    videos = list_videos(args.directory) if args.directory else read_manifest(args.manifest)
+    done = completed_videos(args.output)
+    pending = [path for path in videos if path not in done]
+    logger.warning(f"{len(videos)} videos, {len(videos) - len(pending)} already done, {len(pending)} to verify")
+    if not pending:
+        return
+
+    t0 = time.perf_counter()
+    failed = 0
+    processed = 0
+    processes = max(1, min(args.workers, len(pending)))
+    pool = multiprocessing.Pool(
+        processes=processes,
+        initializer=init_worker,
+        initargs=(args.log_level.upper(), processes)
+    )
+    try:
+        with open(args.output, "a") as out:
+            for record in pool.imap_unordered(verify_video, pending):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                processed += 1
+                if not record["result"].get("success"):
+                    failed += 1
+        pool.close()
+    except BaseException as e:
+        if isinstance(e, KeyboardInterrupt):
+            logger.warning("Interrupted; rerun with the same --output to resume")
+        # join() needs the pool closed or terminated first
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    elapsed = time.perf_counter() - t0
+    logger.warning(f"Verified {processed} videos ({failed} failed) in {elapsed:.1f}s, "
+                   f"{processed / elapsed:.2f} videos/s")
+
+
+if __name__ == "__main__":
+    main()
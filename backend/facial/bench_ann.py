@@ -0,0 +1,127 @@
+"""
+Recall vs latency of the IVF-PQ index against exact search.
+
+Builds an IVFPQIndex over a gallery (synthetic clustered embeddings by
+default, or the vectors of an embedding store), then for each nprobe
+reports recall@k against the exact top-k from one matrix multiply, the
+mean per-query latency of both, and the memory per template.
+
+    python bench_ann.py --gallery 200000 --queries 200
+    python bench_ann.py --store store/aadhar --nprobe 1,8,32 -o ann.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from ann_index import IVFPQIndex, EMBEDDING_DIM
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_gallery(n, dim=EMBEDDING_DIM, identities=None, seed=0):
+    """
+    Unit vectors shaped like face embeddings: identities spread over the
+    sphere, a few noisy samples of each.
+    """
+    rng = np.random.default_rng(seed)
+    identities = identities or max(1, n // 4)
+    centers = rng.standard_normal((identities, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    x = centers[rng.integers(0, identities, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def exact_topk(gallery, queries, k):
+    scores = queries @ gallery.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF-PQ recall/latency benchmark")
+    parser.add_argument("--store", help="Embedding store directory to use as the gallery")
+    parser.add_argument("--gallery", type=int, default=100000, help="Synthetic gallery size")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None, help="Coarse lists (default ~4*sqrt(N))")
+    parser.add_argument("--m", type=int, default=32)
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.store:
+        from embedding_store import EmbeddingStore
+        store = EmbeddingStore(args.store, read_only=True)
+        ids, blocks = [], []
+        for block_ids, vectors in store.iter_vectors():
+            ids.extend(block_ids)
+            blocks.append(vectors)
+        store.close()
+        gallery = np.concatenate(blocks)
+    else:
+        gallery = synthetic_gallery(args.gallery)
+        ids = [str(i) for i in range(len(gallery))]
+
+    rng = np.random.default_rng(1)
+    # Queries are perturbed gallery members, as a re-enrollment would be
+    queries = gallery[rng.choice(len(gallery), args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(gallery.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    nlist = args.nlist or max(16, int(4 * np.sqrt(len(gallery))))
+    t0 = time.perf_counter()
+    index = IVFPQIndex(gallery.shape[1], nlist=nlist, m=args.m)
+    index.train(gallery)
+    train_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.add(ids, gallery)
+    add_seconds = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    truth = exact_topk(gallery, queries, args.k)
+    exact_ms = (time.perf_counter() - t0) * 1000.0 / len(queries)
+    truth_ids = [{ids[row] for row in rows} for rows in truth]
+
+    sweeps = []
+    for nprobe in (int(value) for value in args.nprobe.split(',')):
+        t0 = time.perf_counter()
+        found = index.search(queries, k=args.k, nprobe=nprobe)
+        latency_ms = (time.perf_counter() - t0) * 1000.0 / len(queries)
+        hits = sum(len(truth_ids[i] & {match['id'] for match in found[i]}) for i in range(len(queries)))
+        top1 = sum(1 for i in range(len(queries))
+                   if found[i] and found[i][0]['id'] == ids[truth[i][np.argmax(queries[i] @ gallery[truth[i]].T)]])
+        sweeps.append({
+            'nprobe': nprobe,
+            f'recall_at_{args.k}': hits / float(len(queries) * args.k),
+            'top1_agreement': top1 / float(len(queries)),
+            'latency_ms': latency_ms
+        })
+
+    report = {
+        'gallery': len(gallery),
+        'queries': len(queries),
+        'k': args.k,
+        'nlist': nlist,
+        'm': args.m,
+        'train_seconds': train_seconds,
+        'add_seconds': add_seconds,
+        'exact_latency_ms': exact_ms,
+        'float32_bytes_per_template': gallery.shape[1] * 4,
+        'index_bytes_per_template': index.memory_bytes() / float(len(index)),
+        'sweeps': sweeps
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Fixture loading shared by the benchmark scripts (benchmark.py,
+bench_pyramid.py).
+"""
+import logging
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+VIDEO_EXTENSIONS = ('.webm', '.mp4', '.avi', '.mov', '.mkv')
+
+
+def load_frames(paths, frames_per_video, step):
+    """BGR frames from image files and from every step-th frame of videos."""
+    frames = []
+    for path in paths:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            img = cv2.imread(path)
+            if img is None:
+                logger.warning(f"Could not read {path}")
+                continue
+            frames.append(img)
+            continue
+        cap = cv2.VideoCapture(path)
+        taken = 0
+        index = 0
+        while taken < frames_per_video:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if index % step == 0:
+                frames.append(frame)
+                taken += 1
+            index += 1
+        cap.release()
+    return frames
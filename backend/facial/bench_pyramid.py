@@ -0,0 +1,230 @@
+"""
+Latency/accuracy tradeoff of the frame pyramid and the detector input size.
+
+For every pyramid level (short side in pixels, "full" for the original
+frame) the quality and screen-artifact checks are timed
+and their decisions compared with the full-resolution decisions. For every
+detector input size the SCRFD detection is timed, the detection rate
+recorded and the ArcFace embedding compared (cosine) with the one from the
+640 detector. The artifacts section calibrates the screen-artifact check
+(face-ROI moiré, whole-level glare and edges) against the original
+full-resolution check: verdict and per-flag agreement, positives the new
+check clears, and the ROI moiré value against the full-frame one.
+
+    python bench_pyramid.py ../uploads/liveness/*.webm --frames 30
+    python bench_pyramid.py faces/*.jpg --levels full,720,480 -o pyramid.json
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+
+from bench_common import load_frames
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVELS = 'full,1080,720,480,360'
+DEFAULT_DET_SIZES = '640,480,320,224,160'
+
+
+def parse_levels(spec):
+    return [None if level == 'full' else int(level) for level in spec.split(',')]
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def _summary(seconds, agree, total):
+    seconds = np.asarray(seconds) * 1000.0
+    return {
+        'mean_ms': float(seconds.mean()) if len(seconds) else None,
+        'p95_ms': float(np.percentile(seconds, 95)) if len(seconds) else None,
+        'agreement': agree / total if total else None
+    }
+
+
+def bench_levels(detector, frames, levels):
+    """Per-level check timings and agreement with the full-resolution decisions."""
+    checks = {
+        'quality': lambda ctx: detector.check_face_quality(ctx),
+        'artifacts': lambda ctx: detector.detect_screen_artifacts(ctx)
+    }
+    saved = dict(detector.CHECK_RESOLUTION)
+    # Measure the artifact check on every frame instead of on its cadence
+    detector.screen_artifacts.every_n = 1
+    decisions = {}
+    report = {}
+    try:
+        for level in levels:
+            for name in checks:
+                detector.CHECK_RESOLUTION[name] = level
+            timings = {name: [] for name in checks}
+            level_decisions = []
+            for frame in frames:
+                ctx = detector.frame_context(frame)
+                if ctx.landmark_array is None:
+                    level_decisions.append(None)
+                    continue
+                frame_decisions = {}
+                for name, check in checks.items():
+                    # Building the level is part of the check's cost
+                    ctx._levels.clear()
+                    ctx._gray_levels.clear()
+                    result, seconds = _timed(check, ctx)
+                    timings[name].append(seconds)
+                    frame_decisions[name] = bool(result)
+                level_decisions.append(frame_decisions)
+            decisions[level] = level_decisions
+
+            reference = decisions[levels[0]]
+            entry = {}
+            for name in checks:
+                compared = [(ref[name], dec[name]) for ref, dec in zip(reference, level_decisions)
+                            if ref is not None and dec is not None]
+                agree = sum(1 for ref, dec in compared if ref == dec)
+                entry[name] = _summary(timings[name], agree, len(compared))
+            report['full' if level is None else str(level)] = entry
+    finally:
+        detector.CHECK_RESOLUTION.update(saved)
+    return report
+
+
+def bench_det_sizes(frames, det_sizes):
+    """Per-size detection time, detection rate and embedding cosine vs the largest size."""
+    from insightface.utils import face_align
+    from model_registry import get_model
+
+    det_model = get_model('detection')
+    rec_model = get_model('recognition')
+
+    def embed(frame, kps):
+        aimg = face_align.norm_crop(frame, landmark=kps, image_size=rec_model.input_size[0])
+        feat = rec_model.get_feat(aimg).flatten()
+        return feat / np.linalg.norm(feat)
+
+    reference_size = max(det_sizes)
+    reference = []
+    for frame in frames:
+        _, kpss = det_model.detect(frame, input_size=(reference_size, reference_size), max_num=0, metric='default')
+        reference.append(embed(frame, kpss[0]) if kpss is not None and len(kpss) else None)
+
+    report = {}
+    for size in det_sizes:
+        seconds = []
+        detected = 0
+        cosines = []
+        for frame, ref in zip(frames, reference):
+            (bboxes, kpss), elapsed = _timed(
+                lambda: det_model.detect(frame, input_size=(size, size), max_num=0, metric='default'))
+            seconds.append(elapsed)
+            if bboxes.shape[0] == 0 or kpss is None:
+                continue
+            detected += 1
+            if ref is not None:
+                cosines.append(float(np.dot(embed(frame, kpss[0]), ref)))
+        entry = _summary(seconds, detected, len(frames))
+        entry['detection_rate'] = entry.pop('agreement')
+        entry['min_cosine'] = min(cosines) if cosines else None
+        entry['mean_cosine'] = float(np.mean(cosines)) if cosines else None
+        report[str(size)] = entry
+    return report
+
+
+def bench_artifacts(detector, frames):
+    """Screen-artifact check vs the original full-resolution check, per frame."""
+    artifacts = detector.screen_artifacts
+    every_n = artifacts.every_n
+    # Measure every frame instead of on the cadence
+    artifacts.every_n = 1
+    artifacts.reset()
+    resolution = detector.CHECK_RESOLUTION['artifacts']
+    verdicts = []
+    flag_agreement = {'moire': 0, 'glare': 0, 'edges': 0}
+    roi_moire, full_moire = [], []
+    try:
+        for frame in frames:
+            ctx = detector.frame_context(frame)
+            if ctx.landmark_array is None:
+                continue
+            gray = ctx.gray_level(resolution)
+            bbox = ctx.face_bbox(short_side=resolution)
+            detected, info = artifacts.check(gray, bbox)
+            # The baseline check: whole full-resolution frame
+            reference_values = artifacts.full_check(ctx.gray_level(None))
+            reference_flags = artifacts.decide(reference_values)
+            verdicts.append((any(reference_flags.values()), detected))
+            for name in flag_agreement:
+                flag_agreement[name] += reference_flags[name] == info['flags'][name]
+            roi = artifacts.face_roi(gray, bbox)
+            if roi is not None:
+                roi_moire.append(artifacts.roi_moire(roi[0]))
+                full_moire.append(reference_values['moire'])
+    finally:
+        artifacts.every_n = every_n
+        artifacts.reset()
+
+    total = len(verdicts)
+    roi_moire, full_moire = np.asarray(roi_moire), np.asarray(full_moire)
+    return {
+        'frames_compared': total,
+        'verdict_agreement': sum(1 for ref, new in verdicts if ref == new) / total if total else None,
+        'flag_agreement': {name: count / total for name, count in flag_agreement.items()} if total else None,
+        'reference_positives': sum(1 for ref, _ in verdicts if ref),
+        'missed_positives': sum(1 for ref, new in verdicts if ref and not new),
+        'extra_positives': sum(1 for ref, new in verdicts if new and not ref),
+        'moire': {
+            'frames': int(len(roi_moire)),
+            'mean_abs_diff_db': float(np.mean(np.abs(roi_moire - full_moire))) if len(roi_moire) else None,
+            'correlation': float(np.corrcoef(roi_moire, full_moire)[0, 1]) if len(roi_moire) > 1 else None,
+            'roi_over_threshold': int(np.count_nonzero(roi_moire > artifacts.moire_threshold)),
+            'full_over_threshold': int(np.count_nonzero(full_moire > artifacts.moire_threshold))
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame pyramid and detector size benchmark")
+    parser.add_argument("paths", nargs="+", help="Images and/or videos")
+    parser.add_argument("--frames", type=int, default=30, help="Frames taken from each video")
+    parser.add_argument("--step", type=int, default=4, help="Take every step-th video frame")
+    parser.add_argument("--levels", default=DEFAULT_LEVELS, help="Pyramid levels, 'full' first")
+    parser.add_argument("--det-sizes", default=DEFAULT_DET_SIZES, help="Detector input sizes")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    frames = load_frames(args.paths, args.frames, args.step)
+    if not frames:
+        parser.error("No frames could be read")
+    levels = parse_levels(args.levels)
+    if levels[0] is not None:
+        levels.insert(0, None)
+
+    from enhanced_liveness import EnhancedLivenessDetector
+    detector = EnhancedLivenessDetector()
+
+    heights = [frame.shape[0] for frame in frames]
+    report = {
+        'frames': len(frames),
+        'frame_heights': sorted(set(heights)),
+        'levels': bench_levels(detector, frames, levels),
+        'det_sizes': bench_det_sizes(frames, [int(size) for size in args.det_sizes.split(',')]),
+        'artifacts': bench_artifacts(detector, frames)
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+Per-stage latency benchmark of the liveness and embedding paths.
+
+Drives EnhancedLivenessDetector.process_video over fixture videos,
+detect_liveness over fixture images (or frames taken from the videos), and
+arcface_embedding.get_face_embedding over the same images. While they run,
+each stage is timed by wrapping the detector method that implements it:
+
+    decode        FrameSource grab/retrieve up to each returned frame
+    facemesh      FaceMesh.process
+    quality       face_quality_metrics / check_face_quality
+    reflectance   analyze_skin_reflectance
+    texture       analyze_skin_texture
+    fft_artifacts detect_screen_artifacts
+    antispoof     detect_spoofing
+    arcface       get_frame_embedding / embed_face (detector crop + recognition)
+    frame         process_frame as a whole
+
+Stages share per-frame work through FrameContext (the face ROI, the
+pyramid levels), which is charged to whichever stage builds it first.
+The report has p50/p95/p99 per stage and per operation, frames per second
+of process_video, and the process's peak RSS, as sorted JSON so two runs
+can be diffed (or compared directly with --compare).
+
+Fixtures are videos and images under --fixtures. --synthetic N adds N
+short generated videos: a fixture image (if any) moving with a little
+jitter and lighting drift, so every stage sees a face, or a textured
+placeholder when no image is given.
+
+    python benchmark.py --fixtures ../uploads/liveness ../uploads/aadhar -o bench.json
+    python benchmark.py --synthetic 3 --repeat 2 --compare bench.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from bench_common import load_frames, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# stage -> detector methods attributed to it
+DETECTOR_STAGES = {
+    'quality': ('face_quality_metrics', 'check_face_quality'),
+    'reflectance': ('analyze_skin_reflectance',),
+    'texture': ('analyze_skin_texture',),
+    'fft_artifacts': ('detect_screen_artifacts',),
+    'antispoof': ('detect_spoofing',),
+    'arcface': ('get_frame_embedding', 'embed_face'),
+    'frame': ('process_frame',),
+}
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000.0
+    if not len(ms):
+        return {'count': 0}
+    return {
+        'count': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+        'total_ms': float(ms.sum())
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+class StageTimer:
+    """
+    Times stages by wrapping methods in place; use as a context manager so
+    the originals are restored. Nested calls within one stage (e.g.
+    check_face_quality calling face_quality_metrics) are timed once.
+    """
+
+    def __init__(self):
+        self.samples = {}
+        self._depth = {}
+        self._restore = []
+        self._pending_grab = 0.0
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+        had_own = name in vars(owner)
+        own_value = vars(owner).get(name)
+
+        def timed(*args, **kwargs):
+            depth = self._depth.get(stage, 0)
+            self._depth[stage] = depth + 1
+            t0 = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._depth[stage] = depth
+                if depth == 0:
+                    self.record(stage, time.perf_counter() - t0)
+
+        setattr(owner, name, timed)
+        self._restore.append((owner, name, had_own, own_value))
+
+    def wrap_decode(self):
+        """Charge every grab() to the next retrieve(), i.e. per returned frame."""
+        from frame_source import FrameSource
+        grab, retrieve = FrameSource.grab, FrameSource.retrieve
+
+        def timed_grab(source):
+            t0 = time.perf_counter()
+            try:
+                return grab(source)
+            finally:
+                self._pending_grab += time.perf_counter() - t0
+
+        def timed_retrieve(source):
+            t0 = time.perf_counter()
+            try:
+                return retrieve(source)
+            finally:
+                self.record('decode', self._pending_grab + time.perf_counter() - t0)
+                self._pending_grab = 0.0
+
+        for name, value in (('grab', timed_grab), ('retrieve', timed_retrieve)):
+            self._restore.append((FrameSource, name, True, vars(FrameSource)[name]))
+            setattr(FrameSource, name, value)
+
+    def attach(self, detector):
+        self.wrap_decode()
+        self.wrap(detector.face_mesh, 'process', 'facemesh')
+        for stage, methods in DETECTOR_STAGES.items():
+            for name in methods:
+                self.wrap(detector, name, stage)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for owner, name, had_own, value in reversed(self._restore):
+            if had_own:
+                setattr(owner, name, value)
+            else:
+                delattr(owner, name)
+        self._restore = []
+
+    def report(self):
+        return {stage: latency_summary(seconds) for stage, seconds in sorted(self.samples.items())}
+
+
+def placeholder_image(size=(640, 480), seed=0):
+    """Textured stand-in for a face when no fixture image is available."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    y, x = np.mgrid[0:h, 0:w]
+    base = (128 + 60 * np.sin(x / 23.0) * np.cos(y / 31.0)).astype(np.float32)
+    image = np.dstack([base, base * 0.9, base * 0.8]) + rng.normal(0, 8, (h, w, 3))
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    cv2.ellipse(image, (w // 2, h // 2), (w // 6, h // 4), 0, 0, 360, (150, 170, 200), -1)
+    return image
+
+
+def synthesize_video(path, image, frames=120, fps=30.0, size=(640, 480), seed=0):
+    """
+    Write a short video of image drifting on screen (small shifts, rotation,
+    scale and brightness changes per frame). Returns the written path, which
+    falls back to MJPG/.avi when the mp4v encoder is unavailable.
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    scale = min(w / image.shape[1], h / image.shape[0])
+    base = np.zeros((h, w, 3), dtype=np.uint8)
+    resized = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+    y0, x0 = (h - resized.shape[0]) // 2, (w - resized.shape[1]) // 2
+    base[y0:y0 + resized.shape[0], x0:x0 + resized.shape[1]] = resized
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    if not writer.isOpened():
+        path = os.path.splitext(path)[0] + '.avi'
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    angle = shift_x = shift_y = 0.0
+    for i in range(frames):
+        angle = 0.9 * angle + rng.normal(0, 0.6)
+        shift_x = 0.9 * shift_x + rng.normal(0, 1.5)
+        shift_y = 0.9 * shift_y + rng.normal(0, 1.5)
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0 + 0.03 * np.sin(i / 15.0))
+        matrix[:, 2] += (shift_x, shift_y)
+        frame = cv2.warpAffine(base, matrix, size, borderMode=cv2.BORDER_REFLECT)
+        gain = 1.0 + 0.08 * np.sin(i / 20.0)
+        writer.write(cv2.convertScaleAbs(frame, alpha=gain, beta=rng.normal(0, 2)))
+    writer.release()
+    return path
+
+
+def find_fixtures(paths):
+    videos, images = [], []
+    for path in paths:
+        files = [path] if os.path.isfile(path) else \
+            sorted(glob.glob(os.path.join(path, '**', '*'), recursive=True))
+        for name in files:
+            lower = name.lower()
+            if lower.endswith(VIDEO_EXTENSIONS):
+                videos.append(name)
+            elif lower.endswith(IMAGE_EXTENSIONS):
+                images.append(name)
+    return videos, images
+
+
+def environment(detector_loaded_rss):
+    import onnxruntime
+    from model_registry import registry, configured_variant
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'onnxruntime': onnxruntime.__version__,
+        'onnx_runtime_options': registry.memory_report()['onnx_runtime'],
+        'model_variants': {task: configured_variant(task) for task in ('detection', 'recognition')},
+        'liveness_env': {key: value for key, value in sorted(os.environ.items())
+                         if key.startswith(('LIVENESS_', 'FACIAL_'))},
+        'rss_after_load_mb': detector_loaded_rss
+    }
+
+
+def bench_videos(detector, videos, repeat):
+    timer = StageTimer().attach(detector)
+    runs = []
+    with timer:
+        for _ in range(repeat):
+            for path in videos:
+                frames_before = len(timer.samples.get('frame', []))
+                t0 = time.perf_counter()
+                result = detector.process_video(path)
+                seconds = time.perf_counter() - t0
+                frames = len(timer.samples.get('frame', [])) - frames_before
+                runs.append({
+                    'video': os.path.basename(path),
+                    'seconds': seconds,
+                    'frames_analyzed': frames,
+                    'fps': frames / seconds if seconds > 0 else None,
+                    'live': bool(result.get('is_live'))
+                })
+    total_seconds = sum(run['seconds'] for run in runs)
+    total_frames = sum(run['frames_analyzed'] for run in runs)
+    return {
+        'runs': runs,
+        'latency': latency_summary([run['seconds'] for run in runs]),
+        'fps': total_frames / total_seconds if total_seconds > 0 else None,
+        'stages': timer.report()
+    }
+
+
+def bench_images(detector, images, repeat):
+    from arcface_embedding import get_face_embedding
+    timer = StageTimer().attach(detector)
+    liveness, embedding = [], []
+    faces = 0
+    with timer:
+        for _ in range(repeat):
+            detector.reset()
+            for image in images:
+                t0 = time.perf_counter()
+                detector.detect_liveness(image)
+                liveness.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                vector = get_face_embedding(image)
+                embedding.append(time.perf_counter() - t0)
+                # None when no face was found; count only usable embeddings
+                if vector is not None and np.size(vector) and np.all(np.isfinite(vector)):
+                    faces += 1
+    return {
+        'detect_liveness': latency_summary(liveness),
+        'get_face_embedding': latency_summary(embedding),
+        'embedding_face_rate': faces / float(len(embedding)) if embedding else None,
+        'stages': timer.report()
+    }
+
+
+def compare_reports(baseline, current):
+    """p50/p95 change (ms and %) of every stage and operation found in both reports."""
+    def latencies(report):
+        found = {}
+        for section in ('videos', 'images'):
+            for name, entry in report.get(section, {}).get('stages', {}).items():
+                found[f'{section}.stage.{name}'] = entry
+            for name, entry in report.get(section, {}).items():
+                if isinstance(entry, dict) and 'p50_ms' in entry:
+                    found[f'{section}.{name}'] = entry
+        return found
+
+    before, after = latencies(baseline), latencies(current)
+    deltas = {}
+    for name in sorted(set(before) & set(after)):
+        entry = {}
+        for metric in ('p50_ms', 'p95_ms'):
+            if metric in before[name] and metric in after[name]:
+                change = after[name][metric] - before[name][metric]
+                entry[metric] = change
+                entry[metric.replace('_ms', '_pct')] = \
+                    100.0 * change / before[name][metric] if before[name][metric] else None
+        deltas[name] = entry
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage liveness benchmark")
+    parser.add_argument("--fixtures", nargs="*", default=[], help="Fixture videos/images or directories")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generated videos to add")
+    parser.add_argument("--synthetic-frames", type=int, default=120)
+    parser.add_argument("--image-limit", type=int, default=50,
+                        help="Images (or frames taken from the videos) for detect_liveness/get_face_embedding")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the fixtures")
+    parser.add_argument("--no-warmup", action="store_true", help="Include first-call model loading")
+    parser.add_argument("--compare", help="Baseline report to diff against")
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    videos, image_paths = find_fixtures(args.fixtures)
+    images = [image for image in (cv2.imread(path) for path in image_paths[:args.image_limit])
+              if image is not None]
+
+    workdir = tempfile.mkdtemp(prefix='facial-bench-') if args.synthetic else None
+    for i in range(args.synthetic):
+        source = images[i % len(images)] if images else placeholder_image(seed=i)
+        videos.append(synthesize_video(os.path.join(workdir, f'synthetic-{i}.mp4'), source,
+                                       frames=args.synthetic_frames, seed=i))
+    if not images and videos:
+        images = load_frames(videos, max(1, args.image_limit // len(videos)), 10)[:args.image_limit]
+    if not videos and not images:
+        parser.error("No fixtures: pass --fixtures and/or --synthetic")
+
+    from enhanced_liveness import EnhancedLivenessDetector
+    from model_registry import rss_mb
+    t0 = time.perf_counter()
+    detector = EnhancedLivenessDetector()
+    load_seconds = time.perf_counter() - t0
+
+    warmup_seconds = None
+    if not args.no_warmup:
+        # First calls load the ONNX sessions; keep them out of the stage numbers
+        from arcface_embedding import get_face_embedding
+        t0 = time.perf_counter()
+        sample = images[0] if images else load_frames(videos[:1], 1, 1)[0]
+        detector.process_frame(sample)
+        get_face_embedding(sample)
+        detector.reset()
+        warmup_seconds = time.perf_counter() - t0
+
+    report = {
+        'environment': environment(rss_mb()),
+        'fixtures': {
+            'videos': [os.path.basename(path) for path in videos],
+            'images': len(images),
+            'synthetic_videos': args.synthetic,
+            'repeat': args.repeat
+        },
+        'detector_load_seconds': load_seconds,
+        'warmup_seconds': warmup_seconds,
+        'videos': bench_videos(detector, videos, args.repeat) if videos else None,
+        'images': bench_images(detector, images, args.repeat) if images else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report['compare'] = compare_reports(json.load(f), report)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
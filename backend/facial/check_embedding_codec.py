@@ -0,0 +1,112 @@
+"""
+Checks that the compact embedding formats do not change match decisions.
+
+Every pair of embeddings is scored with compare_faces semantics (cosine >
+threshold, 0.35 by default) on the float32 vectors and on the decoded
+f16 / i8 vectors; the report lists decision flips, the largest score
+change, how many pairs sit near the threshold, the encoded sizes and the
+decode time against json.loads. Exits with status 1 if any decision flips.
+
+    python check_embedding_codec.py --images ../uploads/aadhar
+    python check_embedding_codec.py --store store/aadhar --limit 2000
+    python check_embedding_codec.py --vectors vectors.json
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from embedding_codec import encode_embedding, decode_embedding, FORMAT_F16, FORMAT_I8
+
+logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_embeddings(args):
+    if args.vectors:
+        with open(args.vectors) as f:
+            return np.array([decode_embedding(v) for v in json.load(f)], dtype=np.float32)
+    if args.store:
+        from embedding_store import EmbeddingStore
+        store = EmbeddingStore(args.store, read_only=True)
+        blocks = [vectors for _, vectors in store.iter_vectors()]
+        store.close()
+        return np.concatenate(blocks)[:args.limit] if blocks else np.zeros((0, 512), np.float32)
+    import cv2
+    from arcface_embedding import get_face_embeddings, EMBEDDING_OK
+    paths = sorted(path for path in glob.glob(os.path.join(args.images, '**', '*'), recursive=True)
+                   if path.lower().endswith(IMAGE_EXTENSIONS))[:args.limit]
+    embeddings, statuses = get_face_embeddings([cv2.imread(path) for path in paths])
+    return embeddings[[status == EMBEDDING_OK for status in statuses]]
+
+
+def cosine_matrix(x):
+    x = x / np.linalg.norm(x, axis=1, keepdims=True)
+    return x @ x.T
+
+
+def check_format(x, fmt, threshold, margin):
+    encoded = [encode_embedding(v, fmt) for v in x]
+    t0 = time.perf_counter()
+    decoded = np.array([decode_embedding(v) for v in encoded], dtype=np.float32)
+    decode_ms = (time.perf_counter() - t0) * 1000.0 / len(x)
+
+    reference = cosine_matrix(x.astype(np.float64))
+    scores = cosine_matrix(decoded.astype(np.float64))
+    pairs = np.triu_indices(len(x), k=1)
+    reference, scores = reference[pairs], scores[pairs]
+    flips = np.count_nonzero((reference > threshold) != (scores > threshold))
+    return {
+        'format': fmt,
+        'encoded_chars': int(np.mean([len(v) for v in encoded])),
+        'decode_ms_per_vector': decode_ms,
+        'pairs': int(len(reference)),
+        'decision_flips': int(flips),
+        'max_score_delta': float(np.abs(scores - reference).max()) if len(reference) else 0.0,
+        'pairs_within_margin': int(np.count_nonzero(np.abs(reference - threshold) < margin))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding codec match-decision check")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Directory of face images")
+    source.add_argument("--store", help="Embedding store directory")
+    source.add_argument("--vectors", help="JSON list of vectors (lists or encoded strings)")
+    parser.add_argument("--limit", type=int, default=2000, help="Embeddings used (all pairs are scored)")
+    parser.add_argument("--threshold", type=float, default=0.35)
+    parser.add_argument("--margin", type=float, default=0.01, help="Report pairs this close to the threshold")
+    args = parser.parse_args()
+
+    x = load_embeddings(args)
+    if len(x) < 2:
+        print(json.dumps({"error": "Need at least two embeddings"}))
+        sys.exit(1)
+
+    as_json = [json.dumps(v.tolist()) for v in x]
+    t0 = time.perf_counter()
+    for text in as_json:
+        json.loads(text)
+    json_ms = (time.perf_counter() - t0) * 1000.0 / len(x)
+
+    report = {
+        'embeddings': len(x),
+        'threshold': args.threshold,
+        'json_chars': int(np.mean([len(text) for text in as_json])),
+        'json_parse_ms_per_vector': json_ms,
+        'formats': [check_format(x, fmt, args.threshold, args.margin) for fmt in (FORMAT_F16, FORMAT_I8)]
+    }
+    print(json.dumps(report, indent=2))
+    if any(entry['decision_flips'] for entry in report['formats']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
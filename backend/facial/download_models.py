@@ -1,10 +1,24 @@
+import argparse
 import os
-import insightface
-from insightface.app import FaceAnalysis
+import json
+import logging
 import sys
 import onnxruntime
+from model_registry import ModelRegistry, PACK_FILES
+from onnx_config import load_config
 
 def main():
+    parser = argparse.ArgumentParser(description="Download the buffalo_l models")
+    parser.add_argument("--quantize", choices=("dynamic", "static"),
+                        help="Also write INT8 copies of the detection and recognition models")
+    parser.add_argument("--calibration-dir",
+                        help="Face images used to calibrate (static) and to compare against fp32")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--tasks", default="detection,recognition", help="Models to quantize")
+    parser.add_argument("--report", help="Quantization report path (default: next to the models)")
+    args = parser.parse_args()
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+
     try:
         # Get the absolute path to the models directory
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,16 +37,17 @@ def main():
         print(f"Available providers: {onnxruntime.get_available_providers()}")
         
         print("\nInitializing ArcFace...")
-        # Initialize ArcFace with explicit model download
-        app = FaceAnalysis(
-            name='buffalo_l',
-            root=models_dir,
-            providers=['CPUExecutionProvider']
-        )
+        # Same session options as the worker (see onnx_config), except that
+        # optimized graphs are never saved here: they are tied to the
+        # machine that optimizes them, which may not be the one serving
+        registry = ModelRegistry(root=models_dir, config=dict(load_config(), save_optimized=False))
+        print(f"Session options: {json.dumps(registry.memory_report()['onnx_runtime'])}")
         
         print("\nDownloading models...")
         # Force model download
-        app.prepare(ctx_id=0, det_size=(640, 640))
+        registry.warmup(tasks=tuple(PACK_FILES['buffalo_l']), pack='buffalo_l')
+        for model in registry.memory_report()['models']:
+            print(f"- {model['task']}: {model['file']} (optimized graph: {model['session']['optimized_graph']})")
         
         # Verify model files exist
         print("\nChecking downloaded files...")
@@ -47,6 +62,23 @@ def main():
             print(f"- {file} ({file_size:.2f} MB)")
             
         print("\nArcFace models downloaded successfully!")
+
+        if args.quantize:
+            from model_quantization import quantize_pack
+            print(f"\nQuantizing models ({args.quantize})...")
+            pack_dir = registry.pack_dir('buffalo_l')
+            report = quantize_pack(
+                pack_dir, registry.config, args.quantize,
+                calibration_dir=args.calibration_dir,
+                tasks=tuple(task.strip() for task in args.tasks.split(',') if task.strip()),
+                calibration_limit=args.calibration_limit
+            )
+            report_path = args.report or os.path.join(pack_dir, 'quantization_report.json')
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(json.dumps(report, indent=2))
+            print(f"\nQuantization report written to {report_path}")
+            print("Set FACIAL_MODEL_VARIANT=int8 to use the quantized models")
         
     except Exception as e:
         print(f"Error downloading models: {str(e)}", file=sys.stderr)
@@ -0,0 +1,208 @@
+"""
+Content-addressed cache of face embeddings.
+
+Re-uploads of the same document image (retries of /upload-aadhar, for
+example) hit the cache instead of decoding the image and running detection
+and ArcFace again. Entries are keyed by the SHA-256 of the image bytes plus
+a tag of the models that produced them, so a model change never serves a
+stale vector. "No face" results are cached too; errors are not.
+
+Two tiers:
+    memory  LRU of the most recent max_entries results
+    disk    one .npy per key under FACIAL_CACHE_DIR, evicted oldest-access
+            first once the directory exceeds max_bytes
+
+Set FACIAL_EMBEDDING_CACHE=0 to disable the shared cache.
+"""
+import collections
+import hashlib
+import logging
+import os
+import threading
+
+import numpy as np
+
+from model_registry import PACK_FILES, DEFAULT_DET_SIZE, configured_variant, variant_file
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get(
+    'FACIAL_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'embeddings')
+)
+DEFAULT_MAX_ENTRIES = int(os.environ.get('FACIAL_CACHE_ENTRIES', 1024))
+DEFAULT_MAX_BYTES = int(os.environ.get('FACIAL_CACHE_MB', 256)) * 1024 * 1024
+
+
+def model_tag(pack='buffalo_l', variant=''):
+    """Identifies the models (and settings) whose output a cache entry holds."""
+    files = PACK_FILES.get(pack, {})
+    return '/'.join([
+        f'v{CACHE_VERSION}', pack,
+        variant_file(files.get('detection', ''), configured_variant('detection')), f'det{DEFAULT_DET_SIZE[0]}',
+        variant_file(files.get('recognition', ''), configured_variant('recognition')), variant
+    ])
+
+
+class EmbeddingCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, tag=None):
+        """
+        Args:
+            directory: disk tier location (None: memory only)
+            max_entries: memory tier size
+            max_bytes: disk tier size before eviction
+            tag: model tag mixed into every key (default: model_tag())
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.tag = (tag or model_tag()).encode('utf-8')
+        self._lock = threading.Lock()
+        self._memory = collections.OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in self._disk_entries())
+
+    def key(self, data, variant=b''):
+        """Cache key of raw image bytes (or any bytes-like content)."""
+        digest = hashlib.sha256()
+        digest.update(self.tag)
+        digest.update(b'\0' + variant + b'\0')
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npy')
+
+    def _disk_entries(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.npy'):
+                        yield entry
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def __contains__(self, key):
+        """Whether a key is cached (without counting a lookup)."""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def get(self, key):
+        """
+        Cached embedding for a key.
+
+        Returns (found, embedding): embedding is a float32 array, or None
+        for a cached "no face" result.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return True, self._memory[key]
+        if self.directory:
+            path = self._path(key)
+            try:
+                value = np.load(path)
+                os.utime(path)  # mark as recently used for eviction
+            except (OSError, ValueError):
+                value = None
+            else:
+                value = value if value.size else None
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return True, value
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key, embedding):
+        """Store an embedding (or None for "no face") under a key."""
+        value = None if embedding is None else np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, value)
+            self.writes += 1
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, value if value is not None else np.zeros(0, dtype=np.float32))
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            with self._lock:
+                self._disk_bytes += os.path.getsize(path) - replaced
+                over = self._disk_bytes > self.max_bytes
+            if over:
+                self._evict()
+        except OSError as e:
+            logger.warning(f"Could not write embedding cache entry: {e}")
+
+    def _evict(self):
+        """Delete least recently used files until the disk tier is at 90% of max_bytes."""
+        with self._lock:
+            entries = sorted(self._disk_entries(), key=lambda entry: entry.stat().st_mtime)
+            total = sum(entry.stat().st_size for entry in entries)
+            target = self.max_bytes * 0.9
+            for entry in entries:
+                if total <= target:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide cache, or None when FACIAL_EMBEDDING_CACHE=0."""
+    global _default_cache
+    if os.environ.get('FACIAL_EMBEDDING_CACHE', '1').lower() in ('0', 'false', 'no'):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+def default_cache_stats():
+    """Counters of the shared cache if it has been created, else None."""
+    return _default_cache.stats() if _default_cache is not None else None
@@ -0,0 +1,63 @@
+"""
+Compact text encoding of face embeddings.
+
+By default embeddings leave Python as JSON lists of floats (~10 KB of text
+for 512 dimensions). The opt-in formats encode them as one base64 string
+with a version and format tag:
+
+    "v1.f16.<base64>"  512 little-endian float16              (~1.4 KB)
+    "v1.i8.<base64>"   float32 scale + 512 int8, v ~= q*scale  (~0.7 KB)
+
+The int8 scale is calibrated per vector (max |v| / 127), so no global
+range has to be agreed on. decode_embedding accepts either string or a
+plain list, so stored vectors in the old format keep working.
+"""
+import base64
+
+import numpy as np
+
+FORMAT_VERSION = "v1"
+FORMAT_JSON = "json"
+FORMAT_F16 = "f16"
+FORMAT_I8 = "i8"
+FORMATS = (FORMAT_JSON, FORMAT_F16, FORMAT_I8)
+
+
+def encode_embedding(vector, fmt=FORMAT_JSON):
+    """Encode a vector as a JSON list (fmt="json") or a tagged base64 string."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if fmt == FORMAT_JSON:
+        return vector.tolist()
+    if fmt == FORMAT_F16:
+        payload = vector.astype('<f2').tobytes()
+    elif fmt == FORMAT_I8:
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        payload = np.float32(scale).astype('<f4').tobytes() + quantized.tobytes()
+    else:
+        raise ValueError(f"Unknown embedding format: {fmt}")
+    return f"{FORMAT_VERSION}.{fmt}.{base64.b64encode(payload).decode('ascii')}"
+
+
+def is_encoded(value):
+    return isinstance(value, str) and value.startswith(FORMAT_VERSION + ".")
+
+
+def decode_embedding(value):
+    """float32 array from an encoded string, a list or an array."""
+    if not isinstance(value, str):
+        return np.asarray(value, dtype=np.float32)
+    try:
+        version, fmt, data = value.split(".", 2)
+    except ValueError:
+        raise ValueError("Malformed embedding string")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding version: {version}")
+    payload = base64.b64decode(data)
+    if fmt == FORMAT_F16:
+        return np.frombuffer(payload, dtype='<f2').astype(np.float32)
+    if fmt == FORMAT_I8:
+        scale = np.frombuffer(payload[:4], dtype='<f4')[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding format: {fmt}")
@@ -0,0 +1,468 @@
+"""
+Persistent store of face embeddings with 1:N cosine search.
+
+Vectors are kept L2-normalized in a float32 matrix memory-mapped from disk,
+so cosine similarity against every enrollee is one matrix multiply. The
+matrix is scanned in blocks to bound the temporary score buffer, and
+several query vectors can be searched in the same pass.
+
+On disk a store is a directory:
+
+    manifest.json       {"version": 1, "dim": 512, "generation": 3}
+    vectors-3.f32       row-major float32, capacity x dim (grown by doubling)
+    ids-3.jsonl         append-only log of {"op": "add"|"delete", "id", "row"}
+    lock                pid of the process holding the store for writing
+
+Appends write the vector row, flush it, then log its id, so a crash can at
+worst leave an unused row. Deletes zero the row and log a tombstone;
+compact() rewrites the live rows into the next generation and switches the
+manifest atomically.
+
+One process at a time may open a store for writing: it holds an exclusive
+flock on the lock file until close(), and any other writer (another worker,
+or this CLI while the worker has the store open) gets StoreLockedError
+instead of writing rows the holder does not know about. read_only=True
+opens a store without the lock for search and stats.
+
+To fill a store with the customers enrolled before it existed, stop the
+server (its worker holds the "aadhar" store) and import a mongoexport:
+
+    mongoexport --db DB --collection customers --fields aadharVector \
+        --query '{"aadharVector": {"$exists": true, "$ne": []}}' --out customers.jsonl
+    python embedding_store.py import store/aadhar customers.jsonl --field aadharVector
+
+    python embedding_store.py search STORE_DIR vectors.json -k 5
+    python embedding_store.py import STORE_DIR customers.jsonl --field aadharVector
+    python embedding_store.py compact STORE_DIR
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, stores are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+STORE_VERSION = 1
+MIN_CAPACITY = 1024
+
+
+class StoreLockedError(RuntimeError):
+    """The store is open for writing in another process."""
+
+
+def normalize_rows(vectors, dim=EMBEDDING_DIM):
+    """(N, dim) float32 copy of vectors with every row L2-normalized."""
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    if matrix.shape[1] != dim:
+        raise ValueError(f"Expected {dim}-dimensional vectors, got {matrix.shape[1]}")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    if np.any(norms == 0):
+        raise ValueError("Cannot store or search a zero vector")
+    return matrix / norms
+
+
+class EmbeddingStore:
+    def __init__(self, path, dim=EMBEDDING_DIM, block_rows=65536, read_only=False):
+        """
+        Args:
+            path: store directory (created if missing)
+            dim: embedding dimension
+            block_rows: rows scored per matrix multiply during search
+            read_only: open an existing store for search/stats only,
+                without taking the write lock
+        """
+        self.path = path
+        self.dim = dim
+        self.block_rows = block_rows
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._lock_file = None
+        if read_only:
+            if not os.path.exists(self._manifest_path()):
+                raise FileNotFoundError(f"No embedding store at {path}")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._acquire()
+        self._open()
+
+    def _acquire(self):
+        """Take the store's write lock, or raise StoreLockedError."""
+        if fcntl is None:
+            return
+        lock_file = open(os.path.join(self.path, 'lock'), 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            holder = lock_file.read().strip() or 'another process'
+            lock_file.close()
+            raise StoreLockedError(f"Embedding store {self.path} is open for writing by pid {holder}")
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+
+    # -- files ------------------------------------------------------------
+
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def _vectors_path(self, generation):
+        return os.path.join(self.path, f'vectors-{generation}.f32')
+
+    def _ids_path(self, generation):
+        return os.path.join(self.path, f'ids-{generation}.jsonl')
+
+    def _write_manifest(self, generation):
+        tmp = self._manifest_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'dim': self.dim, 'generation': generation}, f)
+        os.replace(tmp, self._manifest_path())
+
+    def _open(self):
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+            if manifest['dim'] != self.dim:
+                raise ValueError(f"Store {self.path} holds {manifest['dim']}-dimensional vectors, not {self.dim}")
+            self.generation = manifest['generation']
+        else:
+            self.generation = 0
+            open(self._vectors_path(0), 'ab').close()
+            open(self._ids_path(0), 'a').close()
+            self._write_manifest(0)
+
+        size = os.path.getsize(self._vectors_path(self.generation))
+        self._capacity = size // (4 * self.dim)
+        self._matrix = self._map(self._capacity)
+        self._ids = []        # row -> id (None once deleted)
+        self._rows = {}       # id -> row
+        self._replay_log()
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._live[[row for row in self._rows.values()]] = True
+        self._log = None if self.read_only else open(self._ids_path(self.generation), 'a')
+
+    def _check_writable(self):
+        if self.read_only:
+            raise StoreLockedError(f"Embedding store {self.path} was opened read-only")
+
+    def _map(self, capacity):
+        if capacity == 0:
+            return None
+        return np.memmap(self._vectors_path(self.generation), dtype=np.float32,
+                         mode='r' if self.read_only else 'r+', shape=(capacity, self.dim))
+
+    def _replay_log(self):
+        with open(self._ids_path(self.generation)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; its row is simply unused
+                    continue
+                if entry['op'] == 'add':
+                    row = entry['row']
+                    if row >= self._capacity:
+                        continue
+                    while len(self._ids) <= row:
+                        self._ids.append(None)
+                    previous = self._rows.get(entry['id'])
+                    if previous is not None and previous != row:
+                        self._ids[previous] = None
+                    self._ids[row] = entry['id']
+                    self._rows[entry['id']] = row
+                elif entry['op'] == 'delete':
+                    row = self._rows.pop(entry['id'], None)
+                    if row is not None:
+                        self._ids[row] = None
+
+    def _reserve(self, extra):
+        """Grow the vector file so `extra` more rows fit."""
+        needed = len(self._ids) + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(MIN_CAPACITY, self._capacity * 2, needed)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._vectors_path(self.generation), 'r+b') as f:
+            f.truncate(capacity * self.dim * 4)
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._capacity] = self._live
+        self._live = live
+        self._capacity = capacity
+        self._matrix = self._map(capacity)
+
+    def _write_log(self, entries):
+        for entry in entries:
+            self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    # -- public API -------------------------------------------------------
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    def add(self, ids, vectors):
+        """
+        Store vectors under the given ids (an existing id is overwritten in
+        place). Returns the number of live vectors afterwards.
+        """
+        ids = [str(item_id) for item_id in ids]
+        matrix = normalize_rows(vectors, self.dim)
+        if len(ids) != len(matrix):
+            raise ValueError(f"Got {len(ids)} ids for {len(matrix)} vectors")
+
+        with self._lock:
+            self._check_writable()
+            new = [item_id for item_id in dict.fromkeys(ids) if item_id not in self._rows]
+            self._reserve(len(new))
+            entries = []
+            for item_id, vector in zip(ids, matrix):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(item_id)
+                    self._rows[item_id] = row
+                    self._live[row] = True
+                self._matrix[row] = vector
+                entries.append({'op': 'add', 'id': item_id, 'row': row})
+            self._matrix.flush()
+            self._write_log(entries)
+            return len(self._rows)
+
+    def delete(self, ids):
+        """Tombstone the given ids; returns how many were present."""
+        with self._lock:
+            self._check_writable()
+            entries = []
+            for item_id in ids:
+                item_id = str(item_id)
+                row = self._rows.pop(item_id, None)
+                if row is None:
+                    continue
+                self._ids[row] = None
+                self._live[row] = False
+                self._matrix[row] = 0
+                entries.append({'op': 'delete', 'id': item_id})
+            if entries:
+                self._matrix.flush()
+                self._write_log(entries)
+            return len(entries)
+
+    def get(self, item_id):
+        """Stored (normalized) vector of an id, or None."""
+        with self._lock:
+            row = self._rows.get(str(item_id))
+            return None if row is None else np.array(self._matrix[row])
+
+    def iter_vectors(self, block_rows=None):
+        """Yield (ids, (n, dim) float32 copy) for the live vectors, block by block."""
+        block_rows = block_rows or self.block_rows
+        with self._lock:
+            n = len(self._ids)
+        for start in range(0, n, block_rows):
+            with self._lock:
+                stop = min(start + block_rows, len(self._ids))
+                rows = np.flatnonzero(self._live[start:stop]) + start
+                if len(rows) == 0:
+                    continue
+                yield [self._ids[row] for row in rows], np.array(self._matrix[rows])
+
+    def search(self, queries, k=5, threshold=None, exclude=()):
+        """
+        Top-k cosine matches for each query vector.
+
+        Args:
+            queries: one vector or an (M, dim) batch
+            k: matches returned per query
+            threshold: drop matches with a lower score
+            exclude: ids never returned (e.g. the customer being enrolled)
+        Returns:
+            one list per query of {"id", "score"} dicts, best first
+        """
+        q = normalize_rows(queries, self.dim)
+        m = len(q)
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or k <= 0:
+                return [[] for _ in range(m)]
+            excluded = np.array([self._rows[str(item_id)] for item_id in exclude
+                                 if str(item_id) in self._rows], dtype=np.int64)
+            best_scores = np.full((m, 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((m, 0), dtype=np.int64)
+            for start in range(0, n, self.block_rows):
+                stop = min(n, start + self.block_rows)
+                scores = q @ self._matrix[start:stop].T
+                scores[:, ~self._live[start:stop]] = -np.inf
+                if len(excluded):
+                    local = excluded[(excluded >= start) & (excluded < stop)] - start
+                    scores[:, local] = -np.inf
+                if stop - start > k:
+                    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                    scores = np.take_along_axis(scores, top, axis=1)
+                    rows = top + start
+                else:
+                    rows = np.broadcast_to(np.arange(start, stop), scores.shape)
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_rows = np.concatenate([best_rows, rows], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+            order = np.argsort(-best_scores, axis=1, kind='stable')
+            results = []
+            for i in range(m):
+                matches = []
+                for j in order[i]:
+                    score = float(best_scores[i, j])
+                    if score == -np.inf or (threshold is not None and score < threshold):
+                        continue
+                    matches.append({'id': self._ids[best_rows[i, j]], 'score': score})
+                results.append(matches)
+            return results
+
+    def compact(self):
+        """Rewrite the live rows into a new generation, dropping tombstones."""
+        with self._lock:
+            self._check_writable()
+            rows = sorted(self._rows.values())
+            generation = self.generation + 1
+            capacity = max(MIN_CAPACITY, len(rows))
+            with open(self._vectors_path(generation), 'wb') as f:
+                f.truncate(capacity * self.dim * 4)
+            target = np.memmap(self._vectors_path(generation), dtype=np.float32,
+                               mode='r+', shape=(capacity, self.dim))
+            for start in range(0, len(rows), self.block_rows):
+                chunk = rows[start:start + self.block_rows]
+                target[start:start + len(chunk)] = self._matrix[chunk]
+            target.flush()
+            del target
+            with open(self._ids_path(generation), 'w') as f:
+                for new_row, row in enumerate(rows):
+                    f.write(json.dumps({'op': 'add', 'id': self._ids[row], 'row': new_row}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            old = self.generation
+            self._write_manifest(generation)
+            self._close_files()
+            self._open()
+            for path in (self._vectors_path(old), self._ids_path(old)):
+                os.remove(path)
+            return len(self._rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'dim': self.dim,
+                'count': len(self._rows),
+                'rows': len(self._ids),
+                'tombstones': len(self._ids) - len(self._rows),
+                'capacity': self._capacity,
+                'generation': self.generation
+            }
+
+    def _close_files(self):
+        if self._matrix is not None:
+            if not self.read_only:
+                self._matrix.flush()
+            self._matrix = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+            if self._lock_file is not None:
+                # Closing the file releases the flock
+                self._lock_file.close()
+                self._lock_file = None
+
+
+def _read_import(path, field):
+    """(id, vector) pairs from JSON Lines, including mongoexport output."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            item_id = record.get('id', record.get('_id'))
+            if isinstance(item_id, dict):
+                item_id = item_id.get('$oid')
+            vector = record.get(field)
+            if item_id is None or not vector:
+                continue
+            yield str(item_id), vector
+
+
+def main():
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Face embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    search = sub.add_parser("search", help="Top-k matches for a JSON vector or list of vectors")
+    search.add_argument("store")
+    search.add_argument("vectors")
+    search.add_argument("-k", type=int, default=5)
+    search.add_argument("--threshold", type=float)
+    imp = sub.add_parser("import", help="Add vectors from JSON Lines (e.g. mongoexport)")
+    imp.add_argument("store")
+    imp.add_argument("jsonl")
+    imp.add_argument("--field", default="aadharVector", help="Vector field of each record")
+    imp.add_argument("--batch", type=int, default=10000)
+    compact = sub.add_parser("compact", help="Drop deleted rows")
+    compact.add_argument("store")
+    stats = sub.add_parser("stats")
+    stats.add_argument("store")
+    args = parser.parse_args()
+
+    try:
+        store = EmbeddingStore(args.store, read_only=args.command in ("search", "stats"))
+    except StoreLockedError as e:
+        # The worker has the store open: stop the server before importing
+        # or compacting
+        parser.exit(1, f"{e}\n")
+    if args.command == "search":
+        with open(args.vectors) as f:
+            result = store.search(json.load(f), k=args.k, threshold=args.threshold)
+    elif args.command == "import":
+        ids, vectors = [], []
+        for item_id, vector in _read_import(args.jsonl, args.field):
+            ids.append(item_id)
+            vectors.append(vector)
+            if len(ids) >= args.batch:
+                store.add(ids, vectors)
+                ids, vectors = [], []
+        if ids:
+            store.add(ids, vectors)
+        result = store.stats()
+    elif args.command == "compact":
+        store.compact()
+        result = store.stats()
+    else:
+        result = store.stats()
+    store.close()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
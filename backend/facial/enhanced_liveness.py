@@ -1,17 +1,25 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-from insightface.app import FaceAnalysis
+from model_registry import registry, get_face_analysis
+from frame_context import FrameContext
+import landmark_geometry as geometry
+from video_pipeline import VideoPipeline, SamplingPolicy
+from face_embedder import FaceEmbedder
+from frame_selection import FrameSelector
+from screen_artifacts import ScreenArtifactDetector
+from texture_features import lbp_histogram
+from trace_recorder import TraceRecorder
+import instrumentation
+from instrumentation import span
 import json
 import logging
+import os
 import sys
-from skimage.feature import local_binary_pattern
-from scipy.fftpack import fft2, fftshift
-from deepface import DeepFace
 from typing import Tuple, Dict, Any
 
-# Configure logging
-logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+# Configure logging (per-video details are logged at DEBUG; the per-frame
+# signals are in self.trace)
+logging.basicConfig(stream=sys.stderr, level=os.environ.get('FACIAL_LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
 def convert_to_serializable(obj):
@@ -29,36 +37,32 @@ def convert_to_serializable(obj):
         return [convert_to_serializable(item) for item in obj]
     return obj
 
-# MediaPipe face mesh setup
-mp_face_mesh = mp.solutions.face_mesh
+# MediaPipe face mesh setup (mediapipe itself is imported when a detector is built)
 LEFT_EYE = [362, 385, 387, 263, 373, 380]
 RIGHT_EYE = [33, 160, 158, 133, 153, 144]
 
 class EnhancedLivenessDetector:
     def __init__(self):
         # Initialize MediaPipe Face Mesh
-        self.face_mesh = mp_face_mesh.FaceMesh(
+        import mediapipe as mp
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
         
-        # Initialize ArcFace
-        logger.info("Initializing ArcFace...")
-        self.face_analyzer = FaceAnalysis(name='buffalo_l')
-        self.face_analyzer.prepare(ctx_id=0, det_size=(640, 640))
-        logger.info("ArcFace initialized successfully")
-        
-        # Initialize InsightFace anti-spoofing
-        logger.info("Initializing InsightFace anti-spoofing...")
-        try:
-            self.spoof_app = FaceAnalysis(name='antispoofing')
-            self.spoof_app.prepare(ctx_id=0, det_size=(640, 640))
-            logger.info("InsightFace anti-spoofing initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize InsightFace anti-spoofing: {e}")
-            self.spoof_app = None
+        # ArcFace (detection + recognition only) from the shared model
+        # registry; the sessions load on first use and are shared with
+        # arcface_embedding (FACIAL_MODEL_VARIANT=int8 picks the quantized
+        # copies)
+        self.face_analyzer = get_face_analysis(('detection', 'recognition'))
+        # Face template embeddings, detector input sized from FaceMesh
+        self.embedder = FaceEmbedder()
+        # Moiré/glare/edge check on a face ROI, every few frames
+        self.screen_artifacts = ScreenArtifactDetector()
+        # Per-frame signals go here instead of INFO log lines
+        self.trace = TraceRecorder()
         
         # Eye landmarks indices
         self.LEFT_EYE = [362, 385, 387, 263, 373, 380]
@@ -87,59 +91,50 @@ class EnhancedLivenessDetector:
         self.frame_count = 0
         self.movement_history = []  # Track movement over time
         self.cumulative_movement = 0.0  # Track total movement
+        # Short image side each check runs at, served from the per-frame
+        # pyramid (None: full resolution). Brightness/contrast/blur and the
+        # spectrum checks were tuned on webcam video and run at up to 720p:
+        # 720p and smaller uploads are checked at native resolution. Skin reflectance and
+        # texture share the normalized face crop (FrameContext.face_roi).
+        self.CHECK_RESOLUTION = {
+            'quality': 720,
+            'artifacts': 720
+        }
+        self.mesh_inference_count = 0  # FaceMesh inferences run by this detector
+
+    def frame_context(self, frame):
+        """Wrap a BGR frame in a FrameContext, or pass an existing one through."""
+        if isinstance(frame, FrameContext):
+            return frame
+        return FrameContext(frame, self.face_mesh, on_mesh=self._count_mesh_inference)
+
+    def _count_mesh_inference(self):
+        self.mesh_inference_count += 1
+
+    def reset(self):
+        """Clear per-video state so one detector can be reused across videos."""
+        self.prev_landmarks = None
+        self.movement_detected = False
+        self.frame_count = 0
+        self.movement_history = []
+        self.cumulative_movement = 0.0
+        self.embedder.reset()
+        self.screen_artifacts.reset()
+        self.trace.reset()
 
     def get_eye_aspect_ratio(self, landmarks, eye_indices, image_w, image_h) -> float:
-        """Calculate the eye aspect ratio for blink detection."""
-        points = [(int(landmarks[i].x * image_w), int(landmarks[i].y * image_h)) for i in eye_indices]
-        vertical_1 = abs(points[1][1] - points[5][1])
-        vertical_2 = abs(points[2][1] - points[4][1])
-        horizontal = abs(points[0][0] - points[3][0])
-        return (vertical_1 + vertical_2) / (2.0 * horizontal)
+        """Calculate the eye aspect ratio for blink detection from an (N, 3) landmark array."""
+        return geometry.eye_aspect_ratio(landmarks, eye_indices, image_w, image_h)
 
     def get_mouth_aspect_ratio(self, landmarks):
-        # MediaPipe landmarks for inner mouth: 13, 14, 15, 16 (top lip) and 78, 81, 87, 191 (bottom lip)
-        # Outer corners of the mouth: 61 (left), 291 (right)
-        
-        # Vertical distances: average of distances between upper and lower inner lip landmarks
-        dist_v1 = np.linalg.norm(np.array([landmarks.landmark[13].x, landmarks.landmark[13].y]) - np.array([landmarks.landmark[78].x, landmarks.landmark[78].y]))
-        dist_v2 = np.linalg.norm(np.array([landmarks.landmark[14].x, landmarks.landmark[14].y]) - np.array([landmarks.landmark[81].x, landmarks.landmark[81].y]))
-        dist_v3 = np.linalg.norm(np.array([landmarks.landmark[15].x, landmarks.landmark[15].y]) - np.array([landmarks.landmark[87].x, landmarks.landmark[87].y]))
-        dist_v4 = np.linalg.norm(np.array([landmarks.landmark[16].x, landmarks.landmark[16].y]) - np.array([landmarks.landmark[191].x, landmarks.landmark[191].y]))
-        vertical_dist_avg = (dist_v1 + dist_v2 + dist_v3 + dist_v4) / 4.0
-
-        # Horizontal distance: distance between mouth corners
-        dist_h = np.linalg.norm(np.array([landmarks.landmark[61].x, landmarks.landmark[61].y]) - np.array([landmarks.landmark[291].x, landmarks.landmark[291].y]))
-
-        if dist_h == 0:
-            return 0  # Avoid division by zero
-        
-        mar = vertical_dist_avg / dist_h
-        return mar
-
-    def analyze_skin_reflectance(self, frame, face_landmarks):
-        h, w = frame.shape[:2]
-        # Get face region
-        x_min = w
-        x_max = 0
-        y_min = h
-        y_max = 0
-        
-        for landmark in face_landmarks.landmark:
-            x, y = int(landmark.x * w), int(landmark.y * h)
-            x_min = min(x_min, x)
-            x_max = max(x_max, x)
-            y_min = min(y_min, y)
-            y_max = max(y_max, y)
-        
-        # Add padding
-        padding = 20
-        x_min = max(0, x_min - padding)
-        x_max = min(w, x_max + padding)
-        y_min = max(0, y_min - padding)
-        y_max = min(h, y_max + padding)
-        
-        # Extract face region
-        face_region = frame[y_min:y_max, x_min:x_max]
+        """Mouth aspect ratio from an (N, 3) landmark array (see FrameContext.landmark_array)."""
+        return geometry.mouth_aspect_ratio(landmarks)
+
+    def analyze_skin_reflectance(self, ctx):
+        # Normalized face crop (shared with the texture check)
+        face_region = ctx.face_roi()
+        if face_region is None:
+            return False
         
         # Convert to HSV for better skin detection
         hsv = cv2.cvtColor(face_region, cv2.COLOR_BGR2HSV)
@@ -152,10 +147,10 @@ class EnhancedLivenessDetector:
         skin_mask = cv2.inRange(hsv, lower_skin, upper_skin)
         
         # Calculate skin reflectance
-        skin_pixels = np.sum(skin_mask > 0)
+        skin_pixels = np.count_nonzero(skin_mask)
         total_pixels = skin_mask.size
         reflectance_ratio = skin_pixels / total_pixels
-        logger.info(f"Skin reflectance ratio: {reflectance_ratio:.4f} (threshold: {self.SKIN_REFLECTANCE_THRESHOLD})")
+        self.trace.record('reflectance', reflectance_ratio)
         
         return reflectance_ratio > self.SKIN_REFLECTANCE_THRESHOLD
 
@@ -166,146 +161,92 @@ class EnhancedLivenessDetector:
         current_mar = self.get_mouth_aspect_ratio(landmarks)
         prev_mar = self.get_mouth_aspect_ratio(prev_landmarks)
         
-        logger.info(f"  MAR: Current={current_mar:.4f}, Previous={prev_mar:.4f}, Diff={abs(current_mar - prev_mar):.4f}")
+        self.trace.record('mar', current_mar)
+        self.trace.record('mar_delta', abs(current_mar - prev_mar))
         
         # Check if mouth openness changed significantly
         return abs(current_mar - prev_mar) > self.MOUTH_MOVEMENT_THRESHOLD
 
     def get_face_angle(self, landmarks):
         # Calculate face angle using nose bridge and chin landmarks
-        nose_bridge = np.array([landmarks.landmark[1].x, landmarks.landmark[1].y])
-        chin = np.array([landmarks.landmark[152].x, landmarks.landmark[152].y])
-        angle = np.degrees(np.arctan2(chin[1] - nose_bridge[1], chin[0] - nose_bridge[0]))
-        return angle
+        return geometry.face_angle(landmarks)
 
     def get_face_distance(self, landmarks, frame_width, frame_height):
         # Calculate face distance from center of frame
-        face_center = np.array([0.0, 0.0], dtype=np.float64)  # Initialize as float64
-        for landmark in landmarks.landmark:
-            face_center += np.array([landmark.x, landmark.y], dtype=np.float64)
-        face_center /= len(landmarks.landmark)
-        
-        frame_center = np.array([0.5, 0.5], dtype=np.float64)
-        distance = np.linalg.norm(face_center - frame_center)
-        return float(distance)  # Convert to Python float for JSON serialization
+        return geometry.center_distance(landmarks)
 
     def get_face_size(self, landmarks, frame_width, frame_height):
         # Calculate face size relative to frame
-        x_coords = np.array([landmark.x for landmark in landmarks.landmark], dtype=np.float64)
-        y_coords = np.array([landmark.y for landmark in landmarks.landmark], dtype=np.float64)
-        width = float(np.max(x_coords) - np.min(x_coords))
-        height = float(np.max(y_coords) - np.min(y_coords))
-        return width * height
-
-    def detect_screen_artifacts(self, frame):
-        # Convert to grayscale
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        # FFT to detect repetitive patterns (moiré)
-        f = fft2(gray)
-        fshift = fftshift(f)
-        magnitude_spectrum = 20 * np.log(np.abs(fshift) + 1)
-        h, w = magnitude_spectrum.shape
-        center = (h // 2, w // 2)
-        ring = magnitude_spectrum[center[0]-30:center[0]+30, center[1]-30:center[1]+30]
-        outer = magnitude_spectrum[center[0]-100:center[0]+100, center[1]-100:center[1]+100]
-        ring_mean = np.mean(ring)
-        outer_mean = np.mean(outer)
-        moire_value = outer_mean - ring_mean
-        moire_detected = moire_value > 5  # Lowered from 10
-        if moire_detected:
-            logger.info('Screen artifact: Moiré pattern detected!')
-
-        # Glare detection: look for very bright spots
-        glare = np.sum(gray > 240) / (gray.shape[0] * gray.shape[1])
-        glare_detected = glare > 0.005  # Lowered from 0.01
-        if glare_detected:
-            logger.info('Screen artifact: Glare detected!')
-
-        # Edge detection for screen borders
-        edges = cv2.Canny(gray, 100, 200)
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=200, minLineLength=100, maxLineGap=10)
-        edge_count = len(lines) if lines is not None else 0
-        edge_detected = edge_count > 5  # Lowered from 10
-        if edge_detected:
-            logger.info('Screen artifact: Long straight edges detected!')
-
-        # Log the actual values for tuning
-        logger.info(f"Screen artifact values: moire={moire_value:.2f}, glare={glare:.4f}, edge_count={edge_count}")
+        return geometry.normalized_size(landmarks)
+
+    def detect_screen_artifacts(self, ctx):
+        resolution = self.CHECK_RESOLUTION['artifacts']
+        # Grayscale pyramid level (shared with the quality check); glare
+        # and edges are measured on the whole level, moiré on a face ROI
+        # unless its value comes close to the threshold
+        gray = ctx.gray_level(resolution)
+        detected, info = self.screen_artifacts.check(gray, ctx.face_bbox(short_side=resolution))
+        if info['stage'] == 'reused':
+            return detected
+
+        # Record the actual values for tuning (the flags follow from them)
+        values = info['values']
+        self.trace.record('moire', values['moire'])
+        self.trace.record('glare', values['glare'])
+        self.trace.record('edge_count', values['edge_count'])
 
         # Return True if any artifact is detected
-        return moire_detected or glare_detected or edge_detected
-
-    def analyze_skin_texture(self, frame, face_landmarks):
-        # Extract face region
-        h, w = frame.shape[:2]
-        x_min = w
-        x_max = 0
-        y_min = h
-        y_max = 0
-        for landmark in face_landmarks.landmark:
-            x, y = int(landmark.x * w), int(landmark.y * h)
-            x_min = min(x_min, x)
-            x_max = max(x_max, x)
-            y_min = min(y_min, y)
-            y_max = max(y_max, y)
-        padding = 10
-        x_min = max(0, x_min - padding)
-        x_max = min(w, x_max + padding)
-        y_min = max(0, y_min - padding)
-        y_max = min(h, y_max + padding)
-        face_region = frame[y_min:y_max, x_min:x_max]
-        if face_region.size == 0:
+        return detected
+
+    def analyze_skin_texture(self, ctx):
+        # Normalized face crop (shared with the reflectance check)
+        gray_face = ctx.face_roi_gray()
+        if gray_face is None:
             return False
-        gray_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
-        # Compute LBP
-        lbp = local_binary_pattern(gray_face, P=8, R=1, method='uniform')
-        (hist, _) = np.histogram(lbp.ravel(), bins=np.arange(0, 11), range=(0, 10))
-        hist = hist.astype('float')
-        hist /= (hist.sum() + 1e-6)
+        # Uniform LBP (P=8, R=1) histogram
+        hist = lbp_histogram(gray_face)
         # Real skin has a more uniform LBP histogram, screens/photos are more peaky
         uniformity = np.std(hist)
+        self.trace.record('texture_std', uniformity)
         # Threshold: if too peaky, likely not real skin
         return uniformity < 0.12
 
-    def detect_spoofing(self, frame):
+    @property
+    def spoof_app(self):
+        """InsightFace anti-spoofing app, loaded on first use (None if unavailable)."""
+        return registry.pack_app('antispoofing')
+
+    def detect_spoofing(self, ctx):
         if self.spoof_app is None:
             return None
-        faces = self.spoof_app.get(frame)
+        faces = self.spoof_app.get(ctx.frame)
         if not faces:
             return None  # No face detected
         # Return the spoofing score for the largest face
         return faces[0]['spoofing']  # 1: real, 0: spoof
 
-    def detect_blink(self, frame: np.ndarray) -> bool:
-        """Detect if the person in the frame is blinking."""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                h, w = frame.shape[:2]
-                left_ear = self.get_eye_aspect_ratio(face_landmarks.landmark, LEFT_EYE, w, h)
-                right_ear = self.get_eye_aspect_ratio(face_landmarks.landmark, RIGHT_EYE, w, h)
-                ear = (left_ear + right_ear) / 2.0
-                if ear < self.blink_threshold:
-                    logger.info(f"Blink detected - EAR: {ear:.4f}")
-                    return True
+    def detect_blink(self, frame) -> bool:
+        """Detect if the person in the frame (or FrameContext) is blinking."""
+        ctx = self.frame_context(frame)
+        landmarks = ctx.landmark_array
+        
+        if landmarks is not None:
+            left_ear = self.get_eye_aspect_ratio(landmarks, LEFT_EYE, ctx.width, ctx.height)
+            right_ear = self.get_eye_aspect_ratio(landmarks, RIGHT_EYE, ctx.width, ctx.height)
+            ear = (left_ear + right_ear) / 2.0
+            self.trace.record('ear', ear)
+            if ear < self.blink_threshold:
+                return True
         return False
 
     def check_face_movement(self, landmarks) -> bool:
-        """Check if there is significant face movement between frames."""
+        """Check if there is significant face movement between frames (landmarks as an (N, 3) array)."""
         if self.prev_landmarks is None:
             self.prev_landmarks = landmarks
             return False
 
         # Calculate average movement of key facial points
-        movement = 0
-        for i in range(len(landmarks)):
-            dx = landmarks[i].x - self.prev_landmarks[i].x
-            dy = landmarks[i].y - self.prev_landmarks[i].y
-            movement += np.sqrt(dx*dx + dy*dy)
-
-        movement /= len(landmarks)
+        movement = geometry.mean_displacement(landmarks, self.prev_landmarks)
         self.prev_landmarks = landmarks
         
         # Update cumulative movement
@@ -319,8 +260,10 @@ class EnhancedLivenessDetector:
         # Calculate average movement over recent frames
         avg_movement = np.mean(self.movement_history)
         
-        # Log movement information
-        logger.info(f"Frame {self.frame_count}: Movement: {movement:.6f}, Avg: {avg_movement:.6f}, Cumulative: {self.cumulative_movement:.6f}")
+        trace = self.trace
+        trace.record('movement', movement)
+        trace.record('avg_movement', avg_movement)
+        trace.record('cumulative_movement', self.cumulative_movement)
 
         # Consider movement detected if any of these conditions are met:
         # 1. Current movement exceeds threshold
@@ -330,37 +273,36 @@ class EnhancedLivenessDetector:
             avg_movement > self.movement_threshold or 
             self.cumulative_movement > self.cumulative_movement_threshold):
             self.movement_detected = True
-            logger.info(f"Movement detected - Current: {movement:.6f}, Avg: {avg_movement:.6f}, Cumulative: {self.cumulative_movement:.6f}")
             return True
             
         return False
 
-    def check_face_quality(self, frame: np.ndarray) -> bool:
-        """Check face image quality using basic metrics."""
+    def face_quality_metrics(self, frame) -> Dict[str, float]:
+        """Brightness, contrast and blur (Laplacian variance) of a frame or FrameContext."""
+        # Grayscale pyramid level (computed once per FrameContext)
+        gray = self.frame_context(frame).gray_level(self.CHECK_RESOLUTION['quality'])
+        return {
+            'brightness': float(np.mean(gray)),
+            'contrast': float(np.std(gray)),
+            'blur': float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        }
+
+    def check_face_quality(self, frame, metrics=None) -> bool:
+        """Check face image quality using basic metrics (computed unless given)."""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if metrics is None:
+                metrics = self.face_quality_metrics(frame)
             
-            # Check brightness
-            brightness = np.mean(gray)
-            if brightness < 40 or brightness > 220:
-                logger.info(f"Quality check failed - Brightness: {brightness:.2f}")
-                return False
-
-            # Check contrast
-            contrast = np.std(gray)
-            if contrast < 20:
-                logger.info(f"Quality check failed - Contrast: {contrast:.2f}")
-                return False
-
-            # Check blur
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            if laplacian_var < 100:
-                logger.info(f"Quality check failed - Blur: {laplacian_var:.2f}")
-                return False
-
-            logger.info(f"Quality check passed - Brightness: {brightness:.2f}, Contrast: {contrast:.2f}, Blur: {laplacian_var:.2f}")
-            return True
+            trace = self.trace
+            trace.record('brightness', metrics['brightness'])
+            trace.record('contrast', metrics['contrast'])
+            trace.record('blur', metrics['blur'])
+            # Brightness, contrast and blur (Laplacian variance) limits
+            ok = (40 <= metrics['brightness'] <= 220 and
+                  metrics['contrast'] >= 20 and
+                  metrics['blur'] >= 100)
+            trace.record('quality_ok', ok)
+            return ok
         except Exception as e:
             logger.error(f"Error in face quality check: {str(e)}")
             return False
@@ -370,34 +312,54 @@ class EnhancedLivenessDetector:
         Perform comprehensive liveness detection combining multiple checks.
         
         Args:
-            frame: Input image frame (numpy array)
+            frame: Input image frame (numpy array) or FrameContext
             
         Returns:
-            Dictionary containing liveness detection results
+            Dictionary containing liveness detection results (plus
+            "timings" when instrumentation is enabled and this call is
+            not already inside an instrumented operation)
         """
+        with instrumentation.collect('detect_liveness') as timings:
+            result = self._detect_liveness(frame)
+        if timings is not None:
+            result['timings'] = timings.report()
+        return result
+
+    def _detect_liveness(self, frame):
         self.frame_count += 1
+        self.trace.frame(self.frame_count)
+        # Every check below reads the same conversions and FaceMesh result
+        ctx = self.frame_context(frame)
+        with span('facemesh'):
+            ctx.face_landmarks
         
         # Check for blinking
-        is_blinking = self.detect_blink(frame)
-        
-        # Check face quality
-        is_quality_good = self.check_face_quality(frame)
+        with span('blink'):
+            is_blinking = self.detect_blink(ctx)
+        
+        # Check face quality (the metrics also score the frame for selection)
+        quality_metrics = None
+        with span('quality'):
+            try:
+                quality_metrics = self.face_quality_metrics(ctx)
+            except Exception as e:
+                logger.error(f"Error in face quality check: {str(e)}")
+            is_quality_good = quality_metrics is not None and self.check_face_quality(ctx, quality_metrics)
         
         # Check face movement
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
         is_moving = False
-        
-        if results.multi_face_landmarks:
-            for face_landmarks in results.multi_face_landmarks:
-                is_moving = self.check_face_movement(face_landmarks.landmark)
-                break
+        if ctx.landmark_array is not None:
+            with span('movement'):
+                is_moving = self.check_face_movement(ctx.landmark_array)
         
         # Combine results - consider it live if we have both blink and movement
         is_live = is_blinking and (is_moving or self.movement_detected) and is_quality_good
         
-        # Log overall status
-        logger.info(f"Frame {self.frame_count} - Blink: {is_blinking}, Movement: {is_moving or self.movement_detected}, Quality: {is_quality_good}, Live: {is_live}")
+        trace = self.trace
+        trace.record('face', ctx.landmark_array is not None)
+        trace.record('blink', is_blinking)
+        trace.record('moving', is_moving or self.movement_detected)
+        trace.record('live', is_live)
         
         return {
             'is_live': is_live,
@@ -405,14 +367,45 @@ class EnhancedLivenessDetector:
             'is_moving': is_moving or self.movement_detected,
             'is_quality_good': is_quality_good,
             'movement_detected': self.movement_detected,
-            'cumulative_movement': self.cumulative_movement
+            'cumulative_movement': self.cumulative_movement,
+            'quality_metrics': quality_metrics
         }
 
-    def process_frame(self, frame, prev_landmarks=None):
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-        
-        if not results.multi_face_landmarks:
+    def get_frame_embedding(self, ctx):
+        """ArcFace embedding of the face in a FrameContext, or None."""
+        faces = self.face_analyzer.get(ctx.frame)
+        if len(faces) == 0:
+            return None
+        return faces[0].embedding
+
+    def embed_face(self, frame, points):
+        """
+        ArcFace embedding of one selected frame (see FrameSelector), or None.
+
+        The crop is aligned from detector keypoints; the detector input is
+        sized from the frame's FaceMesh landmarks.
+        """
+        return self.embedder.embed_frame(frame, points)
+
+    def process_frame(self, frame, prev_landmarks=None, compute_embedding=True):
+        """
+        Run every per-frame liveness check.
+
+        Args:
+            frame: BGR frame or FrameContext
+            prev_landmarks: (N, 3) landmark array of the previous sampled frame
+            compute_embedding: also run ArcFace on this frame (process_video
+                leaves it off and embeds only the best frames at the end)
+        """
+        ctx = self.frame_context(frame)
+        frame = ctx.frame
+        trace = self.trace
+        trace.frame()
+        
+        with span('facemesh'):
+            face_landmarks = ctx.face_landmarks
+        trace.record('face', face_landmarks is not None)
+        if face_landmarks is None:
             return {
                 "is_live": False,
                 "face_detected": False,
@@ -425,59 +418,76 @@ class EnhancedLivenessDetector:
                 "face_size": None,
                 "screen_artifact": False,
                 "skin_texture": False,
-                "spoofing_score": None
+                "spoofing_score": None,
+                "quality_metrics": None,
+                "landmarks": None
             }
         
-        face_landmarks = results.multi_face_landmarks[0]
-        h, w = frame.shape[:2]
+        landmarks = ctx.landmark_array
+        h, w = ctx.height, ctx.width
         
         # Calculate face metrics
-        face_angle = self.get_face_angle(face_landmarks)
-        face_distance = self.get_face_distance(face_landmarks, w, h)
-        face_size = self.get_face_size(face_landmarks, w, h)
+        face_angle = self.get_face_angle(landmarks)
+        face_distance = self.get_face_distance(landmarks, w, h)
+        face_size = self.get_face_size(landmarks, w, h)
         
         # Check for blink
-        left_ear = self.get_eye_aspect_ratio(face_landmarks.landmark, self.LEFT_EYE, w, h)
-        right_ear = self.get_eye_aspect_ratio(face_landmarks.landmark, self.RIGHT_EYE, w, h)
+        left_ear = self.get_eye_aspect_ratio(landmarks, self.LEFT_EYE, w, h)
+        right_ear = self.get_eye_aspect_ratio(landmarks, self.RIGHT_EYE, w, h)
         ear = (left_ear + right_ear) / 2.0
         blink_detected = ear < self.EAR_THRESHOLD
-        logger.info(f"Frame {frame.shape[0]}x{frame.shape[1]}: EAR={ear:.4f}, Blink Detected: {blink_detected}")
+        trace.record('ear', ear)
+        trace.record('blink', blink_detected)
+        trace.record('face_angle', face_angle)
+        trace.record('face_distance', face_distance)
+        trace.record('face_size', face_size)
         
         # Check skin reflectance
-        skin_reflectance_ok = self.analyze_skin_reflectance(frame, face_landmarks)
-        logger.info(f"Frame {frame.shape[0]}x{frame.shape[1]}: Skin Reflectance OK: {skin_reflectance_ok}")
+        with span('reflectance'):
+            skin_reflectance_ok = self.analyze_skin_reflectance(ctx)
+        trace.record('reflectance_ok', skin_reflectance_ok)
         
-        # Check mouth movement
+        # Check mouth movement (needs the previous frame's landmarks)
         mouth_movement = False
-        if prev_landmarks:
-            mouth_movement = self.detect_mouth_movement(face_landmarks, prev_landmarks)
-            logger.info(f"Frame {frame.shape[0]}x{frame.shape[1]}: Mouth Movement Detected: {mouth_movement}")
-        else:
-            logger.info(f"Frame {frame.shape[0]}x{frame.shape[1]}: No previous landmarks for mouth movement detection.")
+        if prev_landmarks is not None:
+            mouth_movement = self.detect_mouth_movement(landmarks, prev_landmarks)
+            trace.record('mouth_movement', mouth_movement)
 
         # Screen artifact detection
-        screen_artifact = self.detect_screen_artifacts(frame)
+        with span('fft_artifacts'):
+            screen_artifact = self.detect_screen_artifacts(ctx)
         # Skin texture analysis
-        skin_texture = self.analyze_skin_texture(frame, face_landmarks)
+        with span('texture'):
+            skin_texture = self.analyze_skin_texture(ctx)
         # Anti-spoofing detection
-        spoofing_score = self.detect_spoofing(frame)
-        logger.info(f"Spoofing score: {spoofing_score}")
+        with span('antispoof'):
+            spoofing_score = self.detect_spoofing(ctx)
+        trace.record('artifact', screen_artifact)
+        trace.record('texture_ok', skin_texture)
+        trace.record('spoof', spoofing_score)
+
+        # Quality signals, used to rank the frame for the face template
+        with span('quality'):
+            quality_metrics = self.face_quality_metrics(ctx)
+        for name, value in quality_metrics.items():
+            trace.record(name, value)
 
         # Get face embedding using ArcFace
         face_vector = None
-        try:
-            faces = self.face_analyzer.get(frame)
-            if len(faces) > 0:
-                face_vector = faces[0].embedding.tolist()
-                logger.info(f"Frame {frame.shape[0]}x{frame.shape[1]}: Face vector extracted.")
-        except Exception as e:
-            logger.error(f"Error getting face embedding: {e}")
+        if compute_embedding:
+            try:
+                with span('arcface'):
+                    embedding = self.get_frame_embedding(ctx)
+                if embedding is not None:
+                    face_vector = embedding.tolist()
+            except Exception as e:
+                logger.error(f"Error getting face embedding: {e}")
 
         # If spoofing is detected, set is_live to False for this frame
         is_live_frame = blink_detected and skin_reflectance_ok and mouth_movement and not screen_artifact and skin_texture
         if spoofing_score == 0:
-            logger.info("InsightFace anti-spoofing: Spoof detected! Setting is_live to False for this frame.")
             is_live_frame = False
+        trace.record('live', is_live_frame)
 
         return {
             "is_live": is_live_frame,
@@ -491,24 +501,70 @@ class EnhancedLivenessDetector:
             "face_size": face_size,
             "screen_artifact": screen_artifact,
             "skin_texture": skin_texture,
-            "spoofing_score": spoofing_score
+            "spoofing_score": spoofing_score,
+            "quality_metrics": quality_metrics,
+            # (N, 3) float32 array; lets process_video carry landmarks forward
+            "landmarks": landmarks
         }
 
-    def process_video(self, video_path):
-        logger.info(f"Processing video: {video_path}")
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
+    def default_pipeline(self):
+        """
+        Pipeline used by process_video: 30 evenly strided samples from the
+        first 120 frames. It stops early only on a failing frame; a pass
+        needs every sample free of screen artifacts and bad texture.
+        """
+        max_frames = 120
+        target_sampled_frames = 30
+        frame_skip_interval = max(1, max_frames // target_sampled_frames)
+        return VideoPipeline.from_env(
+            sampling=SamplingPolicy.every_nth(frame_skip_interval),
+            max_frames=max_frames,
+            max_samples=target_sampled_frames,
+            exit_on_pass=False
+        )
+
+    def process_video(self, video_path, pipeline=None, trace=None):
+        """
+        Liveness verdict and face template for a video. With
+        instrumentation enabled, detection_details["timings"] has per-stage
+        call counts and cumulative/max durations (inside an instrumented
+        worker job they are in the job's response instead).
+
+        detection_details["trace"] summarizes the per-frame signals; the
+        full trace is written to a file when trace=True or when
+        LIVENESS_TRACE asks for it (see trace_recorder).
+        """
+        with instrumentation.collect('process_video') as timings:
+            result = self._process_video(video_path, pipeline, trace)
+        if timings is not None and result.get('success'):
+            result['detection_details']['timings'] = timings.report()
+        return result
+
+    def _process_video(self, video_path, pipeline, trace):
+        logger.debug(f"Processing video: {video_path}")
+        if pipeline is None:
+            pipeline = self.default_pipeline()
+        run = pipeline.open(video_path)
+        if not run.opened:
             logger.error("Could not open video file")
+            run.close()
             return {
                 "success": False,
                 "error": "Could not open video file"
             }
         
         prev_landmarks = None
+        mesh_inferences_start = self.mesh_inference_count
+        # A new video starts new embedding stats and artifact cadence
+        self.embedder.reset()
+        self.screen_artifacts.reset()
+        self.trace.reset()
         liveness_detected = False
         live_face_vector = None
-        frame_count = 0
-        max_frames = 120
+        # Frames are ranked as they are analyzed; only the best few are
+        # embedded, once the video is done
+        selector = FrameSelector()
+        vector_ready = False
         
         # Counters for liveness actions
         blink_count = 0
@@ -529,32 +585,25 @@ class EnhancedLivenessDetector:
         has_good_skin_reflectance_overall = False
         has_face_movement = False
 
-        processed_frame_count = 0
-        target_sampled_frames = 30
-        frame_skip_interval = max_frames // target_sampled_frames
-        if frame_skip_interval == 0: frame_skip_interval = 1
-
         screen_artifact_frames = 0
         bad_texture_frames = 0
 
-        while cap.isOpened() and frame_count < max_frames and processed_frame_count < target_sampled_frames:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        with run:
+            for frame, frame_index, timestamp_ms in run:
+                self.trace.start(frame_index, timestamp_ms)
+                with span('frame'):
+                    current_frame_results = self.process_frame(frame, prev_landmarks, compute_embedding=False)
             
-            if frame_count % frame_skip_interval == 0:
-                current_frame_results = self.process_frame(frame, prev_landmarks)
-                
                 if current_frame_results["face_detected"]:
                     # Update counters
                     if current_frame_results["blink_detected"]:
                         blink_count += 1
                         has_blinked_overall = True
-                    
+                
                     if current_frame_results["mouth_movement"]:
                         mouth_movement_count += 1
                         has_moved_mouth_overall = True
-                    
+                
                     # Track consecutive skin reflectance frames
                     if current_frame_results["skin_reflectance"]:
                         if prev_skin_state:
@@ -565,20 +614,23 @@ class EnhancedLivenessDetector:
                         has_good_skin_reflectance_overall = True
                     else:
                         consecutive_skin_frames = 0
-                    
+                
                     prev_skin_state = current_frame_results["skin_reflectance"]
-                    
+                
                     # Track face movement
                     if prev_face_angle is not None:
                         angle_change = abs(current_frame_results["face_angle"] - prev_face_angle)
                         angle_changes.append(angle_change)
                         if angle_change > self.MIN_FACE_ANGLE_CHANGE:
                             has_face_movement = True
-                    
+                
                     prev_face_angle = current_frame_results["face_angle"]
                     face_distances.append(current_frame_results["face_distance"])
                     face_sizes.append(current_frame_results["face_size"])
-                    
+
+                    selector.offer(frame_index, frame, current_frame_results["landmarks"],
+                                   current_frame_results["quality_metrics"])
+                
                     # Only capture face vector if all conditions are met
                     if (blink_count >= self.MIN_BLINK_COUNT and 
                         mouth_movement_count >= self.MIN_MOUTH_MOVEMENTS and 
@@ -586,35 +638,35 @@ class EnhancedLivenessDetector:
                         has_face_movement and
                         np.mean(face_distances) < self.MAX_FACE_DISTANCE and
                         np.mean(face_sizes) > self.MIN_FACE_SIZE):
-                        if current_frame_results["face_vector"] is not None:
-                            live_face_vector = current_frame_results["face_vector"]
-                            logger.info(f"Frame {frame_count}: Captured face vector from a live frame.")
-                    
-                    # Update prev_landmarks
-                    rgb_frame_for_landmarks = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    landmarks_result = self.face_mesh.process(rgb_frame_for_landmarks)
-                    if landmarks_result.multi_face_landmarks:
-                        prev_landmarks = landmarks_result.multi_face_landmarks[0]
-                    else:
-                        prev_landmarks = None
-                        logger.info(f"Frame {frame_count}: No face detected by MediaPipe. Resetting prev_landmarks.")
+                        if not vector_ready:
+                            logger.debug(f"Frame {frame_index}: Liveness conditions met; face template will be captured.")
+                        vector_ready = True
+                
+                    # Carry this frame's landmarks forward (no second FaceMesh pass)
+                    prev_landmarks = current_frame_results["landmarks"]
 
                     if current_frame_results["screen_artifact"]:
                         screen_artifact_frames += 1
                     if not current_frame_results["skin_texture"]:
                         bad_texture_frames += 1
                 else:
+                    # No face: mouth movement restarts from the next face
                     prev_landmarks = None
-                    logger.info(f"Frame {frame_count}: No face detected by MediaPipe. Resetting prev_landmarks.")
-                
-                processed_frame_count += 1
-            
-            frame_count += 1
-        
-        cap.release()
-        logger.info(f"Finished video processing. Total frames read: {frame_count}, Processed frames: {processed_frame_count}")
-        logger.info(f"Blink count: {blink_count}, Mouth movements: {mouth_movement_count}, Skin reflectance frames: {skin_reflectance_frames}")
-        logger.info(f"Face movement detected: {has_face_movement}, Average face distance: {np.mean(face_distances):.4f}, Average face size: {np.mean(face_sizes):.4f}")
+
+                # Artifacts or bad texture on any frame fail the video. A pass
+                # is never settled early: every sampled frame must still be
+                # checked for screen artifacts and texture.
+                if screen_artifact_frames > 0 or bad_texture_frames > 0:
+                    if run.settle(False):
+                        break
+
+        pipeline_summary = run.summary()
+        if vector_ready:
+            with span('arcface'):
+                live_face_vector = selector.template(self.embed_face)
+        logger.debug(f"Finished video processing. Total frames read: {pipeline_summary['frames_read']}, Processed frames: {pipeline_summary['frames_sampled']}, Stop reason: {pipeline_summary['stop_reason']}")
+        logger.debug(f"Blink count: {blink_count}, Mouth movements: {mouth_movement_count}, Skin reflectance frames: {skin_reflectance_frames}")
+        logger.debug(f"Face movement detected: {has_face_movement}, Average face distance: {np.mean(face_distances):.4f}, Average face size: {np.mean(face_sizes):.4f}")
 
         # Determine overall liveness based on minimum thresholds
         liveness_detected = (
@@ -631,7 +683,7 @@ class EnhancedLivenessDetector:
             bad_texture_frames == 0
         )
 
-        logger.info(f"Overall Liveness Flags: Blink={has_blinked_overall}, Mouth={has_moved_mouth_overall}, Skin={has_good_skin_reflectance_overall}, Face Movement={has_face_movement}, Final Liveness={liveness_detected}")
+        logger.debug(f"Overall Liveness Flags: Blink={has_blinked_overall}, Mouth={has_moved_mouth_overall}, Skin={has_good_skin_reflectance_overall}, Face Movement={has_face_movement}, Final Liveness={liveness_detected}")
 
         detection_details = {
             "blink_detected": has_blinked_overall,
@@ -644,13 +696,21 @@ class EnhancedLivenessDetector:
             "average_face_distance": float(np.mean(face_distances)),
             "average_face_size": float(np.mean(face_sizes)),
             "screen_artifact_frames": screen_artifact_frames,
-            "bad_texture_frames": bad_texture_frames
+            "bad_texture_frames": bad_texture_frames,
+            "sampled_frames": pipeline_summary["frames_sampled"],
+            "mesh_inferences": self.mesh_inference_count - mesh_inferences_start,
+            "face_embedding": self.embedder.stats(),
+            "frame_selection": selector.summary(),
+            "screen_artifacts": self.screen_artifacts.stats(),
+            "pipeline": pipeline_summary,
+            "trace": self.trace.finish(liveness_detected, trace)
         }
         
         result = {
             "success": True,
             "is_live": liveness_detected,
             "face_vector": live_face_vector,
+            "partial": pipeline_summary["partial"],
             "detection_details": detection_details
         }
         
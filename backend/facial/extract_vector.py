@@ -1,9 +1,18 @@
+import argparse
 import cv2
-import numpy as np
 import sys
 import json
-import os
-from arcface_embedding import get_face_embedding
+from arcface_embedding import (
+    get_face_embedding,
+    get_face_embeddings,
+    EMBEDDING_OK,
+    EMBEDDING_INVALID_IMAGE,
+    EMBEDDING_NO_FACE,
+    EMBEDDING_ERROR
+)
+from embedding_codec import encode_embedding, FORMATS, FORMAT_JSON
+from embedding_cache import default_cache
+import numpy as np
 
 # Redirect all stdout to stderr for debug output
 class StderrRedirect:
@@ -15,15 +24,40 @@ class StderrRedirect:
 # Redirect stdout to stderr for all debug output
 sys.stdout = StderrRedirect()
 
-def extract_face_vector(image_path):
+def _read_bytes(path):
     try:
-        # Load the image
-        image = cv2.imread(image_path)
-        if image is None:
-            return {"error": "Could not load image"}
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def extract_face_vector(image_path, vector_format=FORMAT_JSON):
+    try:
+        # Same file content as an earlier request: reuse its result
+        cache = default_cache()
+        data = _read_bytes(image_path) if cache is not None else None
+        key = cache.key(data) if data is not None else None
+        found, face_vector = cache.get(key) if key is not None else (False, None)
+
+        if not found:
+            # Decode from the bytes already read (cv2.imread otherwise)
+            if data is not None:
+                image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            else:
+                image = cv2.imread(image_path)
+            if image is None:
+                return {"error": "Could not load image"}
 
-        # Get face embedding using ArcFace
-        face_vector = get_face_embedding(image)
+            # Get face embedding using ArcFace
+            if key is not None:
+                # The batch API tells "no face" apart from a failed run and
+                # caches only the first (errors are retried next time)
+                embeddings, statuses = get_face_embeddings([image], cache=cache, keys=[key])
+                if statuses[0] == EMBEDDING_ERROR:
+                    return {"error": "Could not extract face vector"}
+                face_vector = embeddings[0] if statuses[0] == EMBEDDING_OK else None
+            else:
+                face_vector = get_face_embedding(image)
         
         if face_vector is None:
             return {"error": "No face detected in the image"}
@@ -35,18 +69,64 @@ def extract_face_vector(image_path):
         if not isinstance(vector, list) or len(vector) == 0:
             return {"error": "Invalid face vector format"}
 
+        if vector_format != FORMAT_JSON:
+            return {"vector": encode_embedding(face_vector, vector_format)}
         return {"vector": vector}
 
     except Exception as e:
         return {"error": str(e)}
 
+# Error messages matching extract_face_vector for each batch status code
+BATCH_ERRORS = {
+    EMBEDDING_INVALID_IMAGE: "Could not load image",
+    EMBEDDING_NO_FACE: "No face detected in the image"
+}
+
+def extract_face_vectors(image_paths, vector_format=FORMAT_JSON):
+    """
+    Batched extract_face_vector: one result dict per path, in order, with
+    every face sent through the recognition model in a single batch.
+    """
+    try:
+        cache = default_cache()
+        if cache is None:
+            images = [cv2.imread(path) for path in image_paths]
+            embeddings, statuses = get_face_embeddings(images)
+        else:
+            # Key by file content; cached files are never decoded
+            contents = [_read_bytes(path) for path in image_paths]
+            keys = [cache.key(data) if data is not None else None for data in contents]
+            images = [
+                cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if data is not None and key not in cache else None
+                for data, key in zip(contents, keys)
+            ]
+            embeddings, statuses = get_face_embeddings(images, cache=cache, keys=keys)
+    except Exception as e:
+        return [{"error": str(e)} for _ in image_paths]
+
+    results = []
+    for embedding, status in zip(embeddings, statuses):
+        if status == EMBEDDING_OK:
+            results.append({"vector": encode_embedding(embedding, vector_format)})
+        else:
+            results.append({"error": BATCH_ERRORS.get(status, "Could not extract face vector")})
+    return results
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print(json.dumps({"error": "Please provide image path"}))
+    parser = argparse.ArgumentParser(description="Extract ArcFace face vectors")
+    parser.add_argument("image_paths", nargs="*")
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_JSON,
+                        help="Vector encoding (json list, or base64 f16/i8 string)")
+    args = parser.parse_args()
+    if not args.image_paths:
+        sys.__stdout__.write(json.dumps({"error": "Please provide image path"}) + "\n")
         sys.exit(1)
 
-    image_path = sys.argv[1]
-    result = extract_face_vector(image_path)
+    if len(args.image_paths) == 1:
+        result = extract_face_vector(args.image_paths[0], args.format)
+    else:
+        result = {"results": extract_face_vectors(args.image_paths, args.format)}
     
     # Ensure we're outputting valid JSON
     try:
@@ -0,0 +1,89 @@
+"""
+Face template embedding with the detector input sized from FaceMesh.
+
+The face template (a handful of selected frames per video, see
+FrameSelector) is aligned from SCRFD detector keypoints, as the baseline
+did. The detector's input size is picked from the face size FaceMesh
+already observed on that frame: a selfie video with a face filling the
+frame is detected reliably at 160 or 224 instead of 640.
+bench_pyramid.py reports detection rate and embedding agreement per
+detector input size.
+"""
+import numpy as np
+from model_registry import get_model, DEFAULT_DET_SIZE
+
+# Detector input sizes to pick from (multiples of 32) and the face size in
+# detector pixels below which a larger input is used
+DET_SIZES = (160, 224, 320, 480, 640)
+MIN_DET_FACE_PX = 96
+
+
+def choose_det_size(points, image_w, image_h, sizes=DET_SIZES, min_face_px=MIN_DET_FACE_PX):
+    """
+    Smallest detector input size at which the face in an (N, 3) FaceMesh
+    landmark array still spans at least min_face_px pixels.
+    """
+    extent = np.ptp(points[:, :2], axis=0)
+    face_px = max(extent[0] * image_w, extent[1] * image_h)
+    # The detector letterboxes the frame into a square of the input size
+    long_side = float(max(image_w, image_h))
+    for size in sorted(sizes):
+        if face_px * size / long_side >= min_face_px:
+            return (size, size)
+    return (max(sizes), max(sizes))
+
+
+class FaceEmbedder:
+    def __init__(self, det_size=DEFAULT_DET_SIZE, adaptive_det_size=True):
+        """
+        Args:
+            det_size: detector input size (the upper bound when adaptive)
+            adaptive_det_size: size the detector input from the face size
+        """
+        self.det_size = det_size
+        self.adaptive_det_size = adaptive_det_size
+        self.reset()
+
+    def reset(self):
+        self.detections = 0
+        self.last_det_size = None
+
+    def _det_size(self, points, image_w, image_h):
+        if not self.adaptive_det_size:
+            return self.det_size
+        sizes = [size for size in DET_SIZES if size <= self.det_size[0]] or [self.det_size[0]]
+        return choose_det_size(points, image_w, image_h, sizes=sizes)
+
+    def _detect(self, frame, det_size):
+        bboxes, kpss = get_model('detection').detect(
+            frame, input_size=det_size, max_num=0, metric='default')
+        if bboxes.shape[0] == 0 or kpss is None:
+            return None
+        return kpss[0]
+
+    def _recognize(self, frame, kps):
+        from insightface.utils import face_align
+        rec_model = get_model('recognition')
+        aimg = face_align.norm_crop(frame, landmark=kps, image_size=rec_model.input_size[0])
+        return rec_model.get_feat(aimg).flatten()
+
+    def embed_frame(self, frame, points):
+        """
+        ArcFace embedding of a single frame aligned from detector keypoints
+        (the detector input sized from its FaceMesh landmarks), or None if
+        the detector finds no face.
+        """
+        h, w = frame.shape[:2]
+        det_size = self._det_size(points, w, h)
+        self.last_det_size = det_size
+        kps = self._detect(frame, det_size)
+        if kps is None:
+            return None
+        self.detections += 1
+        return self._recognize(frame, kps)
+
+    def stats(self):
+        return {
+            "detections": self.detections,
+            "det_size": list(self.last_det_size) if self.last_det_size else None
+        }
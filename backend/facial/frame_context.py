@@ -0,0 +1,191 @@
+"""
+Per-frame analysis context.
+
+One FrameContext is built per frame and handed to every liveness check.
+Color conversions, the MediaPipe FaceMesh result, the face bounding box and
+the downscaled pyramid levels are computed on first access and memoized, so
+no check repeats work another check already did on the same frame.
+
+Pyramid levels are keyed by their short side, like video resolutions: a
+check that declares it only needs 720p asks for level(720) and every other
+check asking for the same size gets the same array. A 1280x720 (or smaller)
+frame is its own 720 level, so checks tuned at that resolution see exactly
+the pixels they were tuned on.
+
+The face ROI is cropped once and normalized to a canonical square size, so
+the skin checks cost the same for a small face and a close-up selfie.
+"""
+import cv2
+import numpy as np
+from landmark_geometry import pixel_bbox
+
+# Side of the normalized face crop, and the margin around the landmark box
+# as a fraction of its longest side
+FACE_ROI_SIZE = 160
+FACE_ROI_PADDING = 0.05
+
+
+class FrameContext:
+    def __init__(self, frame, face_mesh=None, on_mesh=None):
+        """
+        Args:
+            frame: numpy array of the frame in BGR format
+            face_mesh: MediaPipe FaceMesh used for the landmark pass
+            on_mesh: optional callable invoked once per FaceMesh inference
+        """
+        self.frame = frame
+        self.height, self.width = frame.shape[:2]
+        self._face_mesh = face_mesh
+        self._on_mesh = on_mesh
+        self._rgb = None
+        self._gray = None
+        self._mesh_result = None
+        self._mesh_done = False
+        self._landmark_array = None
+        self._bbox = None
+        self._levels = {}
+        self._gray_levels = {}
+        self._face_rois = {}
+        self._face_roi_grays = {}
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def level(self, short_side=None):
+        """
+        BGR frame downscaled so its short side is at most short_side (the
+        full frame for None or when it is already small enough). Each level
+        is resized from the closest larger level already built.
+        """
+        if short_side is None or min(self.height, self.width) <= short_side:
+            return self.frame
+        if short_side not in self._levels:
+            larger = [side for side in self._levels if side > short_side]
+            source = self._levels[min(larger)] if larger else self.frame
+            scale = short_side / float(min(self.height, self.width))
+            size = (max(1, int(round(self.width * scale))), max(1, int(round(self.height * scale))))
+            self._levels[short_side] = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        return self._levels[short_side]
+
+    def gray_level(self, short_side=None):
+        """Grayscale version of level(short_side)."""
+        if short_side is None or min(self.height, self.width) <= short_side:
+            return self.gray
+        if short_side not in self._gray_levels:
+            self._gray_levels[short_side] = cv2.cvtColor(self.level(short_side), cv2.COLOR_BGR2GRAY)
+        return self._gray_levels[short_side]
+
+    @property
+    def mesh_result(self):
+        """Raw FaceMesh output for this frame (FaceMesh runs at most once)."""
+        if not self._mesh_done:
+            if self._face_mesh is None:
+                raise ValueError("FrameContext was built without a FaceMesh")
+            self._mesh_result = self._face_mesh.process(self.rgb)
+            self._mesh_done = True
+            if self._on_mesh is not None:
+                self._on_mesh()
+        return self._mesh_result
+
+    @property
+    def face_landmarks(self):
+        """Landmark list of the first detected face, or None."""
+        result = self.mesh_result
+        if not result.multi_face_landmarks:
+            return None
+        return result.multi_face_landmarks[0]
+
+    @property
+    def landmarks(self):
+        """Sequence of landmarks of the first detected face, or None."""
+        face_landmarks = self.face_landmarks
+        return face_landmarks.landmark if face_landmarks is not None else None
+
+    @property
+    def landmark_array(self):
+        """
+        Landmarks of the first face as a contiguous float32 (N, 3) array of
+        normalized x, y, z, or None. Cheap to keep across frames, unlike the
+        FaceMesh result which is tied to the graph's output buffers.
+        """
+        if self._landmark_array is None:
+            landmarks = self.landmarks
+            if landmarks is None:
+                return None
+            self._landmark_array = np.array(
+                [(landmark.x, landmark.y, landmark.z) for landmark in landmarks],
+                dtype=np.float32
+            )
+        return self._landmark_array
+
+    def face_roi(self, size=FACE_ROI_SIZE, padding=FACE_ROI_PADDING):
+        """
+        BGR face crop (landmark box plus padding) resized to size x size,
+        or None if no face was found.
+        """
+        key = (size, padding)
+        if key not in self._face_rois:
+            bbox = self.face_bbox()
+            if bbox is None:
+                return None
+            x_min, y_min, x_max, y_max = bbox
+            pad = int(round(max(x_max - x_min, y_max - y_min) * padding))
+            crop = self.frame[max(0, y_min - pad):min(self.height, y_max + pad),
+                              max(0, x_min - pad):min(self.width, x_max + pad)]
+            if crop.size == 0:
+                self._face_rois[key] = None
+            else:
+                shrinking = max(crop.shape[:2]) > size
+                self._face_rois[key] = cv2.resize(
+                    crop, (size, size),
+                    interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        return self._face_rois[key]
+
+    def face_roi_gray(self, size=FACE_ROI_SIZE, padding=FACE_ROI_PADDING):
+        """Grayscale version of face_roi(size, padding)."""
+        key = (size, padding)
+        if key not in self._face_roi_grays:
+            roi = self.face_roi(size, padding)
+            self._face_roi_grays[key] = None if roi is None else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        return self._face_roi_grays[key]
+
+    def face_bbox(self, padding=0, short_side=None):
+        """
+        Pixel bounding box of the face landmarks.
+
+        Args:
+            padding: pixels added on every side (in full-frame pixels, so the
+                margin covers the same part of the face at every level),
+                clipped to the image
+            short_side: give the box in level(short_side) coordinates
+        Returns:
+            (x_min, y_min, x_max, y_max), or None if no face was found
+        """
+        if self._bbox is None:
+            points = self.landmark_array
+            if points is None:
+                return None
+            self._bbox = pixel_bbox(points, self.width, self.height)
+        x_min, y_min, x_max, y_max = self._bbox
+        width, height = self.width, self.height
+        if short_side is not None and min(self.height, self.width) > short_side:
+            level_h, level_w = self.level(short_side).shape[:2]
+            scale = level_w / float(self.width)
+            x_min, y_min, x_max, y_max = (int(v * scale) for v in (x_min, y_min, x_max, y_max))
+            padding = int(round(padding * scale))
+            width, height = level_w, level_h
+        return (
+            max(0, x_min - padding),
+            max(0, y_min - padding),
+            min(width, x_max + padding),
+            min(height, y_max + padding)
+        )
@@ -0,0 +1,148 @@
+"""
+Quality-ranked frame selection and the aggregated face template.
+
+Every analyzed frame gets a cheap score from signals the liveness checks
+already computed: brightness, contrast and Laplacian blur from the quality
+check, plus face size and pose from the FaceMesh landmarks. Only the top-K
+frames are kept, and only those are run through ArcFace once the video is
+done. Their L2-normalized embeddings are averaged into one template, which
+is steadier for matching than the vector of any single frame.
+
+    selector = FrameSelector(k=5)
+    for frame, index, ... in run:
+        selector.offer(index, frame, ctx.landmark_array, quality_metrics)
+    template = selector.template(detector.embed_face)
+"""
+import heapq
+import logging
+import os
+
+import numpy as np
+
+import landmark_geometry as geometry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_FRAMES = int(os.environ.get('LIVENESS_TEMPLATE_FRAMES', 5))
+
+# Values at which each score term saturates at 1.0
+BLUR_REFERENCE = 300.0        # Laplacian variance of a sharp webcam frame
+CONTRAST_REFERENCE = 60.0     # grayscale standard deviation
+SIZE_REFERENCE = 0.15         # landmark box area as a fraction of the frame
+MAX_YAW = 0.5                 # yaw ratio at which the pose term reaches 0
+
+
+def frame_score(metrics, points):
+    """
+    Score in [0, 1] of how useful a frame is for recognition.
+
+    Args:
+        metrics: brightness / contrast / blur dict (see
+            EnhancedLivenessDetector.face_quality_metrics)
+        points: (N, 3) FaceMesh landmark array of the face
+    Returns:
+        (score, terms) where terms holds each factor of the product
+    """
+    terms = {
+        'sharpness': min(1.0, metrics['blur'] / BLUR_REFERENCE),
+        'exposure': max(0.0, 1.0 - abs(metrics['brightness'] - 128.0) / 128.0),
+        'contrast': min(1.0, metrics['contrast'] / CONTRAST_REFERENCE),
+        'size': min(1.0, geometry.normalized_size(points) / SIZE_REFERENCE),
+        'pose': max(0.0, 1.0 - geometry.yaw_ratio(points) / MAX_YAW)
+    }
+    score = 1.0
+    for value in terms.values():
+        score *= value
+    return score, terms
+
+
+def normalized_mean(vectors):
+    """L2-normalized mean of L2-normalized vectors, or None."""
+    if not vectors:
+        return None
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    keep = norms[:, 0] > 0
+    matrix = matrix[keep] / norms[keep]
+    if len(matrix) == 0:
+        return None
+    mean = matrix.mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else None
+
+
+class FrameSelector:
+    def __init__(self, k=DEFAULT_TEMPLATE_FRAMES):
+        """
+        Args:
+            k: number of best frames kept and embedded
+        """
+        self.k = max(1, k)
+        self.reset()
+
+    def reset(self):
+        self._heap = []  # min-heap of (score, frame_index, frame, points, terms)
+        self.frames_scored = 0
+        self.embedded = 0
+
+    @property
+    def count(self):
+        """Number of frames currently kept."""
+        return len(self._heap)
+
+    def offer(self, frame_index, frame, points, metrics):
+        """
+        Score a frame and keep it if it is among the best k so far.
+
+        The frame array is kept by reference; callers must not write into
+        it afterwards. Returns the frame's score.
+        """
+        if points is None or metrics is None:
+            return None
+        score, terms = frame_score(metrics, points)
+        self.frames_scored += 1
+        # frame_index is unique, so ties never compare the arrays
+        entry = (score, frame_index, frame, points, terms)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+        return score
+
+    def selected(self):
+        """Kept frames as (score, frame_index, frame, points), best first."""
+        return [entry[:4] for entry in sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))]
+
+    def template(self, embed):
+        """
+        Normalized mean embedding of the kept frames.
+
+        Args:
+            embed: callable (frame, points) -> embedding or None
+        Returns:
+            list of floats, or None if no kept frame produced an embedding
+        """
+        vectors = []
+        for score, frame_index, frame, points in self.selected():
+            try:
+                embedding = embed(frame, points)
+            except Exception as e:
+                logger.error(f"Error getting face embedding for frame {frame_index}: {e}")
+                continue
+            self.embedded += 1
+            if embedding is not None:
+                vectors.append(embedding)
+        mean = normalized_mean(vectors)
+        return mean.tolist() if mean is not None else None
+
+    def summary(self):
+        return {
+            'k': self.k,
+            'selected_frames': [entry[1] for entry in self.selected()],
+            'frames_scored': self.frames_scored,
+            'embeddings_computed': self.embedded,
+            # Only the kept frames: this goes out with every liveness result
+            'scores': [{'frame_index': frame_index, 'score': score, **terms}
+                       for score, frame_index, _, _, terms
+                       in sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))]
+        }
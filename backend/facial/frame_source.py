@@ -0,0 +1,111 @@
+"""
+Frame source over cv2.VideoCapture that only pays for the frames it returns.
+
+Frames the sampler skips are grab()-ed (demuxed and decoded by the codec,
+but never converted to a BGR array or copied out), long gaps can be jumped
+with a seek, and returned frames can be downscaled right at retrieve time
+for stages that do not need full resolution. Time spent in the source is
+accumulated separately so callers can tell decode cost from analysis cost.
+"""
+import time
+
+import cv2
+
+
+class FrameSource:
+    def __init__(self, video_path, max_side=None):
+        """
+        Args:
+            video_path: path of the video file
+            max_side: if set, retrieved frames are resized so their longest
+                side is at most this many pixels
+        """
+        self.cap = cv2.VideoCapture(video_path)
+        self.max_side = max_side
+        self.index = 0  # index of the next frame grab() would return
+        self.decode_seconds = 0.0
+        self.grabbed = 0
+        self.retrieved = 0
+        self.seeks = 0
+        if self.opened:
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+            self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        else:
+            self.fps = 0.0
+            self.frame_count = 0
+
+    @property
+    def opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def grab(self):
+        """Advance one frame without converting it; returns False at the end."""
+        t0 = time.perf_counter()
+        ok = self.cap.grab()
+        self.decode_seconds += time.perf_counter() - t0
+        if ok:
+            self.index += 1
+            self.grabbed += 1
+        return ok
+
+    def retrieve(self):
+        """BGR array of the last grabbed frame (downscaled if max_side is set), or None."""
+        t0 = time.perf_counter()
+        ok, frame = self.cap.retrieve()
+        if ok and self.max_side:
+            h, w = frame.shape[:2]
+            scale = self.max_side / float(max(h, w))
+            if scale < 1.0:
+                frame = cv2.resize(frame, (int(round(w * scale)), int(round(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        self.decode_seconds += time.perf_counter() - t0
+        if not ok:
+            return None
+        self.retrieved += 1
+        return frame
+
+    def read(self):
+        if not self.grab():
+            return None
+        return self.retrieve()
+
+    def timestamp_ms(self):
+        """Presentation time of the last grabbed frame."""
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if position or self.index <= 1:
+            return position
+        return (self.index - 1) * 1000.0 / self.fps if self.fps else 0.0
+
+    def seek_frame(self, index):
+        """Position the source so the next grab() returns frame `index`."""
+        t0 = time.perf_counter()
+        ok = self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        self.decode_seconds += time.perf_counter() - t0
+        if ok:
+            self.index = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            self.seeks += 1
+        return ok
+
+    def seek_ms(self, timestamp_ms):
+        """Position the source at a presentation time (the backend seeks via keyframes)."""
+        t0 = time.perf_counter()
+        ok = self.cap.set(cv2.CAP_PROP_POS_MSEC, timestamp_ms)
+        self.decode_seconds += time.perf_counter() - t0
+        if ok:
+            self.index = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            self.seeks += 1
+        return ok
+
+    def stats(self):
+        return {
+            "decode_seconds": self.decode_seconds,
+            "frames_grabbed": self.grabbed,
+            "frames_decoded": self.retrieved,
+            "seeks": self.seeks,
+            "max_side": self.max_side
+        }
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
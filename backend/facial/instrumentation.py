@@ -0,0 +1,255 @@
+"""
+Optional timing spans and profiling for the liveness and embedding paths.
+
+Code marks stages with span():
+
+    with instrumentation.collect('process_video') as timings:
+        with instrumentation.span('facemesh'):
+            ...
+    detection_details['timings'] = timings.report()   # when timings is not None
+
+Nothing is measured unless a collection is active on the thread. One is
+started by collect() when FACIAL_INSTRUMENT=1, or for a single worker job
+that asks for it ("instrument": true). Otherwise collect() yields None and
+span() returns a shared no-op, so a disabled span costs one thread-local
+lookup. A collect() nested in another one also yields None: its spans go
+to the outer collection, which alone builds the report.
+
+Each finished collection is folded into process-wide counters, rendered
+in the Prometheus text format by prometheus_text() (the worker's
+"prometheus" command).
+
+FACIAL_PROFILE=1 (or "profile": true on a worker job) also runs cProfile
+over the collection and writes the stats to FACIAL_PROFILE_DIR as
+<operation>-<time>-<pid>.prof, readable with pstats or snakeviz; the
+path is reported in the timings.
+"""
+import cProfile
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('FACIAL_INSTRUMENT', '0').lower() in ('1', 'true', 'yes')
+PROFILE = os.environ.get('FACIAL_PROFILE', '0').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get(
+    'FACIAL_PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+
+class Timings:
+    """Per-stage call count, total and max duration, and histogram buckets."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.stages = {}  # stage -> [count, total_seconds, max_seconds, bucket counts]
+        self.profile_path = None
+        self.started_at = time.perf_counter()
+        self.seconds = None
+
+    def add(self, stage, seconds):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+        buckets = entry[3]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+                break
+
+    def report(self):
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self.started_at
+        return {
+            'operation': self.operation,
+            'total_ms': seconds * 1000.0,
+            'stages': {
+                stage: {'count': count, 'total_ms': total * 1000.0, 'max_ms': peak * 1000.0}
+                for stage, (count, total, peak, _) in sorted(self.stages.items())
+            },
+            'profile': self.profile_path
+        }
+
+
+class _Span:
+    __slots__ = ('timings', 'stage', 't0')
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timings.add(self.stage, time.perf_counter() - self.t0)
+
+
+class _Noop:
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def __enter__(self):
+        return self.value
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def span(stage):
+    """Time a block as one call of stage, if a collection is active."""
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        return _NOOP
+    return _Span(timings, stage)
+
+
+def active():
+    """Timings of the collection running on this thread, or None."""
+    return getattr(_local, 'timings', None)
+
+
+class _Collection:
+    def __init__(self, operation, profile):
+        self.timings = Timings(operation)
+        self.profile = profile
+        self.profiler = None
+
+    def __enter__(self):
+        _local.timings = self.timings
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self.timings
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        timings = self.timings
+        if self.profiler is not None:
+            self.profiler.disable()
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                path = os.path.join(PROFILE_DIR, f"{timings.operation}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+                self.profiler.dump_stats(path)
+                timings.profile_path = path
+            except OSError:
+                pass
+        timings.seconds = time.perf_counter() - timings.started_at
+        _local.timings = None
+        aggregate.fold(timings, failed=exc_type is not None)
+        return False
+
+
+def collect(operation, enabled=None, profile=None):
+    """
+    Context manager collecting the spans of one operation.
+
+    Nested inside another collection it yields None, so only the outermost
+    caller builds a report; spans inside still count toward the outer
+    collection (a process_video run inside a worker job reports into the
+    job). Otherwise it yields a new Timings when instrumentation is enabled
+    (globally, or by enabled=True), else None. profile=True adds a cProfile
+    dump.
+    """
+    if getattr(_local, 'timings', None) is not None:
+        return _NOOP
+    profile = PROFILE if profile is None else profile
+    if not (ENABLED if enabled is None else enabled) and not profile:
+        return _NOOP
+    return _Collection(operation, profile)
+
+
+class Aggregate:
+    """Process-wide totals of every finished collection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}  # operation -> [count, failed, total_seconds]
+        self.stages = {}      # stage -> [count, total_seconds, max_seconds, bucket counts]
+
+    def fold(self, timings, failed=False):
+        with self.lock:
+            entry = self.operations.setdefault(timings.operation, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += int(failed)
+            entry[2] += timings.seconds or 0.0
+            for stage, (count, total, peak, buckets) in timings.stages.items():
+                mine = self.stages.setdefault(stage, [0, 0.0, 0.0, [0] * len(BUCKETS)])
+                mine[0] += count
+                mine[1] += total
+                mine[2] = max(mine[2], peak)
+                mine[3] = [a + b for a, b in zip(mine[3], buckets)]
+
+    def summary(self):
+        with self.lock:
+            return {
+                'operations': {name: {'count': count, 'failed': failed, 'total_seconds': total}
+                               for name, (count, failed, total) in sorted(self.operations.items())},
+                'stages': {name: {'count': count, 'total_seconds': total, 'max_seconds': peak}
+                           for name, (count, total, peak, _) in sorted(self.stages.items())}
+            }
+
+
+aggregate = Aggregate()
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def prometheus_text(extra=()):
+    """
+    Aggregate counters in the Prometheus text exposition format.
+
+    extra: (name, type, help, [(labels dict, value), ...]) metric families
+    to append, e.g. the worker's own job counters.
+    """
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    with aggregate.lock:
+        operations = sorted(aggregate.operations.items())
+        stages = sorted((name, list(entry[:3]) + [list(entry[3])]) for name, entry in aggregate.stages.items())
+
+    family('facial_operations_total', 'counter', 'Instrumented operations run',
+           [({'operation': name}, count) for name, (count, _, _) in operations])
+    family('facial_operations_failed_total', 'counter', 'Instrumented operations that raised',
+           [({'operation': name}, failed) for name, (_, failed, _) in operations])
+    family('facial_operation_seconds_total', 'counter', 'Time spent in instrumented operations',
+           [({'operation': name}, total) for name, (_, _, total) in operations])
+
+    lines.append("# HELP facial_stage_seconds Duration of instrumented stages")
+    lines.append("# TYPE facial_stage_seconds histogram")
+    for name, (count, total, _, buckets) in stages:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'facial_stage_seconds_bucket{{stage="{name}",le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'facial_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'facial_stage_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'facial_stage_seconds_count{{stage="{name}"}} {count}')
+    family('facial_stage_max_seconds', 'gauge', 'Longest single call of each stage since start',
+           [({'stage': name}, peak) for name, (_, _, peak, _) in stages])
+
+    for name, kind, help_text, samples in extra:
+        family(name, kind, help_text, samples)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,93 @@
+"""
+Vectorized geometry over MediaPipe FaceMesh landmarks.
+
+Every function takes the landmarks of one face as a contiguous float32
+(N, 3) array of normalized x, y, z (see FrameContext.landmark_array), so
+each metric is a handful of NumPy operations instead of a Python loop over
+landmark protobufs.
+"""
+import numpy as np
+
+FRAME_CENTER = np.array([0.5, 0.5], dtype=np.float32)
+
+# Inner lip pairs (top, bottom) and the mouth corners used for MAR
+MOUTH_TOP = [13, 14, 15, 16]
+MOUTH_BOTTOM = [78, 81, 87, 191]
+MOUTH_CORNERS = (61, 291)
+
+NOSE_BRIDGE = 1
+CHIN = 152
+EYE_OUTER_CORNERS = (33, 263)
+
+
+def eye_aspect_ratio(points, eye_indices, image_w, image_h):
+    """
+    Eye aspect ratio on pixel-truncated coordinates, as the original
+    per-landmark implementation computed it.
+
+    Returns inf for a degenerate eye (zero width) so it never reads as a blink.
+    """
+    eye = (points[eye_indices, :2] * (image_w, image_h)).astype(np.int32)
+    vertical = np.abs(eye[[1, 2], 1] - eye[[5, 4], 1]).sum()
+    horizontal = abs(int(eye[0, 0]) - int(eye[3, 0]))
+    if horizontal == 0:
+        return float('inf')
+    return float(vertical) / (2.0 * horizontal)
+
+
+def mouth_aspect_ratio(points):
+    """Average inner-lip opening divided by mouth width."""
+    xy = points[:, :2]
+    vertical = np.linalg.norm(xy[MOUTH_TOP] - xy[MOUTH_BOTTOM], axis=1).mean()
+    horizontal = np.linalg.norm(xy[MOUTH_CORNERS[0]] - xy[MOUTH_CORNERS[1]])
+    if horizontal == 0:
+        return 0.0  # Avoid division by zero
+    return float(vertical / horizontal)
+
+
+def mean_displacement(points, prev_points):
+    """Mean 2D distance every landmark moved since the previous frame."""
+    return float(np.linalg.norm(points[:, :2] - prev_points[:, :2], axis=1).mean())
+
+
+def face_angle(points):
+    """Angle in degrees of the nose-bridge to chin line."""
+    dx, dy = points[CHIN, :2] - points[NOSE_BRIDGE, :2]
+    return float(np.degrees(np.arctan2(dy, dx)))
+
+
+def center_distance(points):
+    """Normalized distance of the landmark centroid from the frame center."""
+    return float(np.linalg.norm(points[:, :2].mean(axis=0) - FRAME_CENTER))
+
+
+def yaw_ratio(points):
+    """
+    Horizontal offset of the nose from the midpoint of the outer eye
+    corners, divided by the eye distance: 0 for a frontal face, growing as
+    the head turns.
+    """
+    left = points[EYE_OUTER_CORNERS[0], :2]
+    right = points[EYE_OUTER_CORNERS[1], :2]
+    width = np.linalg.norm(right - left)
+    if width == 0:
+        return float('inf')
+    return float(abs(points[NOSE_BRIDGE, 0] - (left[0] + right[0]) / 2.0) / width)
+
+
+def normalized_size(points):
+    """Area of the landmark bounding box as a fraction of the frame."""
+    extent = np.ptp(points[:, :2], axis=0)
+    return float(extent[0]) * float(extent[1])
+
+
+def pixel_bbox(points, image_w, image_h):
+    """(x_min, y_min, x_max, y_max) pixel bounding box of the landmarks."""
+    lo = points[:, :2].min(axis=0)
+    hi = points[:, :2].max(axis=0)
+    return (
+        int(lo[0] * image_w),
+        int(lo[1] * image_h),
+        int(hi[0] * image_w),
+        int(hi[1] * image_h)
+    )
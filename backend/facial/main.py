@@ -1,34 +1,49 @@
+import argparse
 import sys
 import json
 import logging
-import cv2
-import numpy as np
+import os
+from video_pipeline import VideoPipeline
 from enhanced_liveness import EnhancedLivenessDetector
-from arcface_embedding import get_face_embedding
+from frame_selection import FrameSelector
+from embedding_codec import encode_embedding, FORMATS, FORMAT_JSON
+import instrumentation
 
 # Configure logging to write to stderr
-logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+logging.basicConfig(stream=sys.stderr, level=os.environ.get('FACIAL_LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-def run_liveliness_and_extract_vector(video_path):
+def run_liveliness_and_extract_vector(video_path, detector=None, pipeline=None, vector_format=FORMAT_JSON,
+                                     trace=None):
+    # One collection for the whole video: the per-frame detect_liveness
+    # calls report into it instead of building a report each
+    with instrumentation.collect('liveness') as timings:
+        result = _run_liveliness_and_extract_vector(video_path, detector, pipeline, vector_format, trace)
+    if timings is not None and 'detection_details' in result:
+        result['detection_details']['timings'] = timings.report()
+    return result
+
+def _run_liveliness_and_extract_vector(video_path, detector, pipeline, vector_format, trace):
     try:
-        # Initialize the enhanced liveness detector
-        detector = EnhancedLivenessDetector()
-        
-        # Open the video file
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return {
-                "is_live": False,
-                "live_face_vector": None,
-                "error": "Could not open video file"
-            }
+        # Initialize the enhanced liveness detector, or reuse the caller's
+        # (the persistent worker keeps one loaded across requests)
+        if detector is None:
+            detector = EnhancedLivenessDetector()
+        else:
+            detector.reset()
+
+        # Every frame by default; sampling, budgets and deadline can be
+        # tuned per deployment through the LIVENESS_* environment variables
+        if pipeline is None:
+            pipeline = VideoPipeline.from_env()
 
         # Variables to track liveness detection
         blink_detected = False
         movement_detected = False
         quality_good = True # Initialize as True, will be set to False if any frame fails quality
         live_face_vector = None
+        # Every frame is scored; only the best few are embedded at the end
+        selector = FrameSelector()
         detection_details = {
             "blink_detected": False,
             "movement_detected": False,
@@ -37,48 +52,68 @@ def run_liveliness_and_extract_vector(video_path):
         }
 
         # Process video frames
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            detection_details["frames_processed"] += 1
+        with pipeline.open(video_path) as run:
+            if not run.opened:
+                return {
+                    "is_live": False,
+                    "live_face_vector": None,
+                    "error": "Could not open video file"
+                }
 
-            # Run liveness detection
-            result = detector.detect_liveness(frame)
-            
-            # Update detection status
-            if result["is_blinking"]:
-                blink_detected = True
-                detection_details["blink_detected"] = True
-            
-            if result["is_moving"]:
-                movement_detected = True
-                detection_details["movement_detected"] = True
-            
-            # Update overall quality_good status: it must be good for ALL frames
-            if not result["is_quality_good"]:
-                quality_good = False
-            detection_details["quality_good"] = quality_good
+            for frame, frame_index, timestamp_ms in run:
+                detection_details["frames_processed"] += 1
 
-            # If we have all required checks, extract face vector
-            if blink_detected and movement_detected and quality_good and live_face_vector is None:
-                live_face_vector = get_face_embedding(frame)
-                if live_face_vector is not None:
-                    live_face_vector = live_face_vector.tolist()
+                # Run liveness detection (its per-frame signals go to detector.trace)
+                detector.trace.start(frame_index, timestamp_ms)
+                ctx = detector.frame_context(frame)
+                result = detector.detect_liveness(ctx)
+                selector.offer(frame_index, frame, ctx.landmark_array, result["quality_metrics"])
+                
+                # Update detection status
+                if result["is_blinking"]:
+                    blink_detected = True
+                    detection_details["blink_detected"] = True
+                
+                if result["is_moving"]:
+                    movement_detected = True
+                    detection_details["movement_detected"] = True
+                
+                # Update overall quality_good status: it must be good for ALL frames
+                if not result["is_quality_good"]:
+                    quality_good = False
+                detection_details["quality_good"] = quality_good
 
-            # If we have all required checks, we can stop processing
-            if blink_detected and movement_detected and quality_good and live_face_vector is not None:
-                break
+                # One bad-quality frame fails the video; all checks plus a
+                # frame to build the vector from pass it. Either way later
+                # frames cannot change it.
+                if not quality_good:
+                    verdict = False
+                elif blink_detected and movement_detected and selector.count > 0:
+                    verdict = True
+                else:
+                    verdict = None
+                if run.settle(verdict):
+                    break
 
-        cap.release()
+        # If we have all required checks, build the face vector from the
+        # best-scored frames
+        if blink_detected and movement_detected and quality_good:
+            live_face_vector = selector.template(detector.embed_face)
+            if live_face_vector is not None and vector_format != FORMAT_JSON:
+                live_face_vector = encode_embedding(live_face_vector, vector_format)
+        detection_details["frame_selection"] = selector.summary()
+        detection_details["pipeline"] = run.summary()
 
         # Determine overall liveness
         is_live = blink_detected and movement_detected and quality_good and live_face_vector is not None
+        # Summary of the per-frame signals; the full trace is written on
+        # failure or when requested
+        detection_details["trace"] = detector.trace.finish(is_live, trace)
 
         return {
             "is_live": is_live,
             "live_face_vector": live_face_vector,
+            "partial": run.partial,
             "detection_details": detection_details
         }
 
@@ -91,11 +126,17 @@ def run_liveliness_and_extract_vector(video_path):
         }
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="Liveness check and face vector extraction")
+    parser.add_argument("video_path", nargs="?")
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_JSON,
+                        help="Vector encoding (json list, or base64 f16/i8 string)")
+    parser.add_argument("--trace", action="store_true", default=None,
+                        help="Write the per-frame trace file even if the check passes")
+    args = parser.parse_args()
+    if not args.video_path:
         print(json.dumps({"error": "Please provide video path"}))
         sys.exit(1)
     
-    video_path = sys.argv[1]
-    result = run_liveliness_and_extract_vector(video_path)
+    result = run_liveliness_and_extract_vector(args.video_path, vector_format=args.format, trace=args.trace)
     # Ensure we only print the JSON result to stdout
     print(json.dumps(result))
\ No newline at end of file
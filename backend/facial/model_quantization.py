@@ -0,0 +1,273 @@
+"""
+INT8 copies of the buffalo_l detection and recognition models.
+
+    dynamic  weights quantized offline, activations at run time; needs no
+             calibration images
+    static   weights and activations quantized offline (QDQ, per-channel
+             weights); activation ranges are calibrated on local face
+             images, which must look like production input
+
+Each quantized file is written next to its fp32 original as
+<name>.int8.onnx (see model_registry.variant_file), where the registry
+picks it up when FACIAL_MODEL_VARIANT=int8. The report compares every
+quantized model with its fp32 original on held-out images: file size,
+CPU latency, and agreement of the outputs that matter downstream:
+
+    recognition  cosine(fp32 embedding, int8 embedding) of the same crop,
+                 and compare_faces decisions (cosine > 0.35) over all pairs
+    detection    top-face IoU, and cosine of the fp32 embeddings of the
+                 crops aligned from each model's keypoints
+
+Run through download_models.py:
+
+    python download_models.py --quantize static --calibration-dir ../uploads/aadhar
+"""
+import glob
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+from onnxruntime.quantization import (
+    CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+    quantize_dynamic, quantize_static
+)
+
+from model_registry import PACK_FILES, DEFAULT_DET_SIZE, DEFAULT_DET_THRESH, variant_file, wrap_session
+from onnx_config import create_session
+
+logger = logging.getLogger(__name__)
+
+QUANTIZE_MODES = ('dynamic', 'static')
+QUANTIZED_TASKS = ('detection', 'recognition')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MATCH_THRESHOLD = 0.35
+
+
+class BlobReader(CalibrationDataReader):
+    """Feeds preprocessed input blobs to the static quantizer."""
+
+    def __init__(self, input_name, blobs):
+        self._feeds = iter([{input_name: blob} for blob in blobs])
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+
+def load_images(directory, limit=200):
+    paths = sorted(path for path in glob.glob(os.path.join(directory, '**', '*'), recursive=True)
+                   if path.lower().endswith(IMAGE_EXTENSIONS))
+    images = [image for image in (cv2.imread(path) for path in paths[:limit]) if image is not None]
+    logger.info(f"Loaded {len(images)} calibration images from {directory}")
+    return images
+
+
+def detection_blob(image, det_model, input_size=DEFAULT_DET_SIZE):
+    """Letterboxed input blob, exactly as RetinaFace.detect builds it."""
+    h, w = image.shape[:2]
+    if h / w > input_size[1] / input_size[0]:
+        new_h, new_w = input_size[1], int(input_size[1] * w / h)
+    else:
+        new_w, new_h = input_size[0], int(input_size[0] * h / w)
+    canvas = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    canvas[:new_h, :new_w] = cv2.resize(image, (new_w, new_h))
+    return cv2.dnn.blobFromImage(canvas, 1.0 / det_model.input_std, tuple(input_size),
+                                 (det_model.input_mean,) * 3, swapRB=True)
+
+
+def recognition_blob(crop, rec_model):
+    return cv2.dnn.blobFromImages([crop], 1.0 / rec_model.input_std, tuple(rec_model.input_size),
+                                  (rec_model.input_mean,) * 3, swapRB=True)
+
+
+def load_model(path, config, source=None):
+    """Prepared insightface wrapper around a session built with config."""
+    session, _ = create_session(path, config)
+    model = wrap_session(source or path, session)
+    if model.taskname == 'detection':
+        model.prepare(ctx_id=0, input_size=DEFAULT_DET_SIZE, det_thresh=DEFAULT_DET_THRESH)
+    else:
+        model.prepare(ctx_id=0)
+    return model
+
+
+def top_face(det_model, image):
+    bboxes, kpss = det_model.detect(image, input_size=DEFAULT_DET_SIZE, max_num=1, metric='default')
+    if bboxes.shape[0] == 0 or kpss is None:
+        return None, None
+    return bboxes[0, :4], kpss[0]
+
+
+def aligned_crops(det_model, rec_model, images):
+    crops = []
+    for image in images:
+        _, kps = top_face(det_model, image)
+        if kps is not None:
+            crops.append(face_align.norm_crop(image, landmark=kps, image_size=rec_model.input_size[0]))
+    return crops
+
+
+def quantize_model(source, output, mode, reader=None):
+    """Write an INT8 copy of source to output."""
+    prepared = output + '.prep.onnx'
+    try:
+        # Shape inference + graph cleanup lets more nodes be quantized
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(source, prepared)
+        model_input = prepared
+    except Exception as e:
+        logger.warning(f"Pre-processing {os.path.basename(source)} failed ({e}); quantizing as is")
+        model_input = source
+    try:
+        if mode == 'dynamic':
+            # ConvInteger on CPU only takes uint8 weights
+            quantize_dynamic(model_input, output, weight_type=QuantType.QUInt8)
+        else:
+            quantize_static(model_input, output, reader, quant_format=QuantFormat.QDQ,
+                            per_channel=True, activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8, calibrate_method=CalibrationMethod.MinMax)
+    finally:
+        if os.path.exists(prepared):
+            os.remove(prepared)
+
+
+def latency_ms(model, blob, runs=30, warmup=3):
+    feed = {model.input_name: blob}
+    for _ in range(warmup):
+        model.session.run(None, feed)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        model.session.run(None, feed)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return {'mean': float(np.mean(times)), 'p50': float(np.percentile(times, 50)),
+            'p95': float(np.percentile(times, 95))}
+
+
+def _normalized(x):
+    x = np.asarray(x, dtype=np.float64)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _cosine_summary(a, b):
+    if not len(a):
+        return None
+    cosines = np.sum(_normalized(a) * _normalized(b), axis=1)
+    return {'mean': float(cosines.mean()), 'min': float(cosines.min()),
+            'p5': float(np.percentile(cosines, 5)), 'samples': int(len(cosines))}
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def recognition_agreement(fp32_rec, int8_rec, crops):
+    if not crops:
+        return {'cosine': None}
+    reference = fp32_rec.get_feat(crops)
+    quantized = int8_rec.get_feat(crops)
+    report = {'cosine': _cosine_summary(reference, quantized)}
+    if len(crops) > 1:
+        pairs = np.triu_indices(len(crops), k=1)
+        before = (_normalized(reference) @ _normalized(reference).T)[pairs] > MATCH_THRESHOLD
+        after = (_normalized(quantized) @ _normalized(quantized).T)[pairs] > MATCH_THRESHOLD
+        report.update(pairs=int(len(before)), decision_flips=int(np.count_nonzero(before != after)))
+    return report
+
+
+def detection_agreement(fp32_det, int8_det, fp32_rec, images):
+    found_both = found_one = 0
+    ious, reference, quantized = [], [], []
+    size = fp32_rec.input_size[0]
+    for image in images:
+        box_a, kps_a = top_face(fp32_det, image)
+        box_b, kps_b = top_face(int8_det, image)
+        if kps_a is None and kps_b is None:
+            continue
+        if kps_a is None or kps_b is None:
+            found_one += 1
+            continue
+        found_both += 1
+        ious.append(_iou(box_a, box_b))
+        reference.append(face_align.norm_crop(image, landmark=kps_a, image_size=size))
+        quantized.append(face_align.norm_crop(image, landmark=kps_b, image_size=size))
+    return {
+        'faces_found_by_both': found_both,
+        'faces_found_by_one': found_one,
+        'top_face_iou': {'mean': float(np.mean(ious)), 'min': float(np.min(ious))} if ious else None,
+        'embedding_cosine': _cosine_summary(fp32_rec.get_feat(reference), fp32_rec.get_feat(quantized))
+        if reference else None
+    }
+
+
+def quantize_pack(pack_dir, config, mode, calibration_dir=None, tasks=QUANTIZED_TASKS,
+                  pack='buffalo_l', calibration_limit=200):
+    """
+    Quantize the given tasks of a pack and compare them with fp32.
+
+    Images from calibration_dir are split in two: even ones calibrate the
+    static quantizer, odd ones are used for the report.
+    """
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"Quantization mode must be one of {QUANTIZE_MODES}, got {mode!r}")
+    if mode == 'static' and not calibration_dir:
+        raise ValueError("Static quantization needs --calibration-dir")
+
+    sources = {task: os.path.join(pack_dir, PACK_FILES[pack][task]) for task in QUANTIZED_TASKS}
+    fp32 = {task: load_model(path, config) for task, path in sources.items()}
+
+    images = load_images(calibration_dir, calibration_limit) if calibration_dir else []
+    calibration = images[::2]
+    evaluation = images[1::2] if len(images) > 1 else images
+    if mode == 'static' and not calibration:
+        raise ValueError(f"No readable images in {calibration_dir}")
+
+    report = {'mode': mode, 'pack': pack, 'calibration_images': len(calibration),
+              'evaluation_images': len(evaluation), 'models': []}
+    for task in tasks:
+        source = sources[task]
+        output = os.path.join(pack_dir, variant_file(PACK_FILES[pack][task], 'int8'))
+        reader = None
+        if mode == 'static':
+            if task == 'detection':
+                blobs = [detection_blob(image, fp32['detection']) for image in calibration]
+            else:
+                blobs = [recognition_blob(crop, fp32['recognition'])
+                         for crop in aligned_crops(fp32['detection'], fp32['recognition'], calibration)]
+            if not blobs:
+                raise ValueError(f"No faces found in the calibration images for {task}")
+            reader = BlobReader(fp32[task].input_name, blobs)
+
+        t0 = time.time()
+        quantize_model(source, output, mode, reader)
+        logger.info(f"Quantized {os.path.basename(source)} ({mode}) in {time.time() - t0:.1f}s")
+        quantized = load_model(output, config, source=source)
+
+        if task == 'detection':
+            sample = detection_blob(evaluation[0], fp32[task]) if evaluation else \
+                np.zeros((1, 3, DEFAULT_DET_SIZE[1], DEFAULT_DET_SIZE[0]), dtype=np.float32)
+            agreement = detection_agreement(fp32[task], quantized, fp32['recognition'], evaluation)
+        else:
+            crops = aligned_crops(fp32['detection'], fp32[task], evaluation)
+            size = tuple(fp32[task].input_size)
+            sample = recognition_blob(crops[0], fp32[task]) if crops else \
+                np.zeros((1, 3, size[1], size[0]), dtype=np.float32)
+            agreement = recognition_agreement(fp32[task], quantized, crops)
+
+        report['models'].append({
+            'task': task,
+            'fp32_file': os.path.basename(source),
+            'int8_file': os.path.basename(output),
+            'fp32_mb': os.path.getsize(source) / (1024 * 1024),
+            'int8_mb': os.path.getsize(output) / (1024 * 1024),
+            'fp32_latency_ms': latency_ms(fp32[task], sample),
+            'int8_latency_ms': latency_ms(quantized, sample),
+            'agreement': agreement
+        })
+    return report
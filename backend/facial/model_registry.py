@@ -0,0 +1,349 @@
+"""
+Process-wide registry of the insightface ONNX models.
+
+Every model file of a pack is loaded at most once per process, on first use,
+and the same session is handed to every caller. Callers ask only for the
+modules they need (for example detection + recognition), so the landmark and
+genderage heads of buffalo_l are never loaded unless someone uses them.
+
+Sessions are created with the options from onnx_config (threads, graph
+optimization, memory arena, saved optimized graphs) and wrapped in the
+insightface model class matching their inputs, as model_zoo would.
+
+FACIAL_MODEL_VARIANT=int8 loads the quantized copies written by
+`download_models.py --quantize` instead of the fp32 files;
+FACIAL_DETECTION_VARIANT / FACIAL_RECOGNITION_VARIANT set it per task.
+A missing variant file falls back to fp32 with a warning.
+"""
+import glob
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+
+from onnx_config import load_config, create_session
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Get the absolute path to the models directory
+current_dir = os.path.dirname(os.path.abspath(__file__))
+models_dir = os.path.join(current_dir, 'models')
+
+# Known file for each task of a pack, so one task can be loaded without
+# opening every other file in the pack to discover its task name
+PACK_FILES = {
+    'buffalo_l': {
+        'detection': 'det_10g.onnx',
+        'recognition': 'w600k_r50.onnx',
+        'landmark_3d_68': '1k3d68.onnx',
+        'landmark_2d_106': '2d106det.onnx',
+        'genderage': 'genderage.onnx',
+    }
+}
+
+MODEL_VARIANTS = ('fp32', 'int8')
+
+# Detector input size; FACIAL_DET_SIZE=480 trades small-face recall for speed
+DEFAULT_DET_SIZE = (int(os.environ.get('FACIAL_DET_SIZE', 640)),) * 2
+DEFAULT_DET_THRESH = 0.5
+
+
+# Create a context manager to redirect stdout
+class StdoutRedirect:
+    def __init__(self):
+        self.old_stdout = sys.stdout
+        self.redirected_output = io.StringIO()
+
+    def __enter__(self):
+        sys.stdout = self.redirected_output
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sys.stdout = self.old_stdout
+        # Write the captured output to stderr
+        sys.stderr.write(self.redirected_output.getvalue())
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SharedFaceAnalysis:
+    """
+    Drop-in for insightface's FaceAnalysis.get() backed by registry models.
+
+    Only the modules listed are run (and therefore loaded) for each face.
+    """
+
+    def __init__(self, registry, modules, pack='buffalo_l', det_size=DEFAULT_DET_SIZE):
+        if 'detection' not in modules:
+            raise ValueError("modules must include 'detection'")
+        self.registry = registry
+        self.modules = tuple(modules)
+        self.pack = pack
+        self.det_size = tuple(det_size)
+
+    def get(self, img, max_num=0):
+        from insightface.app.common import Face
+
+        det_model = self.registry.get_model('detection', self.pack)
+        with span('detection'):
+            bboxes, kpss = det_model.detect(img, input_size=self.det_size, max_num=max_num, metric='default')
+        if bboxes.shape[0] == 0:
+            return []
+
+        faces = []
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            face = Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4])
+            for task in self.modules:
+                if task == 'detection':
+                    continue
+                model = self.registry.get_model(task, self.pack)
+                with span(task):
+                    model.get(img, face)
+            faces.append(face)
+        return faces
+
+
+def variant_file(filename, variant):
+    """File name of a model variant: det_10g.onnx -> det_10g.int8.onnx."""
+    if variant == 'fp32':
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{variant}{ext}'
+
+
+def _is_variant(path):
+    return any(path.endswith(f'.{variant}.onnx') for variant in MODEL_VARIANTS[1:])
+
+
+def configured_variant(task, environ=None):
+    environ = os.environ if environ is None else environ
+    variant = environ.get(f'FACIAL_{task.upper()}_VARIANT') or environ.get('FACIAL_MODEL_VARIANT', 'fp32')
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Model variant must be one of {MODEL_VARIANTS}, got {variant!r}")
+    return variant
+
+
+def wrap_session(path, session):
+    """
+    insightface model object for a session, chosen by input/output shapes
+    the way insightface's model_zoo router does (None if unrecognized).
+    """
+    from insightface.model_zoo.retinaface import RetinaFace
+    from insightface.model_zoo.landmark import Landmark
+    from insightface.model_zoo.attribute import Attribute
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+
+    input_shape = session.get_inputs()[0].shape
+    if len(session.get_outputs()) >= 5:
+        return RetinaFace(model_file=path, session=session)
+    if input_shape[2] == 192 and input_shape[3] == 192:
+        return Landmark(model_file=path, session=session)
+    if input_shape[2] == 96 and input_shape[3] == 96:
+        return Attribute(model_file=path, session=session)
+    if input_shape[2] == input_shape[3] and input_shape[2] >= 112 and input_shape[2] % 16 == 0:
+        return ArcFaceONNX(model_file=path, session=session)
+    return None
+
+
+class ModelRegistry:
+    def __init__(self, root=models_dir, providers=None, config=None, variants=None):
+        """
+        Args:
+            root: directory holding the model packs
+            providers: execution providers (default: from onnx_config)
+            config: onnx_config settings (default: load_config())
+            variants: {task: 'fp32' | 'int8'} (default: from the environment)
+        """
+        self.root = root
+        self.variants = dict(variants or {})
+        self.config = dict(config or load_config())
+        if providers:
+            self.config['providers'] = list(providers)
+        self.providers = self.config['providers']
+        self._lock = threading.RLock()
+        self._models = {}
+        self._stats = {}
+        self._apps = {}
+        self._analyzers = {}
+        self._session_info = {}
+
+    def pack_dir(self, pack):
+        """Directory holding a pack's ONNX files, downloading it if missing."""
+        from insightface.utils.storage import ensure_available
+        with StdoutRedirect():
+            return ensure_available('models', pack, root=self.root)
+
+    def variant(self, task):
+        """Model variant requested for a task."""
+        return self.variants.get(task) or configured_variant(task)
+
+    def _load_file(self, path, source=None):
+        """
+        Load one model file. source is the fp32 file a quantized variant
+        was made from; the wrapper reads its preprocessing from that graph.
+        """
+        session, info = create_session(path, self.config)
+        self._session_info[os.path.basename(path)] = info
+        with StdoutRedirect():
+            return wrap_session(source or path, session)
+
+    def _prepare(self, model):
+        if model.taskname == 'detection':
+            model.prepare(ctx_id=0, input_size=DEFAULT_DET_SIZE, det_thresh=DEFAULT_DET_THRESH)
+        else:
+            model.prepare(ctx_id=0)
+
+    def _register(self, pack, path, loader):
+        """Run loader() and record its load time and resident memory growth."""
+        rss_before = rss_mb()
+        t0 = time.time()
+        model = loader()
+        if model is None:
+            return None
+        self._prepare(model)
+        key = (pack, model.taskname)
+        self._models[key] = model
+        self._stats[key] = {
+            'pack': pack,
+            'task': model.taskname,
+            'file': os.path.basename(path),
+            'file_mb': os.path.getsize(path) / (1024 * 1024),
+            'variant': self.variant(model.taskname) if _is_variant(path) else 'fp32',
+            'load_seconds': time.time() - t0,
+            'rss_delta_mb': rss_mb() - rss_before,
+            'session': self._session_info.get(os.path.basename(path))
+        }
+        logger.info(f"Loaded {pack}/{model.taskname} from {os.path.basename(path)}")
+        return model
+
+    def get_model(self, task, pack='buffalo_l'):
+        """Return the shared, prepared model for one task of a pack."""
+        key = (pack, task)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if key in self._models:
+                return self._models[key]
+
+            pack_dir = self.pack_dir(pack)
+            known = PACK_FILES.get(pack, {}).get(task)
+            variant = self.variant(task)
+            source = None
+            if known and variant != 'fp32':
+                if os.path.exists(os.path.join(pack_dir, variant_file(known, variant))):
+                    source = os.path.join(pack_dir, known)
+                    known = variant_file(known, variant)
+                else:
+                    logger.warning(f"No {variant} copy of {pack}/{known}; "
+                                   f"run download_models.py --quantize. Using fp32")
+            if known and os.path.exists(os.path.join(pack_dir, known)):
+                path = os.path.join(pack_dir, known)
+                self._register(pack, path, lambda: self._load_file(path, source))
+            else:
+                # Unknown layout: open files until one reports the task
+                loaded = {s['file'] for (p, _), s in self._stats.items() if p == pack}
+                for path in sorted(glob.glob(os.path.join(pack_dir, '*.onnx'))):
+                    if os.path.basename(path) in loaded or _is_variant(path):
+                        continue
+                    self._register(pack, path, lambda: self._load_file(path))
+                    if key in self._models:
+                        break
+
+            if key not in self._models:
+                raise RuntimeError(f"No '{task}' model found in pack '{pack}'")
+            return self._models[key]
+
+    def warmup(self, tasks=('detection', 'recognition'), pack='buffalo_l'):
+        for task in tasks:
+            self.get_model(task, pack)
+
+    def face_analysis(self, modules=('detection', 'recognition'), pack='buffalo_l', det_size=DEFAULT_DET_SIZE):
+        """Shared FaceAnalysis-like object running only the given modules."""
+        key = (pack, tuple(modules), tuple(det_size))
+        with self._lock:
+            if key not in self._analyzers:
+                self._analyzers[key] = SharedFaceAnalysis(self, modules, pack, det_size)
+            return self._analyzers[key]
+
+    def pack_app(self, pack):
+        """
+        Full insightface FaceAnalysis for packs outside PACK_FILES.
+
+        FaceAnalysis builds its own sessions, so only the configured
+        providers apply to these (not the other onnx_config options).
+
+        A pack that fails to load is remembered as None so the download is
+        only attempted once per process.
+        """
+        with self._lock:
+            if pack in self._apps:
+                return self._apps[pack]
+            rss_before = rss_mb()
+            t0 = time.time()
+            try:
+                from insightface.app import FaceAnalysis
+                with StdoutRedirect():
+                    app = FaceAnalysis(name=pack, root=self.root, providers=self.providers)
+                    app.prepare(ctx_id=0, det_size=DEFAULT_DET_SIZE)
+                self._stats[(pack, '*')] = {
+                    'pack': pack,
+                    'task': '*',
+                    'file': None,
+                    'file_mb': None,
+                    'load_seconds': time.time() - t0,
+                    'rss_delta_mb': rss_mb() - rss_before
+                }
+            except Exception as e:
+                logger.error(f"Failed to initialize insightface pack '{pack}': {e}")
+                app = None
+            self._apps[pack] = app
+            return app
+
+    def memory_report(self):
+        """
+        Per-model load time and resident memory growth.
+
+        rss_delta_mb is the process RSS change across the load, so it includes
+        the ONNX Runtime arena and any shared library pulled in by the first
+        model; treat it as an attribution, not an exact size.
+        """
+        with self._lock:
+            models = sorted(self._stats.values(), key=lambda s: (s['pack'], s['task']))
+        return {
+            'rss_mb': rss_mb(),
+            'onnx_runtime': {key: value for key, value in self.config.items() if key != 'optimized_dir'},
+            'models': models
+        }
+
+
+registry = ModelRegistry()
+
+
+def get_model(task, pack='buffalo_l'):
+    return registry.get_model(task, pack)
+
+
+def get_face_analysis(modules=('detection', 'recognition'), pack='buffalo_l', det_size=DEFAULT_DET_SIZE):
+    return registry.face_analysis(modules, pack, det_size)
+
+
+if __name__ == "__main__":
+    tasks = sys.argv[1:] or ['detection', 'recognition']
+    registry.warmup(tasks)
+    print(json.dumps(registry.memory_report(), indent=2))
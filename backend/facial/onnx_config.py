@@ -0,0 +1,200 @@
+"""
+ONNX Runtime session options for the facial models.
+
+Every session the model registry creates is configured here. Settings come
+from, in increasing priority: the defaults below, a JSON file named by
+FACIAL_ORT_CONFIG, and individual environment variables:
+
+    FACIAL_ORT_PROVIDERS       comma-separated execution providers
+                               (CPUExecutionProvider)
+    FACIAL_WORKERS_PER_HOST    facial workers sharing this host's cores (1)
+    FACIAL_ORT_INTRA_THREADS   threads inside one operator
+                               (default: usable cores / workers per host)
+    FACIAL_ORT_INTER_THREADS   threads across operators, parallel mode only (1)
+    FACIAL_ORT_EXECUTION_MODE  sequential | parallel (sequential)
+    FACIAL_ORT_OPT_LEVEL       disable | basic | extended | all (all)
+    FACIAL_ORT_CPU_ARENA       1/0, keep freed CPU buffers for reuse (1)
+    FACIAL_ORT_MEM_PATTERN     1/0, pre-plan allocations for fixed shapes (1)
+    FACIAL_ORT_SPINNING        1/0, let idle intra-op threads busy-wait (1;
+                               0 frees the cores when several workers share them)
+    FACIAL_ORT_SAVE_OPTIMIZED  1/0, write and reuse optimized graphs (0)
+    FACIAL_ORT_OPTIMIZED_DIR   where optimized graphs are kept
+                               (models/optimized/<hostname>)
+
+The config file uses the same names in lower case without the prefix,
+e.g. {"intra_threads": 4, "opt_level": "extended", "workers_per_host": 2}.
+
+With FACIAL_ORT_SAVE_OPTIMIZED=1 an optimized graph is saved the first time
+a model file is loaded and used directly on later starts, skipping graph
+optimization. The file name holds the optimization level, the providers and
+the ONNX Runtime version, and it is rebuilt when the source model is newer,
+so an upgrade or a setting change never picks up a stale graph. Graphs
+optimized at "extended" or "all" may contain kernels specific to the
+machine that produced them, so the default directory is per host and the
+graphs are only ever written by the worker on the host that runs them
+(download_models.py never saves them).
+"""
+import json
+import logging
+import os
+import socket
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+OPT_LEVELS = ('disable', 'basic', 'extended', 'all')
+EXECUTION_MODES = ('sequential', 'parallel')
+
+DEFAULTS = {
+    'providers': ['CPUExecutionProvider'],
+    'workers_per_host': 1,
+    'intra_threads': 0,  # 0: derive from usable cores / workers_per_host
+    'inter_threads': 1,
+    'execution_mode': 'sequential',
+    'opt_level': 'all',
+    'cpu_arena': True,
+    'mem_pattern': True,
+    'spinning': True,
+    'save_optimized': False,
+    'optimized_dir': os.path.join(current_dir, 'models', 'optimized', socket.gethostname()),
+}
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def _parse(name, value):
+    default = DEFAULTS[name]
+    if name == 'providers':
+        return [p.strip() for p in value.split(',') if p.strip()] if isinstance(value, str) else list(value)
+    if isinstance(default, bool):
+        return _parse_bool(value)
+    if isinstance(default, int):
+        return int(value)
+    return str(value)
+
+
+def usable_cores():
+    """Cores this process may run on (respects CPU affinity / cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_config(path=None, environ=None):
+    """Resolved session settings as a dict (see the module docstring)."""
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULTS)
+
+    path = path or environ.get('FACIAL_ORT_CONFIG')
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown ONNX Runtime settings in {path}: {sorted(unknown)}")
+        config.update({name: _parse(name, value) for name, value in overrides.items()})
+
+    for name in DEFAULTS:
+        value = environ.get('FACIAL_ORT_' + name.upper())
+        if name == 'workers_per_host':
+            value = environ.get('FACIAL_WORKERS_PER_HOST')
+        if value is not None and value != '':
+            config[name] = _parse(name, value)
+
+    if config['opt_level'] not in OPT_LEVELS:
+        raise ValueError(f"opt_level must be one of {OPT_LEVELS}, got {config['opt_level']!r}")
+    if config['execution_mode'] not in EXECUTION_MODES:
+        raise ValueError(f"execution_mode must be one of {EXECUTION_MODES}, got {config['execution_mode']!r}")
+
+    if config['intra_threads'] <= 0:
+        config['intra_threads'] = max(1, usable_cores() // max(1, config['workers_per_host']))
+    return config
+
+
+def session_options(config, opt_level=None):
+    import onnxruntime as ort
+
+    levels = {
+        'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config['intra_threads']
+    options.inter_op_num_threads = config['inter_threads']
+    options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if config['execution_mode'] == 'parallel'
+                              else ort.ExecutionMode.ORT_SEQUENTIAL)
+    options.graph_optimization_level = levels[opt_level or config['opt_level']]
+    options.enable_cpu_mem_arena = config['cpu_arena']
+    options.enable_mem_pattern = config['mem_pattern']
+    options.add_session_config_entry('session.intra_op.allow_spinning', '1' if config['spinning'] else '0')
+    return options
+
+
+def optimized_path(model_path, config):
+    """Where the optimized graph of a model file is kept for these settings."""
+    import onnxruntime as ort
+
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    providers = '+'.join(p.replace('ExecutionProvider', '').lower() for p in config['providers'])
+    name = f"{stem}.{config['opt_level']}.{providers}.ort{ort.__version__}.onnx"
+    return os.path.join(config['optimized_dir'], name)
+
+
+def create_session(model_path, config):
+    """
+    InferenceSession for a model file with the configured options.
+
+    Returns (session, info) where info records the thread counts and
+    whether an optimized graph was loaded or written.
+    """
+    import onnxruntime as ort
+
+    info = {
+        'intra_threads': config['intra_threads'],
+        'inter_threads': config['inter_threads'],
+        'opt_level': config['opt_level'],
+        'optimized_graph': None
+    }
+    if not config['save_optimized'] or config['opt_level'] == 'disable':
+        session = ort.InferenceSession(model_path, sess_options=session_options(config),
+                                       providers=config['providers'])
+        return session, info
+
+    cached = optimized_path(model_path, config)
+    if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(model_path):
+        try:
+            # Already optimized: skip the optimization passes entirely
+            session = ort.InferenceSession(cached, sess_options=session_options(config, 'disable'),
+                                           providers=config['providers'])
+            info['optimized_graph'] = 'loaded'
+            return session, info
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable optimized graph {cached}: {e}")
+
+    options = session_options(config)
+    tmp = None
+    try:
+        os.makedirs(config['optimized_dir'], exist_ok=True)
+        # Private name, then rename: concurrent workers never see half a file
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        options.optimized_model_filepath = tmp
+    except OSError as e:
+        logger.warning(f"Not saving optimized graph for {model_path}: {e}")
+    session = ort.InferenceSession(model_path, sess_options=options, providers=config['providers'])
+    if tmp and os.path.exists(tmp):
+        os.replace(tmp, cached)
+        info['optimized_graph'] = 'saved'
+        logger.info(f"Saved optimized graph {os.path.basename(cached)}")
+    return session, info
+
+
+if __name__ == "__main__":
+    print(json.dumps(load_config(), indent=2))
@@ -0,0 +1,248 @@
+"""
+Screen-replay artifact detection (moiré, glare, long straight edges).
+
+The full check runs a spectrum, a Canny edge map and a Hough transform over
+the whole grayscale frame, which made it one of the heaviest per-frame
+stages while its result barely changes between neighbouring frames. This
+detector instead:
+
+- measures glare and long straight edges on the whole frame (the
+  pyramid level it is given) every time it checks, so a bezel or a
+  reflection anywhere in view still fails the frame;
+- measures moiré on a fixed-size (roi_size x roi_size) face-plus-margin
+  crop, downsampled from the frame, with a real-input float32 FFT
+  (scipy.fft.rfft2) of the Hann-windowed crop; the window and frequency
+  band weights are built once per size;
+- escalates to the full-frame spectrum whenever the crop's moiré value
+  comes close to its threshold (or there is no face box), so every moiré
+  positive is decided by the full check and the crop only ever clears;
+- only checks every every_n-th frame, reusing the last decision in
+  between.
+
+bench_pyramid.py calibrates this against the original full-resolution
+check (verdict agreement, and the crop's moiré value against the
+full-frame one).
+"""
+import logging
+import os
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVERY_N = int(os.environ.get('LIVENESS_ARTIFACT_EVERY', 3))
+DEFAULT_ROI_SIZE = int(os.environ.get('LIVENESS_ARTIFACT_ROI', 256))
+
+# Full-frame spectrum bands (half-widths in frequency bins, as the
+# original fftshift-centered boxes) and Hough parameters
+FULL_INNER_BINS = 30
+FULL_OUTER_BINS = 100
+FULL_HOUGH_THRESHOLD = 200
+FULL_MIN_LINE_LENGTH = 100
+
+# The same bands in cycles per pixel for the ROI, relative to the frame
+# height the full-frame parameters are applied at (the 720 pyramid level)
+REFERENCE_SIDE = 720.0
+ROI_INNER_FREQ = FULL_INNER_BINS / REFERENCE_SIDE
+ROI_OUTER_FREQ = FULL_OUTER_BINS / REFERENCE_SIDE
+
+
+class ScreenArtifactDetector:
+    def __init__(self, roi_size=DEFAULT_ROI_SIZE, margin=0.5, every_n=DEFAULT_EVERY_N,
+                 moire_threshold=5.0, glare_threshold=0.005, edge_threshold=5,
+                 moire_margin=2.0):
+        """
+        Args:
+            roi_size: side in pixels of the square crop the cheap check measures
+            margin: context added around the face on every side, as a
+                fraction of the face box's longest side (screen borders sit
+                around the face, not on it)
+            every_n: measure every n-th frame, reuse the decision otherwise
+            moire_threshold, glare_threshold, edge_threshold: decision
+                thresholds of the full check
+            moire_margin: run the full-frame spectrum when the crop's moiré
+                value is within this many dB of its threshold
+        """
+        self.roi_size = roi_size
+        self.margin = margin
+        self.every_n = max(1, every_n)
+        self.moire_threshold = moire_threshold
+        self.glare_threshold = glare_threshold
+        self.edge_threshold = edge_threshold
+        self.moire_margin = moire_margin
+        self._masks = {}
+        self.reset()
+
+    def reset(self):
+        """Forget the cadence state and counters (call once per video)."""
+        self._frames = 0
+        self._last = None
+        self._check_next = True
+        self.roi_checks = 0
+        self.full_checks = 0
+        self.reused = 0
+
+    def _band_masks(self, shape, inner, outer, window):
+        """
+        (window, rows, inner, outer) for an rfft2 spectrum of the given
+        shape, built once per (shape, bands).
+
+        inner/outer are the half-widths of the original fftshift-centered
+        boxes, [c - n, c + n) around DC on both axes. rfft2 only keeps
+        kx >= 0, so a box bin with kx < 0 is counted through its mirror
+        (-ky, -kx), which has the same magnitude for real input. The
+        weights (over `rows` of the spectrum and its first outer + 1
+        columns) count every box bin once, so their weighted means equal
+        the box means of the full fftshift spectrum.
+        """
+        key = (shape, inner, outer, window)
+        if key not in self._masks:
+            h, w = shape
+            # Frames too small for the box keep it inside the spectrum
+            outer = min(outer, (min(h, w) - 1) // 2)
+            inner = min(inner, outer)
+            rows = np.arange(-outer, outer + 1) % h
+            hann = None
+            if window:
+                hann = np.outer(np.hanning(h), np.hanning(w)).astype(np.float32)
+            self._masks[key] = (hann, rows, _box_weights(inner, outer), _box_weights(outer, outer))
+        return self._masks[key]
+
+    def moire_value(self, gray, inner, outer, window=False):
+        """Mean log-magnitude of the outer band minus that of the inner band, in dB."""
+        from scipy import fft as sp_fft
+
+        hann, rows, inner_weights, outer_weights = self._band_masks(gray.shape, inner, outer, window)
+        data = gray.astype(np.float32)
+        if hann is not None:
+            data *= hann
+        spectrum = sp_fft.rfft2(data, workers=1)
+        # Only the bins inside the outer box are ever read
+        magnitude = 20 * np.log(np.abs(spectrum[rows, :outer_weights.shape[1]]) + 1)
+        outer_mean = (magnitude * outer_weights).sum() / outer_weights.sum()
+        inner_mean = (magnitude * inner_weights).sum() / inner_weights.sum()
+        return float(outer_mean - inner_mean)
+
+    def glare_edges(self, gray):
+        """Glare fraction and long-edge count of the whole grayscale frame."""
+        glare = float(np.count_nonzero(gray > 240)) / gray.size
+        edges = cv2.Canny(gray, 100, 200)
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=FULL_HOUGH_THRESHOLD,
+                                minLineLength=FULL_MIN_LINE_LENGTH, maxLineGap=10)
+        return {
+            'glare': glare,
+            'edge_count': len(lines) if lines is not None else 0
+        }
+
+    def face_roi(self, gray, bbox):
+        """
+        Square roi_size crop of the face plus margin, and the factor from
+        gray's pixels to ROI pixels; None if there is no face box.
+        """
+        if bbox is None:
+            return None
+        x_min, y_min, x_max, y_max = bbox
+        side = max(x_max - x_min, y_max - y_min)
+        if side <= 0:
+            return None
+        cx, cy = (x_min + x_max) / 2.0, (y_min + y_max) / 2.0
+        half = side * (0.5 + self.margin)
+        h, w = gray.shape[:2]
+        x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+        x1, y1 = min(w, int(cx + half)), min(h, int(cy + half))
+        crop = gray[y0:y1, x0:x1]
+        if crop.size == 0:
+            return None
+        scale = self.roi_size / float(max(crop.shape))
+        roi = cv2.resize(crop, (self.roi_size, self.roi_size), interpolation=cv2.INTER_AREA)
+        return roi, scale
+
+    def full_moire(self, gray):
+        """The original whole-frame moiré value."""
+        return self.moire_value(gray, FULL_INNER_BINS, FULL_OUTER_BINS)
+
+    def roi_moire(self, roi):
+        """Moiré value of the face ROI, with the bands in the same cycles per pixel."""
+        inner = max(1, int(round(ROI_INNER_FREQ * self.roi_size)))
+        outer = max(inner + 1, int(round(ROI_OUTER_FREQ * self.roi_size)))
+        return self.moire_value(roi, inner, outer, window=True)
+
+    def full_check(self, gray):
+        """The original whole-frame measurements."""
+        return dict(self.glare_edges(gray), moire=self.full_moire(gray))
+
+    def decide(self, values):
+        return {
+            'moire': values['moire'] > self.moire_threshold,
+            'glare': values['glare'] > self.glare_threshold,
+            'edges': values['edge_count'] > self.edge_threshold
+        }
+
+    def suspicious(self, moire):
+        """Whether the crop's moiré value is close enough to the threshold to escalate."""
+        return moire > self.moire_threshold - self.moire_margin
+
+    def check(self, gray, bbox):
+        """
+        Screen-artifact decision for one frame.
+
+        Args:
+            gray: grayscale frame (a pyramid level)
+            bbox: face box in gray's coordinates, or None
+        Returns:
+            (detected, info) where info holds the stage that measured the
+            moiré value ("reused", "roi" or "full"), the measured values
+            and the per-artifact flags
+        """
+        self._frames += 1
+        if not self._check_next and self._last is not None and (self._frames - 1) % self.every_n:
+            self.reused += 1
+            return self._last[0], dict(self._last[1], stage='reused')
+
+        # Glare and screen borders can be anywhere in view
+        values = self.glare_edges(gray)
+        moire = None
+        stage = 'full'
+        roi = self.face_roi(gray, bbox)
+        if roi is not None:
+            self.roi_checks += 1
+            moire = self.roi_moire(roi[0])
+            stage = 'roi'
+        if moire is None or self.suspicious(moire):
+            self.full_checks += 1
+            moire = self.full_moire(gray)
+            stage = 'full'
+        values['moire'] = moire
+
+        flags = self.decide(values)
+        detected = any(flags.values())
+        # A frame that needed the full check is re-measured on the next frame
+        self._check_next = stage == 'full'
+        info = {'stage': stage, 'values': values, 'flags': flags}
+        self._last = (detected, info)
+        return detected, info
+
+    def stats(self):
+        return {
+            'every_n': self.every_n,
+            'roi_size': self.roi_size,
+            'roi_checks': self.roi_checks,
+            'full_checks': self.full_checks,
+            'reused': self.reused
+        }
+
+
+def _box_weights(half, size):
+    """
+    How often each bin of the kx >= 0 half-spectrum (rows ky = -size..size,
+    columns kx = 0..size) stands for a bin of the box [-half, half) x
+    [-half, half): directly when kx >= 0, through its mirror otherwise.
+    """
+    weights = np.zeros((2 * size + 1, size + 1), dtype=np.float32)
+    c = size
+    # ky in [-half, half), kx in [0, half)
+    weights[c - half:c + half, 0:half] += 1
+    # mirrors of ky in [-half, half), kx in [-half, -1]: ky in (-half, half], kx in [1, half]
+    weights[c - half + 1:c + half + 1, 1:half + 1] += 1
+    return weights
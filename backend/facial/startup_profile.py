@@ -0,0 +1,84 @@
+"""
+Startup-time profile for the facial package.
+
+Times the import of each heavy dependency and the initialization of each
+model, in the order the worker pays for them, and prints the breakdown as
+JSON. Run it in a fresh interpreter for cold numbers:
+
+    python startup_profile.py
+    python worker.py --startup-profile
+
+Imports are timed incrementally: a module whose dependencies were already
+imported by an earlier step only reports its own share. Modules already in
+sys.modules when profiling starts are reported with "preloaded": true.
+"""
+import importlib
+import json
+import sys
+import time
+
+# (label, module, loaded on the hot path?) in dependency order. The lazy ones
+# are only imported when the feature that needs them first runs.
+DEPENDENCIES = [
+    ('numpy', 'numpy', True),
+    ('cv2', 'cv2', True),
+    ('mediapipe', 'mediapipe', True),
+    ('onnxruntime', 'onnxruntime', True),
+    ('insightface', 'insightface.model_zoo', True),
+    ('scipy.fft', 'scipy.fft', False),
+    ('enhanced_liveness', 'enhanced_liveness', True),
+    ('arcface_embedding', 'arcface_embedding', True),
+]
+
+
+def _time_import(label, module, hot_path):
+    entry = {'dependency': label, 'hot_path': hot_path}
+    if module in sys.modules:
+        entry.update(seconds=0.0, preloaded=True)
+        return entry
+    t0 = time.perf_counter()
+    try:
+        importlib.import_module(module)
+        entry['seconds'] = time.perf_counter() - t0
+    except ImportError as e:
+        entry.update(seconds=time.perf_counter() - t0, error=str(e))
+    return entry
+
+
+def _time_model(label, init):
+    t0 = time.perf_counter()
+    try:
+        init()
+        return {'model': label, 'seconds': time.perf_counter() - t0}
+    except Exception as e:
+        return {'model': label, 'seconds': time.perf_counter() - t0, 'error': str(e)}
+
+
+def _face_mesh():
+    import mediapipe as mp
+    mp.solutions.face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True).close()
+
+
+def profile_startup(include_models=True):
+    """Import every dependency and build every model, timing each step."""
+    start = time.perf_counter()
+    imports = [_time_import(*dep) for dep in DEPENDENCIES]
+
+    models = []
+    if include_models:
+        from model_registry import registry
+        models.append(_time_model('mediapipe_face_mesh', _face_mesh))
+        models.append(_time_model('buffalo_l/detection', lambda: registry.get_model('detection')))
+        models.append(_time_model('buffalo_l/recognition', lambda: registry.get_model('recognition')))
+
+    return {
+        'imports': imports,
+        'models': models,
+        'import_seconds': sum(e['seconds'] for e in imports if e['hot_path']),
+        'model_seconds': sum(m['seconds'] for m in models),
+        'total_seconds': time.perf_counter() - start
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(profile_startup('--imports-only' not in sys.argv[1:]), indent=2))
@@ -0,0 +1,10 @@
+"""
+Tests for the pure-NumPy facial modules. Run from backend/facial:
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+# The facial modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
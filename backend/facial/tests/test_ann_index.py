@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFPQIndex, kmeans, nearest_centroid
+
+DIM = 32
+
+
+def gallery(n=2000, identities=100, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(identities, DIM))
+    x = centers[rng.integers(0, identities, n)] + 0.3 * rng.normal(size=(n, DIM))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def index():
+    x = gallery()
+    index = IVFPQIndex(dim=DIM, nlist=8, m=8)
+    index.train(x, iters=5)
+    # Added in two batches: later adds land in the same lists
+    index.add([str(i) for i in range(1000)], x[:1000])
+    index.add([str(i) for i in range(1000, 2000)], x[1000:])
+    return index, x
+
+
+def test_kmeans_assigns_to_nearest():
+    x = gallery(300)
+    centroids = kmeans(x, 10, iters=5)
+    assign = nearest_centroid(x, centroids)
+    distances = ((x[:, None, :] - centroids[None]) ** 2).sum(axis=2)
+    np.testing.assert_array_equal(assign, distances.argmin(axis=1))
+
+
+def test_recall_against_exact_search(index):
+    index, x = index
+    queries = x[:50] + 0.05 * np.random.default_rng(1).normal(size=(50, DIM)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = np.argsort(-(queries @ x.T), axis=1)[:, :10]
+
+    results = index.search(queries, k=10, nprobe=index.nlist)
+    assert all(len(matches) == 10 for matches in results)
+    # The exact nearest neighbour is among the approximate top 10 (PQ
+    # scores reorder near-ties, so the rest of the top 10 may differ)
+    found = [{int(match['id']) for match in matches} for matches in results]
+    assert np.mean([exact[i, 0] in found[i] for i in range(len(queries))]) >= 0.9
+
+
+def test_scores_sorted_and_fewer_probes_find_fewer(index):
+    index, x = index
+    matches = index.search(x[0], k=20, nprobe=1)[0]
+    scores = [match['score'] for match in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert len(index) == 2000
+    assert index.memory_bytes() == 2000 * (8 + 4)
+
+
+def test_save_load_round_trip(index, tmp_path):
+    index, x = index
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = IVFPQIndex.load(path)
+    assert (loaded.dim, loaded.nlist, loaded.m, len(loaded)) == (DIM, 8, 8, 2000)
+    assert loaded.search(x[:5], k=5, nprobe=4) == index.search(x[:5], k=5, nprobe=4)
+
+
+def test_invalid_use():
+    with pytest.raises(ValueError):
+        IVFPQIndex(dim=DIM, m=5)
+    with pytest.raises(RuntimeError):
+        IVFPQIndex(dim=DIM, nlist=4, m=8).add(['a'], np.ones((1, DIM)))
+    with pytest.raises(ValueError):
+        kmeans(np.ones((3, DIM), dtype=np.float32), 4)
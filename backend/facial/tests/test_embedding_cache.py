@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def test_memory_tier_lru():
+    cache = EmbeddingCache(directory=None, max_entries=2, tag='test')
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, np.full(4, i, dtype=np.float32))
+
+    assert cache.get(keys[0]) == (False, None)
+    found, value = cache.get(keys[2])
+    assert found and value.dtype == np.float32 and value[0] == 2
+    assert cache.stats()['memory_entries'] == 2
+    assert (cache.stats()['memory_hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_keys_depend_on_content_tag_and_variant():
+    a = EmbeddingCache(directory=None, tag='models-a')
+    b = EmbeddingCache(directory=None, tag='models-b')
+    assert a.key(b'image') == a.key(b'image')
+    assert a.key(b'image') != a.key(b'other')
+    assert a.key(b'image') != b.key(b'image')
+    assert a.key(b'image') != a.key(b'image', variant=b'aligned')
+
+
+def test_no_face_is_cached(tmp_path):
+    cache = EmbeddingCache(directory=str(tmp_path), tag='test')
+    key = cache.key(b'no face here')
+    cache.put(key, None)
+    assert cache.get(key) == (True, None)
+    # Also from disk, in a fresh process-level cache
+    assert EmbeddingCache(directory=str(tmp_path), tag='test').get(key) == (True, None)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = EmbeddingCache(directory=str(tmp_path), tag='test')
+    key = cache.key(b'image')
+    vector = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    cache.put(key, vector)
+
+    fresh = EmbeddingCache(directory=str(tmp_path), tag='test')
+    assert key in fresh
+    found, value = fresh.get(key)
+    assert found
+    np.testing.assert_array_equal(value, vector)
+    assert fresh.stats()['disk_hits'] == 1
+    # Now in the memory tier
+    fresh.get(key)
+    assert fresh.stats()['memory_hits'] == 1
+
+
+def test_disk_eviction_keeps_recent_entries(tmp_path):
+    entry_bytes = 512 * 4 + 128  # .npy header
+    cache = EmbeddingCache(directory=str(tmp_path), max_entries=1, max_bytes=4 * entry_bytes, tag='test')
+    keys = [cache.key(bytes([i])) for i in range(8)]
+    for i, key in enumerate(keys):
+        cache.put(key, np.full(512, i, dtype=np.float32))
+        # Distinct access times for the eviction order
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+
+    stats = cache.stats()
+    assert stats['evictions'] > 0
+    assert stats['disk_bytes'] <= 4 * entry_bytes
+    assert keys[-1] in cache
+    assert keys[0] not in cache
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from embedding_codec import FORMAT_F16, FORMAT_I8, FORMAT_JSON, decode_embedding, encode_embedding, is_encoded
+
+
+@pytest.fixture
+def vector():
+    v = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_json_is_a_plain_list(vector):
+    encoded = encode_embedding(vector, FORMAT_JSON)
+    assert isinstance(encoded, list) and not is_encoded(encoded)
+    np.testing.assert_array_equal(decode_embedding(encoded), vector)
+
+
+@pytest.mark.parametrize('fmt, max_bytes, min_cosine', [(FORMAT_F16, 1400, 0.99999), (FORMAT_I8, 700, 0.9995)])
+def test_round_trip(vector, fmt, max_bytes, min_cosine):
+    encoded = encode_embedding(vector, fmt)
+    assert encoded.startswith(f'v1.{fmt}.') and is_encoded(encoded)
+    assert len(encoded) <= max_bytes
+
+    decoded = decode_embedding(encoded)
+    assert decoded.dtype == np.float32 and decoded.shape == vector.shape
+    cosine = np.dot(decoded, vector) / (np.linalg.norm(decoded) * np.linalg.norm(vector))
+    assert cosine >= min_cosine
+
+
+def test_i8_scale_is_per_vector(vector):
+    # A vector far from unit norm keeps its magnitude
+    decoded = decode_embedding(encode_embedding(vector * 40.0, FORMAT_I8))
+    np.testing.assert_allclose(decoded, vector * 40.0, atol=40.0 * np.abs(vector).max() / 127.0)
+
+
+def test_zero_vector():
+    zeros = np.zeros(512, dtype=np.float32)
+    np.testing.assert_array_equal(decode_embedding(encode_embedding(zeros, FORMAT_I8)), zeros)
+
+
+@pytest.mark.parametrize('value', ['v2.f16.AAAA', 'v1.f32.AAAA', 'v1'])
+def test_rejects_unknown_strings(value):
+    with pytest.raises(ValueError):
+        decode_embedding(value)
+
+
+def test_rejects_unknown_format(vector):
+    with pytest.raises(ValueError):
+        encode_embedding(vector, 'f8')
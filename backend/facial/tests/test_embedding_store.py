@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore, StoreLockedError, normalize_rows
+
+DIM = 16
+
+
+def unit_vectors(n, seed=0):
+    return normalize_rows(np.random.default_rng(seed).normal(size=(n, DIM)), DIM)
+
+
+def test_add_search_and_overwrite(tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM, block_rows=4)
+    vectors = unit_vectors(10)
+    assert store.add([f'id{i}' for i in range(10)], vectors) == 10
+
+    results = store.search(vectors[:3], k=2)
+    assert [matches[0]['id'] for matches in results] == ['id0', 'id1', 'id2']
+    assert results[0][0]['score'] == pytest.approx(1.0, abs=1e-5)
+
+    # Same id: overwritten in place, not a new row
+    assert store.add(['id0'], vectors[5:6]) == 10
+    assert store.stats()['rows'] == 10
+    np.testing.assert_allclose(store.get('id0'), vectors[5], atol=1e-6)
+    store.close()
+
+
+def test_search_matches_brute_force(tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM, block_rows=7)
+    vectors = unit_vectors(50)
+    store.add([str(i) for i in range(50)], vectors)
+    queries = unit_vectors(5, seed=1)
+
+    expected = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    results = store.search(queries, k=5)
+    assert [[int(match['id']) for match in matches] for matches in results] == expected.tolist()
+    store.close()
+
+
+def test_delete_exclude_and_threshold(tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM)
+    vectors = unit_vectors(6)
+    store.add(list('abcdef'), vectors)
+
+    assert store.delete(['b', 'missing']) == 1
+    assert 'b' not in store and len(store) == 5
+    ids = [match['id'] for match in store.search(vectors[1], k=6)[0]]
+    assert 'b' not in ids
+
+    assert store.search(vectors[0], k=1, exclude=['a'])[0][0]['id'] != 'a'
+    assert store.search(vectors[0], k=6, threshold=0.999)[0] == [{'id': 'a', 'score': pytest.approx(1.0, abs=1e-5)}]
+    store.close()
+
+
+def test_compact_and_reopen(tmp_path):
+    path = str(tmp_path / 'store')
+    store = EmbeddingStore(path, dim=DIM)
+    vectors = unit_vectors(8)
+    store.add([str(i) for i in range(8)], vectors)
+    store.delete(['1', '3', '5'])
+    assert store.stats()['tombstones'] == 3
+
+    assert store.compact() == 5
+    stats = store.stats()
+    assert (stats['tombstones'], stats['rows'], stats['generation']) == (0, 5, 1)
+    store.close()
+
+    reopened = EmbeddingStore(path, dim=DIM, read_only=True)
+    assert sorted(ids for block, _ in reopened.iter_vectors() for ids in block) == ['0', '2', '4', '6', '7']
+    np.testing.assert_allclose(reopened.get('7'), vectors[7], atol=1e-6)
+    reopened.close()
+
+
+def test_torn_log_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'store')
+    store = EmbeddingStore(path, dim=DIM)
+    store.add(['a'], unit_vectors(1))
+    store.close()
+    with open(tmp_path / 'store' / 'ids-0.jsonl', 'a') as f:
+        f.write('{"op": "add", "id": "b", "ro')
+
+    reopened = EmbeddingStore(path, dim=DIM)
+    assert len(reopened) == 1 and 'a' in reopened
+    reopened.close()
+
+
+def test_write_lock_and_read_only(tmp_path):
+    path = str(tmp_path / 'store')
+    with pytest.raises(FileNotFoundError):
+        EmbeddingStore(path, dim=DIM, read_only=True)
+
+    writer = EmbeddingStore(path, dim=DIM)
+    writer.add(['a'], unit_vectors(1))
+    with pytest.raises(StoreLockedError):
+        EmbeddingStore(path, dim=DIM)
+
+    reader = EmbeddingStore(path, dim=DIM, read_only=True)
+    assert reader.search(unit_vectors(1), k=1)[0][0]['id'] == 'a'
+    with pytest.raises(StoreLockedError):
+        reader.add(['b'], unit_vectors(1, seed=2))
+    reader.close()
+    writer.close()
+
+    EmbeddingStore(path, dim=DIM).close()
+
+
+def test_rejects_bad_vectors(tmp_path):
+    store = EmbeddingStore(str(tmp_path / 'store'), dim=DIM)
+    with pytest.raises(ValueError):
+        store.add(['a'], np.zeros((1, DIM)))
+    with pytest.raises(ValueError):
+        store.add(['a'], np.ones((1, DIM + 1)))
+    with pytest.raises(ValueError):
+        store.add(['a', 'b'], unit_vectors(1))
+    store.close()
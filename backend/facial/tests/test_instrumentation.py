@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def fresh_aggregate(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'aggregate', instrumentation.Aggregate())
+    monkeypatch.setattr(instrumentation, 'ENABLED', False)
+    monkeypatch.setattr(instrumentation, 'PROFILE', False)
+
+
+def test_disabled_collection_is_a_noop():
+    with instrumentation.collect('op') as timings:
+        assert timings is None
+        assert instrumentation.span('stage') is instrumentation._NOOP
+    assert instrumentation.aggregate.summary()['operations'] == {}
+
+
+def test_spans_are_counted():
+    with instrumentation.collect('op', enabled=True) as timings:
+        for _ in range(3):
+            with instrumentation.span('facemesh'):
+                pass
+        with instrumentation.span('arcface'):
+            pass
+    report = timings.report()
+    assert report['operation'] == 'op'
+    assert report['stages']['facemesh']['count'] == 3
+    assert report['stages']['arcface']['count'] == 1
+    assert report['total_ms'] >= report['stages']['facemesh']['total_ms']
+    assert instrumentation.active() is None
+
+
+def test_nested_collection_reports_into_the_outer_one():
+    with instrumentation.collect('job', enabled=True) as outer:
+        with instrumentation.collect('process_video', enabled=True) as inner:
+            assert inner is None
+            with instrumentation.span('facemesh'):
+                pass
+    assert outer.report()['stages']['facemesh']['count'] == 1
+    assert list(instrumentation.aggregate.summary()['operations']) == ['job']
+
+
+def test_failures_are_aggregated():
+    with pytest.raises(RuntimeError):
+        with instrumentation.collect('op', enabled=True):
+            raise RuntimeError('boom')
+    with instrumentation.collect('op', enabled=True):
+        pass
+    operations = instrumentation.aggregate.summary()['operations']
+    assert (operations['op']['count'], operations['op']['failed']) == (2, 1)
+
+
+def test_histogram_buckets():
+    timings = instrumentation.Timings('op')
+    for seconds in (0.0005, 0.003, 0.003, 20.0):
+        timings.add('stage', seconds)
+    count, total, peak, buckets = timings.stages['stage']
+    assert (count, peak) == (4, 20.0)
+    assert total == pytest.approx(20.0065)
+    # 20s is above the last bound and only counted in +Inf
+    assert sum(buckets) == 3
+    assert buckets[instrumentation.BUCKETS.index(0.001)] == 1
+    assert buckets[instrumentation.BUCKETS.index(0.005)] == 2
+
+
+def test_prometheus_text():
+    timings = instrumentation.Timings('op')
+    timings.add('facemesh', 0.003)
+    timings.add('facemesh', 20.0)
+    timings.seconds = 21.0
+    instrumentation.aggregate.fold(timings)
+
+    text = instrumentation.prometheus_text([('facial_worker_jobs_total', 'counter', 'Jobs', [({'cmd': 'liveness'}, 2)])])
+    lines = text.splitlines()
+    assert 'facial_operations_total{operation="op"} 1' in lines
+    assert 'facial_stage_seconds_bucket{stage="facemesh",le="0.0025"} 0' in lines
+    assert 'facial_stage_seconds_bucket{stage="facemesh",le="0.005"} 1' in lines
+    assert 'facial_stage_seconds_bucket{stage="facemesh",le="10.0"} 1' in lines
+    assert 'facial_stage_seconds_bucket{stage="facemesh",le="+Inf"} 2' in lines
+    assert 'facial_stage_seconds_count{stage="facemesh"} 2' in lines
+    assert 'facial_worker_jobs_total{cmd="liveness"} 2' in lines
+    assert text.endswith('\n')
+
+
+def test_profile_dump(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'PROFILE_DIR', str(tmp_path))
+    with instrumentation.collect('op', profile=True) as timings:
+        sum(range(1000))
+    path = timings.report()['profile']
+    assert path and os.path.dirname(path) == str(tmp_path) and os.path.exists(path)
@@ -0,0 +1,83 @@
+"""The vectorized metrics against the original per-landmark implementations."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import landmark_geometry as geometry
+
+LEFT_EYE = [362, 385, 387, 263, 373, 380]
+RIGHT_EYE = [33, 160, 158, 133, 153, 144]
+
+
+@pytest.fixture(params=range(5))
+def points(request):
+    rng = np.random.default_rng(request.param)
+    return rng.uniform(0.2, 0.8, size=(478, 3)).astype(np.float32)
+
+
+def as_landmarks(points):
+    return SimpleNamespace(landmark=[SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in points])
+
+
+def reference_ear(landmarks, eye_indices, image_w, image_h):
+    points = [(int(landmarks[i].x * image_w), int(landmarks[i].y * image_h)) for i in eye_indices]
+    vertical_1 = abs(points[1][1] - points[5][1])
+    vertical_2 = abs(points[2][1] - points[4][1])
+    horizontal = abs(points[0][0] - points[3][0])
+    return (vertical_1 + vertical_2) / (2.0 * horizontal)
+
+
+def reference_mar(landmarks):
+    lm = landmarks.landmark
+    pairs = [(13, 78), (14, 81), (15, 87), (16, 191)]
+    vertical = sum(np.linalg.norm(np.array([lm[a].x, lm[a].y]) - np.array([lm[b].x, lm[b].y])) for a, b in pairs) / 4.0
+    horizontal = np.linalg.norm(np.array([lm[61].x, lm[61].y]) - np.array([lm[291].x, lm[291].y]))
+    return 0 if horizontal == 0 else vertical / horizontal
+
+
+def test_eye_aspect_ratio(points):
+    landmarks = as_landmarks(points).landmark
+    for eye in (LEFT_EYE, RIGHT_EYE):
+        expected = reference_ear(landmarks, eye, 640, 480)
+        assert geometry.eye_aspect_ratio(points, eye, 640, 480) == pytest.approx(expected)
+
+
+def test_degenerate_eye_is_not_a_blink(points):
+    points[LEFT_EYE[3], 0] = points[LEFT_EYE[0], 0]
+    assert geometry.eye_aspect_ratio(points, LEFT_EYE, 640, 480) == float('inf')
+
+
+def test_mouth_aspect_ratio(points):
+    assert geometry.mouth_aspect_ratio(points) == pytest.approx(reference_mar(as_landmarks(points)), rel=1e-5)
+
+
+def test_face_angle_distance_and_size(points):
+    lm = as_landmarks(points).landmark
+    angle = np.degrees(np.arctan2(lm[152].y - lm[1].y, lm[152].x - lm[1].x))
+    assert geometry.face_angle(points) == pytest.approx(angle, abs=1e-4)
+
+    center = np.mean([[l.x, l.y] for l in lm], axis=0)
+    assert geometry.center_distance(points) == pytest.approx(np.linalg.norm(center - 0.5), abs=1e-6)
+
+    xs, ys = [l.x for l in lm], [l.y for l in lm]
+    size = (max(xs) - min(xs)) * (max(ys) - min(ys))
+    assert geometry.normalized_size(points) == pytest.approx(size, rel=1e-5)
+
+
+def test_mean_displacement_and_bbox(points):
+    moved = points.copy()
+    moved[:, 0] += 0.01
+    assert geometry.mean_displacement(moved, points) == pytest.approx(0.01, abs=1e-6)
+
+    x_min, y_min, x_max, y_max = geometry.pixel_bbox(points, 640, 480)
+    assert (x_min, y_min) == (int(points[:, 0].min() * 640), int(points[:, 1].min() * 480))
+    assert (x_max, y_max) == (int(points[:, 0].max() * 640), int(points[:, 1].max() * 480))
+
+
+def test_yaw_ratio_is_zero_for_a_centered_nose(points):
+    left, right = geometry.EYE_OUTER_CORNERS
+    points[geometry.NOSE_BRIDGE, 0] = (points[left, 0] + points[right, 0]) / 2.0
+    assert geometry.yaw_ratio(points) == pytest.approx(0.0, abs=1e-6)
+    points[geometry.NOSE_BRIDGE, 0] += 0.05
+    assert geometry.yaw_ratio(points) > 0
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from texture_features import P, lbp_histogram, uniform_lbp
+
+feature = pytest.importorskip('skimage.feature')
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 5), (64, 48), (101, 77)])
+def test_matches_skimage_on_noise(shape):
+    gray = np.random.default_rng(sum(shape)).integers(0, 256, shape, dtype=np.uint8)
+    expected = feature.local_binary_pattern(gray, P=8, R=1, method='uniform')
+    np.testing.assert_array_equal(uniform_lbp(gray), expected.astype(np.uint8))
+
+
+def test_matches_skimage_on_flat_and_smooth_images():
+    y, x = np.mgrid[:40, :60]
+    for gray in (np.full((40, 60), 128, dtype=np.uint8),
+                 (x * 4).astype(np.uint8),
+                 (127 + 120 * np.sin(x / 3.0) * np.cos(y / 5.0)).astype(np.uint8)):
+        expected = feature.local_binary_pattern(gray, P=8, R=1, method='uniform')
+        np.testing.assert_array_equal(uniform_lbp(gray), expected.astype(np.uint8))
+
+
+def test_histogram_is_normalized():
+    gray = np.random.default_rng(0).integers(0, 256, (32, 32), dtype=np.uint8)
+    hist = lbp_histogram(gray)
+    assert hist.shape == (P + 2,)
+    assert hist.sum() == pytest.approx(1.0, abs=1e-6)
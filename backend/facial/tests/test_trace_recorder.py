@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+
+import trace_recorder
+from trace_recorder import TraceRecorder
+
+
+def test_records_rows_in_order():
+    trace = TraceRecorder(capacity=8)
+    for i in range(3):
+        trace.start(frame_index=i, timestamp_ms=i * 40.0)
+        trace.frame()  # the detector entry point reuses the started row
+        trace.record('ear', 0.2 + i)
+        trace.record('blink', i == 1)
+        trace.record('movement', None)
+    rows = trace.rows()
+    assert rows.shape == (3, len(trace.columns))
+    np.testing.assert_array_equal(rows[:, 0], [0, 1, 2])
+    np.testing.assert_allclose(rows[:, trace.columns.index('ear')], [0.2, 1.2, 2.2], rtol=1e-6)
+    assert np.isnan(rows[:, trace.columns.index('movement')]).all()
+
+
+def test_ring_buffer_keeps_the_newest_frames():
+    trace = TraceRecorder(capacity=4)
+    for i in range(10):
+        trace.frame(frame_index=i)
+        trace.record('ear', float(i))
+    np.testing.assert_array_equal(trace.rows()[:, 0], [6, 7, 8, 9])
+
+    summary = trace.summary()
+    assert (summary['frames'], summary['dropped']) == (10, 6)
+    assert summary['columns']['ear'] == {'n': 4, 'mean': 7.5, 'min': 6.0, 'max': 9.0}
+    # Columns never recorded are left out
+    assert 'glare' not in summary['columns']
+
+
+def test_booleans_summarize_as_fraction_true():
+    trace = TraceRecorder(capacity=4)
+    for blink in (True, False, False, True):
+        trace.frame()
+        trace.record('blink', blink)
+    assert trace.summary()['columns']['blink']['mean'] == 0.5
+
+
+def test_reset_clears_rows():
+    trace = TraceRecorder(capacity=4)
+    trace.frame()
+    trace.record('ear', 1.0)
+    trace.reset()
+    assert trace.frames == 0 and len(trace.rows()) == 0
+
+
+def test_dump_writes_csv_and_prunes(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace_recorder, 'TRACE_KEEP', 2)
+    trace = TraceRecorder(capacity=4)
+    trace.frame(frame_index=5)
+    trace.record('ear', 0.25)
+    paths = []
+    for i in range(3):
+        path = trace.dump(name=f'video{i}', directory=str(tmp_path))
+        os.utime(path, (1000 + i, 1000 + i))
+        paths.append(path)
+
+    with open(paths[-1]) as f:
+        header, row = f.read().splitlines()
+    assert header.split(',') == list(trace.columns)
+    assert row.split(',')[:4] == ['5', 'nan', 'nan', '0.25']
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths[1:])
+
+
+@pytest.mark.parametrize('mode, passed, requested, written', [
+    ('off', False, None, False),
+    ('off', True, True, True),
+    ('failure', False, None, True),
+    ('failure', True, None, False),
+    ('always', True, None, True),
+    ('always', False, False, False),
+    ('bogus', False, None, False),
+])
+def test_finish_writes_by_mode(tmp_path, monkeypatch, mode, passed, requested, written):
+    monkeypatch.setattr(trace_recorder, 'TRACE_MODE', mode)
+    trace = TraceRecorder(capacity=4)
+    trace.dump = lambda name: str(tmp_path / f'{name}.csv')
+    trace.frame()
+    trace.record('ear', 0.3)
+    summary = trace.finish(passed, requested)
+    assert ('file' in summary) == written
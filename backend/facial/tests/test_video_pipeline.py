@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip('cv2')  # frame_source decodes with OpenCV
+
+from video_pipeline import SamplingPolicy  # noqa: E402
+
+
+def sampled(policy, frames, fps=30.0):
+    policy.begin(fps, frames)
+    return [i for i in range(frames) if policy.should_sample(i, i * 1000.0 / fps)]
+
+
+def test_every_nth():
+    policy = SamplingPolicy.every_nth(4)
+    assert sampled(policy, 10) == [0, 4, 8]
+    assert [policy.next_sample_index(i, 30.0) for i in (0, 1, 4, 5)] == [0, 4, 4, 8]
+    assert SamplingPolicy.every_nth(0).every_n == 1
+
+
+def test_timestamp_interval():
+    policy = SamplingPolicy.by_timestamp(100)
+    # 30 fps: one frame per 100 ms of video time
+    assert sampled(policy, 30) == [0, 3, 6, 9, 12, 15, 18, 21, 24, 27]
+    # Restarts with every video
+    assert sampled(policy, 4) == [0, 3]
+
+
+def test_timestamp_next_sample_index():
+    policy = SamplingPolicy.by_timestamp(100)
+    policy.begin(30.0, 30)
+    assert policy.should_sample(0, 0.0)
+    assert policy.next_sample_index(1, 30.0) == 3
+    assert policy.next_sample_index(1, 0) == 1
+
+
+def test_adaptive_spreads_over_the_clip():
+    policy = SamplingPolicy.adaptive(10)
+    frames = sampled(policy, 95)
+    assert len(frames) <= 10 and frames[-1] >= 80
+    assert policy.stride == 10
+    # Unknown length: every frame
+    assert sampled(policy, 0) == [] and policy.stride == 1
+
+
+@pytest.mark.parametrize('spec, description', [
+    ('every_nth:3', 'every_nth:3'),
+    ('every_nth', 'every_nth:1'),
+    ('timestamp:250', 'timestamp:250'),
+    ('adaptive:30', 'adaptive:30 (stride 1)'),
+])
+def test_parse(spec, description):
+    assert SamplingPolicy.parse(spec).describe() == description
+
+
+@pytest.mark.parametrize('spec', ['random:3', 'every_nth:x'])
+def test_parse_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        SamplingPolicy.parse(spec)
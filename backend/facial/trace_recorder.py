@@ -0,0 +1,160 @@
+"""
+Per-frame liveness signals recorded into a preallocated ring buffer.
+
+The detector writes every per-frame value it used to log (EAR, MAR,
+reflectance, artifact values, quality metrics, movement, ...) into one
+float32 row per analyzed frame, one column per metric, instead of
+formatting a log line for each. Only the last `capacity` frames are kept.
+
+At the end of a video the recorder is reduced to a compact summary
+(count/mean/min/max per column, booleans as the fraction true) for
+detection_details. The full trace is written as a CSV file only when a
+trace was requested, or when LIVENESS_TRACE asks for every failed (or
+every) video:
+
+    LIVENESS_TRACE        off | failure | always   (off)
+    LIVENESS_TRACE_DIR    where trace files go     (facial/traces)
+    LIVENESS_TRACE_KEEP   newest files kept         (100)
+    LIVENESS_TRACE_FRAMES ring buffer capacity      (256)
+"""
+import glob
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TRACE_MODES = ('off', 'failure', 'always')
+TRACE_MODE = os.environ.get('LIVENESS_TRACE', 'off').lower()
+TRACE_DIR = os.environ.get(
+    'LIVENESS_TRACE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces')
+)
+TRACE_KEEP = int(os.environ.get('LIVENESS_TRACE_KEEP', 100))
+DEFAULT_CAPACITY = int(os.environ.get('LIVENESS_TRACE_FRAMES', 256))
+
+COLUMNS = (
+    'frame_index', 'timestamp_ms', 'face',
+    'ear', 'blink',
+    'mar', 'mar_delta', 'mouth_movement',
+    'reflectance', 'reflectance_ok',
+    'moire', 'glare', 'edge_count', 'artifact',
+    'texture_std', 'texture_ok',
+    'spoof',
+    'brightness', 'contrast', 'blur', 'quality_ok',
+    'face_angle', 'face_distance', 'face_size',
+    'movement', 'avg_movement', 'cumulative_movement', 'moving',
+    'live',
+)
+
+
+class TraceRecorder:
+    def __init__(self, capacity=DEFAULT_CAPACITY, columns=COLUMNS):
+        self.columns = tuple(columns)
+        self.capacity = max(1, int(capacity))
+        self._col = {name: i for i, name in enumerate(self.columns)}
+        self.data = np.full((self.capacity, len(self.columns)), np.nan, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.frames = 0      # rows started since reset
+        self._row = -1
+        self._pending = False
+        self.data.fill(np.nan)
+
+    def start(self, frame_index=None, timestamp_ms=None):
+        """
+        Begin the row of the next analyzed frame. The next frame() call
+        (from detect_liveness / process_frame) reuses it instead of
+        starting another.
+        """
+        self._advance()
+        self._pending = True
+        if frame_index is not None:
+            self.data[self._row, 0] = frame_index
+        if timestamp_ms is not None:
+            self.data[self._row, 1] = timestamp_ms
+
+    def frame(self, frame_index=None):
+        """Row for a detector entry point: the one a caller started, or a new one."""
+        if self._pending:
+            self._pending = False
+            return
+        self._advance()
+        if frame_index is not None:
+            self.data[self._row, 0] = frame_index
+
+    def _advance(self):
+        self._row = self.frames % self.capacity
+        self.frames += 1
+        self.data[self._row] = np.nan
+
+    def record(self, name, value):
+        """Set one metric of the current frame (None is stored as missing)."""
+        if self._row < 0:
+            self.frame()
+        self.data[self._row, self._col[name]] = np.nan if value is None else value
+
+    def rows(self):
+        """Recorded rows, oldest first."""
+        if self.frames <= self.capacity:
+            return self.data[:self.frames]
+        start = self.frames % self.capacity
+        return np.concatenate([self.data[start:], self.data[:start]])
+
+    def summary(self):
+        rows = self.rows()
+        columns = {}
+        for i, name in enumerate(self.columns[2:], start=2):
+            values = rows[:, i]
+            values = values[~np.isnan(values)]
+            if len(values):
+                columns[name] = {
+                    'n': int(len(values)),
+                    'mean': float(values.mean()),
+                    'min': float(values.min()),
+                    'max': float(values.max())
+                }
+        return {
+            'frames': self.frames,
+            'dropped': max(0, self.frames - self.capacity),
+            'columns': columns
+        }
+
+    def dump(self, name='liveness', directory=TRACE_DIR):
+        """Write the recorded rows as CSV; returns the path (None on error)."""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{int(time.time() * 1000)}-{os.getpid()}.csv")
+            np.savetxt(path, self.rows(), delimiter=',', fmt='%.6g',
+                       header=','.join(self.columns), comments='')
+            _prune(directory, TRACE_KEEP)
+            return path
+        except OSError as e:
+            logger.warning(f"Could not write liveness trace: {e}")
+            return None
+
+    def finish(self, passed, requested=None, name='liveness'):
+        """
+        Summary for detection_details, plus the trace file path when it is
+        written (on failure in "failure" mode, always in "always" mode, or
+        whenever requested=True).
+        """
+        summary = self.summary()
+        mode = TRACE_MODE if TRACE_MODE in TRACE_MODES else 'off'
+        if requested is None:
+            requested = mode == 'always' or (mode == 'failure' and not passed)
+        if requested and self.frames:
+            summary['file'] = self.dump(name)
+        return summary
+
+
+def _prune(directory, keep):
+    paths = sorted(glob.glob(os.path.join(directory, '*.csv')), key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
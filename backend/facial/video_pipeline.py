@@ -0,0 +1,387 @@
+"""
+Video sampling pipeline shared by every liveness entry point.
+
+A VideoPipeline owns the decode loop: which frames get analyzed (the
+sampling policy), how they are decoded (see FrameSource: skipped frames are
+only grabbed, long gaps can be seeked over, output can be downscaled,
+decoding can run on its own thread ahead of the analysis), when
+to stop early because the caller's verdict is settled, and a wall-clock
+deadline after which the caller gets a partial verdict. Callers keep their
+own per-frame analysis in the loop body:
+
+    with pipeline.open(video_path) as run:
+        if not run.opened:
+            ...
+        for frame, index, timestamp_ms in run:
+            ...analyze frame...
+            if run.settle(verdict):   # True, False or None (not settled)
+                break
+    run.summary()  # frames read/sampled, stop_reason, partial, decode vs analysis time
+"""
+import math
+import os
+import queue
+import threading
+import time
+
+from frame_source import FrameSource
+
+# Stop reasons reported in run.summary()["stop_reason"]
+END_OF_VIDEO = "end_of_video"
+MAX_FRAMES = "max_frames"
+MAX_SAMPLES = "max_samples"
+DEADLINE = "deadline"
+SETTLED_PASS = "settled_pass"
+SETTLED_FAIL = "settled_fail"
+OPEN_FAILED = "open_failed"
+
+
+class SamplingPolicy:
+    """
+    Decides which decoded frames are analyzed.
+
+    every_nth  - every n-th frame
+    timestamp  - one frame per interval_ms of video time
+    adaptive   - spread max_samples evenly over the whole clip, using the
+                 container's frame count (falls back to every frame)
+    """
+
+    def __init__(self, mode="every_nth", every_n=1, interval_ms=None, max_samples=None):
+        if mode not in ("every_nth", "timestamp", "adaptive"):
+            raise ValueError(f"Unknown sampling mode: {mode}")
+        self.mode = mode
+        self.every_n = max(1, int(every_n))
+        self.interval_ms = interval_ms
+        self.max_samples = max_samples
+        self.stride = self.every_n
+        self._next_ms = 0.0
+
+    @classmethod
+    def every_nth(cls, n):
+        return cls("every_nth", every_n=n)
+
+    @classmethod
+    def by_timestamp(cls, interval_ms):
+        return cls("timestamp", interval_ms=float(interval_ms))
+
+    @classmethod
+    def adaptive(cls, max_samples):
+        return cls("adaptive", max_samples=int(max_samples))
+
+    @classmethod
+    def parse(cls, spec):
+        """Build a policy from 'every_nth:4', 'timestamp:100' or 'adaptive:30'."""
+        mode, _, value = spec.partition(":")
+        if mode == "every_nth":
+            return cls.every_nth(int(value or 1))
+        if mode == "timestamp":
+            return cls.by_timestamp(float(value))
+        if mode == "adaptive":
+            return cls.adaptive(int(value))
+        raise ValueError(f"Unknown sampling policy: {spec}")
+
+    def begin(self, fps, frame_count):
+        """Reset for a new video; adaptive sizing needs the clip length."""
+        self._next_ms = 0.0
+        self.stride = self.every_n
+        if self.mode == "adaptive" and frame_count > 0 and self.max_samples:
+            self.stride = max(1, math.ceil(frame_count / self.max_samples))
+
+    def should_sample(self, index, timestamp_ms):
+        if self.mode == "timestamp":
+            if timestamp_ms + 1e-6 >= self._next_ms:
+                self._next_ms = timestamp_ms + self.interval_ms
+                return True
+            return False
+        return index % self.stride == 0
+
+    def next_sample_index(self, index, fps):
+        """Smallest frame index >= index this policy would sample."""
+        if self.mode == "timestamp":
+            if not fps:
+                return index
+            return max(index, math.ceil(self._next_ms * fps / 1000.0))
+        return math.ceil(index / self.stride) * self.stride
+
+    def describe(self):
+        if self.mode == "timestamp":
+            return f"timestamp:{self.interval_ms:g}"
+        if self.mode == "adaptive":
+            return f"adaptive:{self.max_samples} (stride {self.stride})"
+        return f"every_nth:{self.every_n}"
+
+
+class VideoPipeline:
+    def __init__(self, sampling=None, max_frames=None, max_samples=None,
+                 deadline_seconds=None, exit_on_pass=True, exit_on_fail=True,
+                 max_side=None, seek_min_gap=None, threaded=False, queue_size=4):
+        """
+        Args:
+            sampling: SamplingPolicy (default: every frame)
+            max_frames: stop after this many frames of the video
+            max_samples: stop after this many analyzed frames
+            deadline_seconds: wall-clock budget; when it runs out the run
+                stops and is marked partial
+            exit_on_pass / exit_on_fail: stop as soon as the caller settles
+                the verdict that way
+            max_side: downscale analyzed frames to this longest side
+            seek_min_gap: seek instead of grabbing when the next sampled
+                frame is at least this many frames ahead (None: never seek)
+            threaded: decode on a background thread, overlapping decode
+                with analysis (cv2 and onnxruntime release the GIL)
+            queue_size: decoded frames buffered ahead of the analysis
+        """
+        self.sampling = sampling or SamplingPolicy.every_nth(1)
+        self.max_frames = max_frames
+        self.max_samples = max_samples
+        self.deadline_seconds = deadline_seconds
+        self.exit_on_pass = exit_on_pass
+        self.exit_on_fail = exit_on_fail
+        self.max_side = max_side
+        self.seek_min_gap = seek_min_gap
+        self.threaded = threaded
+        self.queue_size = max(1, int(queue_size))
+
+    @classmethod
+    def from_env(cls, **defaults):
+        """
+        Pipeline with caller defaults overridden by the environment:
+        LIVENESS_SAMPLING (e.g. 'adaptive:30'), LIVENESS_MAX_FRAMES,
+        LIVENESS_MAX_SAMPLES, LIVENESS_DEADLINE_SECONDS,
+        LIVENESS_DECODE_MAX_SIDE, LIVENESS_SEEK_MIN_GAP,
+        LIVENESS_THREADED_DECODE (1/0) and LIVENESS_QUEUE_SIZE.
+        """
+        options = dict(defaults)
+        if os.environ.get("LIVENESS_SAMPLING"):
+            options["sampling"] = SamplingPolicy.parse(os.environ["LIVENESS_SAMPLING"])
+        for key, env in (("max_frames", "LIVENESS_MAX_FRAMES"),
+                         ("max_samples", "LIVENESS_MAX_SAMPLES"),
+                         ("max_side", "LIVENESS_DECODE_MAX_SIDE"),
+                         ("seek_min_gap", "LIVENESS_SEEK_MIN_GAP"),
+                         ("queue_size", "LIVENESS_QUEUE_SIZE")):
+            if os.environ.get(env):
+                options[key] = int(os.environ[env])
+        if os.environ.get("LIVENESS_THREADED_DECODE"):
+            options["threaded"] = os.environ["LIVENESS_THREADED_DECODE"].lower() in ("1", "true", "yes")
+        if os.environ.get("LIVENESS_DEADLINE_SECONDS"):
+            options["deadline_seconds"] = float(os.environ["LIVENESS_DEADLINE_SECONDS"])
+        return cls(**options)
+
+    def open(self, video_path):
+        return PipelineRun(self, video_path)
+
+
+class PipelineRun:
+    """One pass of a VideoPipeline over one video; iterate it for sampled frames."""
+
+    def __init__(self, pipeline, video_path):
+        self.pipeline = pipeline
+        self.started_at = time.perf_counter()
+        self.frames_sampled = 0
+        self.analysis_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.stop_reason = None
+        self._decoder = None
+        self._stop_event = None
+        self.source = FrameSource(video_path, max_side=pipeline.max_side)
+        self.opened = self.source.opened
+        if not self.opened:
+            self.stop_reason = OPEN_FAILED
+            return
+        pipeline.sampling.begin(self.source.fps, self.source.frame_count)
+
+    @property
+    def frames_read(self):
+        """Frames of the video consumed so far (grabbed or seeked past)."""
+        return self.source.index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        # The decoder thread must be gone before the capture is released
+        self._stop_decoder()
+        if self.source.cap is not None:
+            self.source.release()
+            self.elapsed_seconds = time.perf_counter() - self.started_at
+        if self.stop_reason is None:
+            self.stop_reason = END_OF_VIDEO
+
+    def _deadline_passed(self):
+        deadline = self.pipeline.deadline_seconds
+        return deadline is not None and time.perf_counter() - self.started_at >= deadline
+
+    def _skip_ahead(self):
+        """Seek over a long run of frames the policy would not sample."""
+        gap = self.pipeline.seek_min_gap
+        if gap is None:
+            return
+        source = self.source
+        target = self.pipeline.sampling.next_sample_index(source.index, source.fps)
+        if self.pipeline.max_frames is not None:
+            target = min(target, self.pipeline.max_frames)
+        if target - source.index >= gap:
+            source.seek_frame(target)
+
+    def _decode(self, stop_event=None):
+        """
+        Decode loop: yields sampled (frame, index, timestamp_ms) until the
+        video or a frame budget runs out, then returns the stop reason.
+        """
+        pipeline = self.pipeline
+        sampling = pipeline.sampling
+        source = self.source
+        produced = 0
+        while stop_event is None or not stop_event.is_set():
+            if pipeline.max_samples is not None and produced >= pipeline.max_samples:
+                return MAX_SAMPLES
+            self._skip_ahead()
+            if pipeline.max_frames is not None and source.index >= pipeline.max_frames:
+                return MAX_FRAMES
+            # Frames the policy skips are only grabbed, never retrieved
+            if not source.grab():
+                return END_OF_VIDEO
+            index = source.index - 1
+            timestamp_ms = source.timestamp_ms()
+            if not sampling.should_sample(index, timestamp_ms):
+                continue
+            frame = source.retrieve()
+            if frame is None:
+                return END_OF_VIDEO
+            produced += 1
+            yield frame, index, timestamp_ms
+        return None
+
+    def __iter__(self):
+        if not self.opened:
+            return iter(())
+        if self.pipeline.threaded:
+            return self._iter_threaded()
+        return self._iter_inline()
+
+    def _deliver(self, item):
+        self.frames_sampled += 1
+        t0 = time.perf_counter()
+        yield item
+        self.analysis_seconds += time.perf_counter() - t0
+
+    def _iter_inline(self):
+        frames = self._decode()
+        while self.stop_reason is None:
+            if self._deadline_passed():
+                self.stop_reason = DEADLINE
+                return
+            try:
+                item = next(frames)
+            except StopIteration as stop:
+                self.stop_reason = stop.value or END_OF_VIDEO
+                return
+            yield from self._deliver(item)
+
+    def _iter_threaded(self):
+        """
+        Decode on a background thread into a bounded queue while the caller
+        analyzes. The queue bounds memory (the decoder blocks when it is
+        full) and the stop event ends the decoder on early exit or error.
+        """
+        frames = queue.Queue(maxsize=self.pipeline.queue_size)
+        self._stop_event = threading.Event()
+        stop_event = self._stop_event
+
+        def put(item):
+            # Block while the queue is full, but give up once told to stop
+            while not stop_event.is_set():
+                try:
+                    frames.put(item, timeout=0.05)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                decode = self._decode(stop_event)
+                while True:
+                    try:
+                        item = next(decode)
+                    except StopIteration as stop:
+                        put(("end", stop.value))
+                        return
+                    if not put(("frame", item)):
+                        return
+            except Exception as e:
+                put(("error", e))
+
+        self._decoder = threading.Thread(target=produce, name="frame-decoder", daemon=True)
+        self._decoder.start()
+        try:
+            while self.stop_reason is None:
+                timeout = None
+                if self.pipeline.deadline_seconds is not None:
+                    timeout = max(0.0, self.pipeline.deadline_seconds - (time.perf_counter() - self.started_at))
+                t0 = time.perf_counter()
+                try:
+                    kind, payload = frames.get(timeout=timeout)
+                except queue.Empty:
+                    self.stop_reason = DEADLINE
+                    return
+                finally:
+                    self.queue_wait_seconds += time.perf_counter() - t0
+                if kind == "error":
+                    raise payload
+                if kind == "end":
+                    self.stop_reason = payload or END_OF_VIDEO
+                    return
+                if self._deadline_passed():
+                    self.stop_reason = DEADLINE
+                    return
+                yield from self._deliver(payload)
+        finally:
+            self._stop_decoder()
+
+    def _stop_decoder(self):
+        if self._decoder is not None:
+            self._stop_event.set()
+            self._decoder.join()
+            self._decoder = None
+
+    def settle(self, verdict):
+        """
+        Report the caller's verdict after a frame.
+
+        Args:
+            verdict: True/False once the outcome can no longer change that
+                way, None while undecided
+        Returns:
+            bool: True if the loop should stop now
+        """
+        if verdict is True and self.pipeline.exit_on_pass:
+            self.stop_reason = SETTLED_PASS
+        elif verdict is False and self.pipeline.exit_on_fail:
+            self.stop_reason = SETTLED_FAIL
+        return self.stop_reason is not None
+
+    @property
+    def partial(self):
+        """The verdict was cut short by the deadline rather than settled."""
+        return self.stop_reason == DEADLINE
+
+    def summary(self):
+        self.close()
+        summary = {
+            "sampling": self.pipeline.sampling.describe(),
+            "frames_read": self.frames_read,
+            "frames_sampled": self.frames_sampled,
+            "stop_reason": self.stop_reason,
+            "partial": self.partial,
+            "elapsed_seconds": self.elapsed_seconds,
+            "analysis_seconds": self.analysis_seconds,
+            "threaded": self.pipeline.threaded
+        }
+        if self.pipeline.threaded:
+            summary["queue_wait_seconds"] = self.queue_wait_seconds
+        summary.update(self.source.stats())
+        return summary
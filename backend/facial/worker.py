@@ -0,0 +1,306 @@
+"""
+Persistent facial inference worker.
+
+Loads the liveness detector and the ArcFace model once and then serves jobs
+over a line-delimited JSON protocol, either on stdin/stdout (default) or on a
+Unix socket (--socket PATH).
+
+Request:  {"id": "42", "cmd": "liveness", "video_path": "/path/video.webm"}
+Response: {"id": "42", "ok": true, "result": {...}}
+          {"id": "42", "ok": false, "error": "..."}
+
+On stdio the worker first prints {"event": "ready", "pid", "load_seconds"}
+once the models are loaded; requests sent before it wait in the pipe.
+
+Commands:
+    liveness   video_path  -> same dict as main.run_liveliness_and_extract_vector
+               ("trace": true also writes the per-frame trace file)
+    embedding  image_path  -> same dict as extract_vector.extract_face_vector
+    embeddings image_paths -> {"results": [...]} from extract_vector.extract_face_vectors
+    (the three above take an optional "format": "json" | "f16" | "i8", see
+    embedding_codec; vectors are JSON float lists by default, and optional
+    "instrument": true / "profile": true, which add per-stage "timings" to
+    the response and a cProfile dump, see instrumentation)
+    store_add    store, ids, vectors            -> {"count": live vectors in the store}
+    store_delete store, ids                     -> {"deleted": n}
+    store_search store, vectors, k, threshold,
+                 exclude                        -> {"results": [[{"id", "score"}, ...], ...]}
+    store_stats  store                          -> EmbeddingStore.stats() (live "count", ...)
+    health                 -> liveness probe used by the Node side
+    metrics                -> job counters, latencies and per-model memory
+    prometheus             -> {"text": the same counters plus stage timings
+                              in the Prometheus text format}
+    shutdown               -> exit after replying
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+from model_registry import registry, rss_mb
+import instrumentation
+
+# Embedding stores live under FACIAL_STORE_DIR/<store name>
+STORE_ROOT = os.environ.get(
+    "FACIAL_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "store")
+)
+STORE_COMMANDS = ("store_add", "store_delete", "store_search", "store_stats")
+
+# Configure logging to write to stderr (FACIAL_LOG_LEVEL=DEBUG adds the
+# per-video liveness details)
+logging.basicConfig(stream=sys.stderr, level=os.environ.get('FACIAL_LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+
+class FacialWorker:
+    def __init__(self):
+        self.started_at = time.time()
+        self.detector = None
+        self.ready = False
+        # Models and the detector's per-video state are not thread-safe
+        self.job_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+        self.startup_profile = None
+        self.stores = {}
+        self.stores_lock = threading.Lock()
+
+    def load(self):
+        """Import the heavy modules and build the models exactly once."""
+        t0 = time.time()
+        from enhanced_liveness import EnhancedLivenessDetector
+
+        self.detector = EnhancedLivenessDetector()
+        # Load the shared detection + recognition sessions up front so the
+        # first job does not pay for them
+        registry.warmup(('detection', 'recognition'))
+        self.ready = True
+        self.load_seconds = time.time() - t0
+        logger.info(f"Facial worker ready in {self.load_seconds:.2f}s (pid {os.getpid()})")
+
+    def _record(self, cmd, elapsed, failed):
+        with self.stats_lock:
+            entry = self.stats.setdefault(cmd, {
+                "count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0
+            })
+            entry["count"] += 1
+            entry["total_seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+            if failed:
+                entry["errors"] += 1
+
+    def health(self):
+        return {
+            "status": "ok" if self.ready else "loading",
+            "pid": os.getpid(),
+            "uptime_seconds": time.time() - self.started_at,
+            "busy": self.job_lock.locked()
+        }
+
+    def metrics(self):
+        with self.stats_lock:
+            jobs = {
+                cmd: dict(entry, avg_seconds=entry["total_seconds"] / entry["count"])
+                for cmd, entry in self.stats.items()
+            }
+        from embedding_cache import default_cache_stats
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": time.time() - self.started_at,
+            "load_seconds": getattr(self, "load_seconds", None),
+            "rss_mb": rss_mb(),
+            "models": registry.memory_report()["models"],
+            "startup_profile": self.startup_profile,
+            "stores": {name: store.stats() for name, store in list(self.stores.items())},
+            "embedding_cache": default_cache_stats(),
+            "instrumentation": instrumentation.aggregate.summary(),
+            "jobs": jobs
+        }
+
+    def prometheus(self):
+        """Prometheus text snapshot of the job counters and stage timings."""
+        with self.stats_lock:
+            jobs = sorted((cmd, dict(entry)) for cmd, entry in self.stats.items())
+        extra = [
+            ("facial_worker_jobs_total", "counter", "Jobs handled by the worker",
+             [({"cmd": cmd}, entry["count"]) for cmd, entry in jobs]),
+            ("facial_worker_job_errors_total", "counter", "Jobs that failed",
+             [({"cmd": cmd}, entry["errors"]) for cmd, entry in jobs]),
+            ("facial_worker_job_seconds_total", "counter", "Time spent in jobs",
+             [({"cmd": cmd}, entry["total_seconds"]) for cmd, entry in jobs]),
+            ("facial_worker_job_max_seconds", "gauge", "Longest job since start",
+             [({"cmd": cmd}, entry["max_seconds"]) for cmd, entry in jobs]),
+            ("facial_worker_rss_bytes", "gauge", "Resident memory of the worker",
+             [({}, int(rss_mb() * 1024 * 1024))]),
+            ("facial_worker_uptime_seconds", "gauge", "Seconds since the worker started",
+             [({}, time.time() - self.started_at)]),
+        ]
+        return instrumentation.prometheus_text(extra)
+
+    def store(self, name):
+        """Open (once) and return the named embedding store."""
+        if not name.replace("_", "").replace("-", "").isalnum():
+            raise ValueError(f"Invalid store name: {name}")
+        with self.stores_lock:
+            if name not in self.stores:
+                from embedding_store import EmbeddingStore
+                self.stores[name] = EmbeddingStore(os.path.join(STORE_ROOT, name))
+            return self.stores[name]
+
+    def run_store_job(self, cmd, request):
+        # Stores lock themselves, so these never wait behind a model job
+        from embedding_codec import decode_embedding
+        store = self.store(request.get("store", "default"))
+        if cmd == "store_delete":
+            return {"deleted": store.delete(request["ids"])}
+        if cmd == "store_stats":
+            return store.stats()
+        # Vectors may be float lists or embedding_codec strings
+        vectors = [decode_embedding(vector) for vector in request["vectors"]]
+        if cmd == "store_add":
+            return {"count": store.add(request["ids"], vectors)}
+        return {"results": store.search(
+            vectors,
+            k=request.get("k", 5),
+            threshold=request.get("threshold"),
+            exclude=request.get("exclude", ())
+        )}
+
+    def run_job(self, cmd, request):
+        if cmd == "liveness":
+            from main import run_liveliness_and_extract_vector
+            return run_liveliness_and_extract_vector(request["video_path"], detector=self.detector,
+                                                     vector_format=request.get("format", "json"),
+                                                     trace=request.get("trace"))
+        if cmd == "embedding":
+            from extract_vector import extract_face_vector
+            return extract_face_vector(request["image_path"], request.get("format", "json"))
+        if cmd == "embeddings":
+            from extract_vector import extract_face_vectors
+            return {"results": extract_face_vectors(request["image_paths"], request.get("format", "json"))}
+        raise ValueError(f"Unknown command: {cmd}")
+
+    def handle(self, request):
+        """Dispatch one decoded request and build its response dict."""
+        request_id = request.get("id")
+        cmd = request.get("cmd")
+
+        if cmd == "health":
+            return {"id": request_id, "ok": True, "result": self.health()}
+        if cmd == "metrics":
+            return {"id": request_id, "ok": True, "result": self.metrics()}
+        if cmd == "prometheus":
+            return {"id": request_id, "ok": True, "result": {"text": self.prometheus()}}
+        if cmd == "shutdown":
+            return {"id": request_id, "ok": True, "result": {"status": "stopping"}}
+
+        t0 = time.time()
+        try:
+            collection = instrumentation.collect(
+                cmd, enabled=request.get("instrument") or None, profile=request.get("profile") or None)
+            with collection as timings:
+                if cmd in STORE_COMMANDS:
+                    result = self.run_store_job(cmd, request)
+                else:
+                    with self.job_lock:
+                        result = self.run_job(cmd, request)
+            failed = isinstance(result, dict) and "error" in result
+            response = {"id": request_id, "ok": True, "result": result}
+            if timings is not None:
+                response["timings"] = timings.report()
+        except Exception as e:
+            logger.error(f"Error running {cmd} job: {str(e)}")
+            failed = True
+            response = {"id": request_id, "ok": False, "error": str(e)}
+        self._record(cmd, time.time() - t0, failed)
+        return response
+
+    def handle_line(self, line):
+        """Decode one protocol line; returns (response, stop)."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as e:
+            return {"id": None, "ok": False, "error": f"Invalid request: {str(e)}"}, False
+        return self.handle(request), request.get("cmd") == "shutdown"
+
+
+def serve_stdio(worker, out):
+    # Readiness handshake: the Node side holds jobs and health pings until
+    # this line, however long the model download and ONNX init took
+    out.write(json.dumps({"event": "ready", "pid": os.getpid(), "load_seconds": worker.load_seconds}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        response, stop = worker.handle_line(line)
+        out.write(json.dumps(response) + "\n")
+        out.flush()
+        if stop:
+            break
+
+
+def serve_socket(worker, socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode("utf-8").strip()
+                if not line:
+                    continue
+                response, stop = worker.handle_line(line)
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                if stop:
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    return
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    with Server(socket_path, Handler) as server:
+        logger.info(f"Facial worker listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent facial inference worker")
+    parser.add_argument("--socket", help="Serve on this Unix socket path instead of stdin/stdout")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Log per-dependency import and model-init times before serving")
+    args = parser.parse_args()
+
+    # Keep the protocol stream clean: the models print download/debug output
+    # to stdout (including from native code), so point fd 1 at stderr and
+    # answer on a private duplicate of the original stdout.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    worker = FacialWorker()
+    if args.startup_profile:
+        # Runs before load() so every import and model init is still cold
+        from startup_profile import profile_startup
+        worker.startup_profile = profile_startup()
+        sys.stderr.write(json.dumps(worker.startup_profile) + "\n")
+    worker.load()
+
+    if args.socket:
+        serve_socket(worker, args.socket)
+    else:
+        serve_stdio(worker, out)
+
+
+if __name__ == "__main__":
+    main()
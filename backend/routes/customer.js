@@ -2,9 +2,15 @@ const express = require('express');
 const router = express.Router();
 const Customer = require('../models/Customer');
 const compareVectors = require('../utils/faceVerify');
+const { cosineSimilarity } = require('../utils/faceVerify');
 const multer = require('multer');
 const path = require('path');
 const extractAadharVector = require('../utils/aadharVectorExtractor');
+const embeddingStore = require('../utils/embeddingStore');
+
+// Cosine similarity above which an Aadhaar face matches an enrolled one
+// (the same threshold as compareVectors)
+const DUPLICATE_SIMILARITY = 0.35;
 
 // Configure multer for Aadhar image upload
 const storage = multer.diskStorage({
@@ -75,28 +81,50 @@ router.post('/upload-aadhar', upload.single('aadharImage'), async (req, res) =>
             return res.status(404).json({ message: 'Customer not found' });
         }
 
-        // Find all customers with stored vectors
-        const customers = await Customer.find({
-            _id: { $ne: customerId }, // Exclude current customer
-            aadharVector: { $exists: true, $ne: [] }
-        });
-
         let bestMatch = null;
         let highestSimilarity = 0;
+        let searched = false;
+
+        try {
+            // The store only answers for everyone once every enrolled
+            // customer has been added to it (see utils/embeddingStore.js)
+            const enrolled = await Customer.countDocuments({ aadharVector: { $exists: true, $ne: [] } });
+            if (await embeddingStore.countFaces() >= enrolled) {
+                // 1:N search over every enrolled Aadhaar face
+                const [top] = await embeddingStore.searchFaces(aadharVector, { k: 1, exclude: [customerId] });
+                if (top) {
+                    bestMatch = await Customer.findById(top.id);
+                    highestSimilarity = top.score;
+                }
+                searched = true;
+            } else {
+                console.error('Embedding store is missing enrolled customers, scanning customers instead');
+            }
+        } catch (storeError) {
+            console.error('Embedding store search failed, scanning customers instead:', storeError.message);
+        }
 
-        // Compare with each customer's vectors
-        for (const customer of customers) {
-            if (customer.aadharVector && customer.aadharVector.length > 0) {
-                const similarity = compareVectors(aadharVector, customer.aadharVector);
-                if (similarity > highestSimilarity) {
-                    highestSimilarity = similarity;
-                    bestMatch = customer;
+        if (!searched) {
+            // Find all customers with stored vectors
+            const customers = await Customer.find({
+                _id: { $ne: customerId }, // Exclude current customer
+                aadharVector: { $exists: true, $ne: [] }
+            });
+
+            // Compare with each customer's vectors
+            for (const customer of customers) {
+                if (customer.aadharVector && customer.aadharVector.length > 0) {
+                    const similarity = cosineSimilarity(aadharVector, customer.aadharVector);
+                    if (similarity !== null && similarity > highestSimilarity) {
+                        highestSimilarity = similarity;
+                        bestMatch = customer;
+                    }
                 }
             }
         }
 
-        // If we found a match with high similarity (adjust threshold as needed)
-        if (bestMatch && highestSimilarity > 0.6) {
+        // Same-face match on the cosine score, whichever path found it
+        if (bestMatch && highestSimilarity > DUPLICATE_SIMILARITY) {
             // If names are different, it's an identity mismatch
             if (bestMatch.name !== currentCustomer.name) {
                 return res.status(409).json({
@@ -125,6 +153,12 @@ router.post('/upload-aadhar', upload.single('aadharImage'), async (req, res) =>
             { new: true }
         );
 
+        try {
+            await embeddingStore.addFace(customerId, aadharVector);
+        } catch (storeError) {
+            console.error('Error adding Aadhar vector to the embedding store:', storeError.message);
+        }
+
         res.status(200).json({
             success: true,
             message: 'Aadhar vector and image stored successfully',
@@ -338,6 +372,11 @@ router.post('/blacklist-user', async (req, res) => {
 
         // Delete the customer record
         await Customer.findByIdAndDelete(customerId);
+        try {
+            await embeddingStore.removeFace(customerId);
+        } catch (storeError) {
+            console.error('Error removing customer from the embedding store:', storeError.message);
+        }
 
         res.status(200).json({
             success: true,
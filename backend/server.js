@@ -21,5 +21,16 @@ useUnifiedTopology: true,
 .catch(err => console.error(err));
 app.use('/api/customer',customerRoutes);
 app.use('/api',livelinessRoute);
+// Prometheus scrape endpoint for the facial worker, opt-in
+if (process.env.FACIAL_METRICS_ROUTE === '1') {
+    const facialWorker = require('./utils/facialWorker');
+    app.get('/metrics/facial', async (req, res) => {
+        try {
+            res.type('text/plain; version=0.0.4').send(await facialWorker.prometheus());
+        } catch (err) {
+            res.status(503).send(err.message);
+        }
+    });
+}
 const PORT = process.env.PORT || 5000;
 app.listen(PORT, () => console.log(`Server running on port ${PORT}`))
\ No newline at end of file
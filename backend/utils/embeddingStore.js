@@ -0,0 +1,41 @@
+const facialWorker = require('./facialWorker');
+
+// Aadhaar face vectors, kept by the Python worker in a memory-mapped store
+// (facial/embedding_store.py) so a 1:N duplicate search is one matrix
+// multiply instead of a Mongo scan plus a JS loop. Customers enrolled before
+// the store existed are added by the one-off import described there; until
+// then countFaces() is below the number of enrolled customers.
+const STORE = 'aadhar';
+
+async function searchFaces(vector, { k = 1, exclude = [], threshold } = {}) {
+    const { results } = await facialWorker.request('store_search', {
+        store: STORE,
+        vectors: [vector],
+        k,
+        exclude: exclude.map(String),
+        threshold
+    });
+    return results[0];
+}
+
+async function countFaces() {
+    const { count } = await facialWorker.request('store_stats', { store: STORE });
+    return count;
+}
+
+async function addFace(customerId, vector) {
+    return facialWorker.request('store_add', {
+        store: STORE,
+        ids: [String(customerId)],
+        vectors: [vector]
+    });
+}
+
+async function removeFace(customerId) {
+    return facialWorker.request('store_delete', {
+        store: STORE,
+        ids: [String(customerId)]
+    });
+}
+
+module.exports = { searchFaces, countFaces, addFace, removeFace };
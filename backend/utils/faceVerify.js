@@ -1,11 +1,59 @@
-function compareVectors(vec1, vec2, threshold = 0.35) {
+// Python can send embeddings as "v1.f16.<base64>" (little-endian float16)
+// or "v1.i8.<base64>" (float32 scale + int8) instead of float lists; see
+// facial/embedding_codec.py
+function halfToFloat(h) {
+    const sign = h & 0x8000 ? -1 : 1;
+    const exponent = (h >> 10) & 0x1f;
+    const fraction = h & 0x3ff;
+    if (exponent === 0) return sign * Math.pow(2, -14) * (fraction / 1024);
+    if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+    return sign * Math.pow(2, exponent - 15) * (1 + fraction / 1024);
+}
+
+function decodeVector(value) {
+    if (typeof value !== 'string') {
+        return value;
+    }
+    const [version, format, data] = value.split('.');
+    if (version !== 'v1' || !data) {
+        throw new Error(`Unsupported embedding encoding: ${value.slice(0, 16)}`);
+    }
+    const bytes = Buffer.from(data, 'base64');
+    if (format === 'f16') {
+        const vector = new Array(bytes.length / 2);
+        for (let i = 0; i < vector.length; i++) {
+            vector[i] = halfToFloat(bytes.readUInt16LE(2 * i));
+        }
+        return vector;
+    }
+    if (format === 'i8') {
+        const scale = bytes.readFloatLE(0);
+        const vector = new Array(bytes.length - 4);
+        for (let i = 0; i < vector.length; i++) {
+            vector[i] = bytes.readInt8(4 + i) * scale;
+        }
+        return vector;
+    }
+    throw new Error(`Unknown embedding format: ${format}`);
+}
+
+// Cosine similarity of two vectors (lists or encoded strings), or null
+// when they cannot be compared
+function cosineSimilarity(vec1, vec2) {
+    try {
+        vec1 = decodeVector(vec1);
+        vec2 = decodeVector(vec2);
+    } catch (err) {
+        console.log('Invalid vector encoding:', err.message);
+        return null;
+    }
     if (!vec1 || !vec2 || !Array.isArray(vec1) || !Array.isArray(vec2)) {
         console.log('Invalid vectors:', { vec1: !!vec1, vec2: !!vec2, isArray1: Array.isArray(vec1), isArray2: Array.isArray(vec2) });
-        return false;
+        return null;
     }
     if (vec1.length !== vec2.length) {
         console.log('Vector length mismatch:', { length1: vec1.length, length2: vec2.length });
-        return false;
+        return null;
     }
 
     // Calculate cosine similarity
@@ -24,10 +72,17 @@ function compareVectors(vec1, vec2, threshold = 0.35) {
 
     if (norm1 === 0 || norm2 === 0) {
         console.log('Zero norm detected:', { norm1, norm2 });
-        return false;
+        return null;
     }
 
-    const similarity = dotProduct / (norm1 * norm2);
+    return dotProduct / (norm1 * norm2);
+}
+
+function compareVectors(vec1, vec2, threshold = 0.35) {
+    const similarity = cosineSimilarity(vec1, vec2);
+    if (similarity === null) {
+        return false;
+    }
     
     // Log the similarity score for debugging
     console.log('Face similarity score:', similarity.toFixed(4));
@@ -38,4 +93,6 @@ function compareVectors(vec1, vec2, threshold = 0.35) {
     return similarity > threshold;
 }
 
-module.exports = compareVectors;
\ No newline at end of file
+module.exports = compareVectors;
+module.exports.decodeVector = decodeVector;
+module.exports.cosineSimilarity = cosineSimilarity;
\ No newline at end of file
@@ -0,0 +1,209 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const readline = require('readline');
+
+// Path to the persistent Python worker
+const workerScriptPath = path.resolve(__dirname, '../facial/worker.py');
+const pythonExecutable = process.env.PYTHON_PATH || 'python';
+
+// How long a single job may run before the worker is considered stuck
+const JOB_TIMEOUT_MS = parseInt(process.env.FACIAL_JOB_TIMEOUT_MS || '120000', 10);
+// How often an idle worker is pinged to keep it warm
+const HEALTH_INTERVAL_MS = parseInt(process.env.FACIAL_HEALTH_INTERVAL_MS || '30000', 10);
+const HEALTH_TIMEOUT_MS = 10000;
+// A starting worker downloads and loads the models before it prints its
+// ready line; it is only considered stuck after this long
+const STARTUP_TIMEOUT_MS = parseInt(process.env.FACIAL_STARTUP_TIMEOUT_MS || '600000', 10);
+// Restart delay doubles after every worker that died before becoming ready
+const RESTART_DELAY_MS = 1000;
+const MAX_RESTART_DELAY_MS = 60000;
+// Stop respawning after this many workers in a row died before becoming
+// ready; the next request starts a new one
+const MAX_FAILED_STARTS = parseInt(process.env.FACIAL_MAX_FAILED_STARTS || '5', 10);
+
+class FacialWorker {
+    constructor() {
+        this.child = null;
+        this.pending = new Map();
+        this.nextId = 1;
+        this.restarts = 0;
+        this.ready = false;
+        this.failedStarts = 0;
+        this.startupTimer = null;
+        this.healthTimer = null;
+        // Last metrics/prometheus result, served while a job is running
+        this.snapshots = new Map();
+    }
+
+    start() {
+        if (this.child) {
+            return;
+        }
+
+        console.log('Starting facial worker:', workerScriptPath);
+        const child = spawn(pythonExecutable, [workerScriptPath], {
+            cwd: path.dirname(workerScriptPath),
+            stdio: ['pipe', 'pipe', 'pipe']
+        });
+        this.child = child;
+        this.ready = false;
+        this.startupTimer = setTimeout(() => {
+            this.restart(`not ready after ${STARTUP_TIMEOUT_MS}ms`);
+        }, STARTUP_TIMEOUT_MS);
+        this.startupTimer.unref();
+
+        readline.createInterface({ input: child.stdout }).on('line', (line) => this.onLine(line));
+        readline.createInterface({ input: child.stderr }).on('line', (line) => {
+            console.log('Facial worker:', line);
+        });
+
+        child.on('error', (err) => {
+            console.error('Facial worker failed to start:', err);
+        });
+
+        child.on('exit', (code, signal) => {
+            console.error(`Facial worker exited (code ${code}, signal ${signal})`);
+            const wasReady = this.ready;
+            if (this.child === child) {
+                this.child = null;
+                this.ready = false;
+                clearTimeout(this.startupTimer);
+            }
+            this.rejectAll(new Error('Facial worker exited'));
+            this.failedStarts = wasReady ? 0 : this.failedStarts + 1;
+            if (this.failedStarts >= MAX_FAILED_STARTS) {
+                console.error(`Facial worker failed to start ${this.failedStarts} times in a row; not restarting until the next request`);
+                this.failedStarts = 0;
+                return;
+            }
+            this.restarts += 1;
+            const delay = Math.min(MAX_RESTART_DELAY_MS, RESTART_DELAY_MS * Math.pow(2, this.failedStarts));
+            setTimeout(() => this.start(), delay);
+        });
+
+        if (!this.healthTimer) {
+            this.healthTimer = setInterval(() => this.keepWarm(), HEALTH_INTERVAL_MS);
+            this.healthTimer.unref();
+        }
+    }
+
+    onLine(line) {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (err) {
+            console.error('Unparseable facial worker output:', line);
+            return;
+        }
+
+        if (response.event === 'ready') {
+            console.log(`Facial worker ready in ${response.load_seconds.toFixed(2)}s (pid ${response.pid})`);
+            this.ready = true;
+            this.failedStarts = 0;
+            clearTimeout(this.startupTimer);
+            this.flushQueued();
+            return;
+        }
+
+        const job = this.pending.get(response.id);
+        if (!job) {
+            return;
+        }
+        this.pending.delete(response.id);
+        clearTimeout(job.timer);
+
+        if (response.ok) {
+            job.resolve(response.result);
+        } else {
+            job.reject(new Error(response.error || 'Facial worker error'));
+        }
+    }
+
+    rejectAll(err) {
+        for (const job of this.pending.values()) {
+            clearTimeout(job.timer);
+            job.reject(err);
+        }
+        this.pending.clear();
+    }
+
+    restart(reason) {
+        console.error('Restarting facial worker:', reason);
+        if (this.child) {
+            // The exit handler rejects pending jobs and spawns a new worker
+            this.child.kill('SIGKILL');
+        }
+    }
+
+    request(cmd, payload = {}, timeoutMs = JOB_TIMEOUT_MS, { restartOnTimeout = true } = {}) {
+        this.start();
+        const id = String(this.nextId++);
+
+        return new Promise((resolve, reject) => {
+            const job = { resolve, reject, timer: null, send: null };
+            // The job timeout only starts once the job reaches a ready worker
+            job.send = () => {
+                job.send = null;
+                job.timer = setTimeout(() => {
+                    this.pending.delete(id);
+                    reject(new Error(`Facial worker ${cmd} job timed out`));
+                    if (restartOnTimeout) {
+                        this.restart(`${cmd} job ${id} timed out`);
+                    }
+                }, timeoutMs);
+                this.child.stdin.write(JSON.stringify({ id, cmd, ...payload }) + '\n');
+            };
+
+            this.pending.set(id, job);
+            if (this.ready) {
+                job.send();
+            }
+        });
+    }
+
+    flushQueued() {
+        for (const job of this.pending.values()) {
+            if (job.send) {
+                job.send();
+            }
+        }
+    }
+
+    health() {
+        return this.request('health', {}, HEALTH_TIMEOUT_MS);
+    }
+
+    // Metrics never wait behind a job (the worker reads one request at a
+    // time) and never restart the worker: while a job is running the last
+    // snapshot is served instead.
+    snapshot(cmd) {
+        const cached = this.snapshots.get(cmd);
+        if (this.pending.size > 0 || !this.ready) {
+            return cached
+                ? Promise.resolve(cached)
+                : Promise.reject(new Error('Facial worker is busy or starting and has no metrics snapshot yet'));
+        }
+        return this.request(cmd, {}, HEALTH_TIMEOUT_MS, { restartOnTimeout: false }).then((result) => {
+            this.snapshots.set(cmd, result);
+            return result;
+        });
+    }
+
+    metrics() {
+        return this.snapshot('metrics');
+    }
+
+    prometheus() {
+        return this.snapshot('prometheus').then((result) => result.text);
+    }
+
+    keepWarm() {
+        // Jobs are served one at a time, so only ping an idle, loaded worker
+        if (!this.child || !this.ready || this.pending.size > 0) {
+            return;
+        }
+        this.health().catch((err) => console.error('Facial worker health check failed:', err.message));
+    }
+}
+
+module.exports = new FacialWorker();